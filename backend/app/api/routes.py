@@ -1,42 +1,47 @@
 # backend/app/api/routes.py
-from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect
-from sqlalchemy.orm import Session
-from sqlalchemy import func, desc, text
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func, desc, text, and_, or_, tuple_
 from typing import Optional, List
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import os
-import redis
+import time
+import base64
 import json
 import asyncio
+from collections import OrderedDict
 
-from app.models.database import SessionLocal, SocialMediaPost, SentimentAnalysis
-from app.api.websocket import manager
+from app.models.database import AsyncSessionLocal, get_async_redis, SocialMediaPost, SentimentAnalysis, SentimentRollup, truncate_time
+from app.api.websocket import manager, Subscription
+from app.services.lag_monitor import lag_monitor, StreamLagMonitor
+from app.metrics import render_metrics
 
 router = APIRouter()
 
 # Dependency
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
-
-# Redis for Health Check
-redis_client = redis.Redis(
-    host=os.getenv("REDIS_HOST", "redis"),
-    port=int(os.getenv("REDIS_PORT", 6379)),
-    socket_timeout=2
-)
 
 # --- 1. Health Check ---
+async def _worker_states() -> dict:
+    """Workers per reported state ('loading', 'ready'); statuses of stopped workers have expired"""
+    redis = get_async_redis()
+    keys = [key async for key in redis.scan_iter(match="worker_status:*", count=100)]
+    counts = {"loading": 0, "ready": 0}
+    for raw in (await redis.mget(keys) if keys else []):
+        if raw:
+            state = json.loads(raw).get("state")
+            counts[state] = counts.get(state, 0) + 1
+    return counts
+
 @router.get("/api/health")
-async def health_check(db: Session = Depends(get_db)):
-    status = {"status": "healthy", "services": {}, "stats": {}}
+async def health_check(request: Request, db: AsyncSession = Depends(get_db)):
+    status = {"status": "healthy", "ready": False, "services": {}, "stats": {}}
     
     # Check DB
     try:
-        db.execute(text("SELECT 1")) # Add text() here
+        await db.execute(text("SELECT 1")) # Add text() here
         status["services"]["database"] = "connected"
     except Exception as e:
         print(f"DB Health Error: {e}") # This will show in 'docker-compose logs backend'
@@ -45,36 +50,113 @@ async def health_check(db: Session = Depends(get_db)):
         
     # Check Redis
     try:
-        redis_client.ping()
+        await get_async_redis().ping()
         status["services"]["redis"] = "connected"
     except Exception:
         status["services"]["redis"] = "disconnected"
         status["status"] = "unhealthy"
 
+    # Workers publish their own readiness (models loaded and warmed up)
+    if status["services"]["redis"] == "connected":
+        try:
+            status["services"]["workers"] = await _worker_states()
+        except Exception:
+            pass
+
+    # This API process has started up and its dependencies answer
+    status["ready"] = getattr(request.app.state, "ready", False) and status["status"] == "healthy"
     return status
 
 # --- 2. Get Posts ---
+# Totals are read from the day rollups and cached briefly, instead of COUNT(*) per call
+POSTS_TOTAL_TTL_SECONDS = float(os.getenv("POSTS_TOTAL_TTL_SECONDS", 10))
+# Keys are client-supplied filters, so keep only the most recently used ones
+POSTS_TOTAL_CACHE_SIZE = 256
+_posts_total_cache = OrderedDict()
+
+def _encode_cursor(created_at: Optional[datetime], row_id: int) -> str:
+    # Posts without created_at come after all the others; their cursor has an empty timestamp
+    created = created_at.isoformat() if created_at else ""
+    return base64.urlsafe_b64encode(f"{created}|{row_id}".encode()).decode()
+
+def _decode_cursor(cursor: str):
+    try:
+        created_at, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return (datetime.fromisoformat(created_at) if created_at else None), int(row_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+async def _posts_total(db: AsyncSession, source: Optional[str], sentiment: Optional[str]) -> int:
+    """Number of analyzed posts matching the filters (approximate: cached for a few seconds)"""
+    key = (source, sentiment)
+    cached = _posts_total_cache.get(key)
+    if cached and time.monotonic() - cached[1] < POSTS_TOTAL_TTL_SECONDS:
+        _posts_total_cache.move_to_end(key)
+        return cached[0]
+
+    query = select(func.coalesce(func.sum(SentimentRollup.count), 0)).where(SentimentRollup.granularity == "day")
+    if source:
+        query = query.where(SentimentRollup.source == source)
+    if sentiment:
+        query = query.where(SentimentRollup.sentiment_label == sentiment)
+    total = int((await db.execute(query)).scalar())
+
+    _posts_total_cache[key] = (total, time.monotonic())
+    _posts_total_cache.move_to_end(key)
+    while len(_posts_total_cache) > POSTS_TOTAL_CACHE_SIZE:
+        _posts_total_cache.popitem(last=False)
+    return total
+
 @router.get("/api/posts")
 async def get_posts(
     limit: int = 50,
     offset: int = 0,
+    cursor: Optional[str] = None,
     source: Optional[str] = None,
     sentiment: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    query = db.query(SocialMediaPost, SentimentAnalysis).join(
+    """
+    Newest posts first. Pass the returned `next_cursor` as `cursor` to get the next page:
+    keyset pagination on (created_at, id) costs the same on page 1000 as on page 1.
+    `offset` still works for old clients but gets slower the deeper it goes.
+    Posts without a created_at are listed after all the others, newest id first.
+    """
+    query = select(SocialMediaPost, SentimentAnalysis).join(
         SentimentAnalysis, SocialMediaPost.post_id == SentimentAnalysis.post_id
     )
 
     if source:
-        query = query.filter(SocialMediaPost.source == source)
+        query = query.where(SocialMediaPost.source == source)
     if sentiment:
-        query = query.filter(SentimentAnalysis.sentiment_label == sentiment)
+        query = query.where(SentimentAnalysis.sentiment_label == sentiment)
 
-    total = query.count()
-    
-    # Order by newest first
-    results = query.order_by(desc(SocialMediaPost.created_at)).offset(offset).limit(limit).all()
+    total = await _posts_total(db, source, sentiment)
+
+    # Order by newest first (id breaks ties so the cursor is exact)
+    if offset and not cursor:
+        results = (await db.execute(query.order_by(
+            desc(SocialMediaPost.created_at).nulls_last(), desc(SocialMediaPost.id)
+        ).offset(offset).limit(limit))).all()
+    else:
+        # Keyset pages: dated posts on the (created_at, id) index, then the undated ones
+        # by id, so NULLs neither come first nor end the paging early
+        offset = 0
+        cursor_created_at, cursor_id = _decode_cursor(cursor) if cursor else (None, None)
+        in_undated = cursor is not None and cursor_created_at is None
+        results = []
+        if not in_undated:
+            dated = query.where(SocialMediaPost.created_at.is_not(None))
+            if cursor:
+                dated = dated.where(tuple_(SocialMediaPost.created_at, SocialMediaPost.id) < (cursor_created_at, cursor_id))
+            results = (await db.execute(dated.order_by(
+                desc(SocialMediaPost.created_at), desc(SocialMediaPost.id)
+            ).limit(limit))).all()
+        if len(results) < limit:
+            undated = query.where(SocialMediaPost.created_at.is_(None))
+            if in_undated:
+                undated = undated.where(SocialMediaPost.id < cursor_id)
+            results += (await db.execute(undated.order_by(desc(SocialMediaPost.id)).limit(limit - len(results)))).all()
 
     posts = []
     for post, analysis in results:
@@ -91,26 +173,57 @@ async def get_posts(
             }
         })
 
-    return {"posts": posts, "total": total, "limit": limit, "offset": offset}
+    next_cursor = None
+    if len(results) == limit:
+        last_post = results[-1][0]
+        next_cursor = _encode_cursor(last_post.created_at, last_post.id)
+
+    return {"posts": posts, "total": total, "limit": limit, "offset": offset, "next_cursor": next_cursor}
 
 # --- 3. Aggregate Data ---
+# Look-back used when no start is given, so every request reads a bounded number of buckets
+AGGREGATE_DEFAULT_WINDOWS = {
+    "minute": timedelta(hours=24),
+    "hour": timedelta(days=30),
+    "day": timedelta(days=365),
+}
+
+def _to_naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Query params may carry a timezone; the DB stores naive UTC"""
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
 @router.get("/api/sentiment/aggregate")
 async def get_sentiment_aggregate(
     period: str = Query(..., regex="^(minute|hour|day)$"),
-    db: Session = Depends(get_db)
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    source: Optional[str] = None,
+    emotion: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
 ):
-    # Determine truncation period
-    trunc_period = period
-    
-    # Calculate aggregation
-    # Query: Select date_trunc('hour', created_at), sentiment_label, count(*)
-    results = db.query(
-        func.date_trunc(trunc_period, SentimentAnalysis.analyzed_at).label('timestamp'),
-        SentimentAnalysis.sentiment_label,
-        func.count(SentimentAnalysis.id)
-    ).group_by(
-        'timestamp', SentimentAnalysis.sentiment_label
-    ).order_by('timestamp').all()
+    end = _to_naive_utc(end) or datetime.utcnow()
+    start = _to_naive_utc(start) or end - AGGREGATE_DEFAULT_WINDOWS[period]
+
+    # Read the pre-aggregated buckets for this period (kept up to date by the worker)
+    query = select(
+        SentimentRollup.bucket_start,
+        SentimentRollup.sentiment_label,
+        func.sum(SentimentRollup.count)
+    ).where(
+        SentimentRollup.granularity == period,
+        SentimentRollup.bucket_start >= truncate_time(start, period),
+        SentimentRollup.bucket_start <= end
+    )
+    if source:
+        query = query.where(SentimentRollup.source == source)
+    if emotion:
+        query = query.where(SentimentRollup.emotion == emotion)
+
+    results = (await db.execute(query.group_by(
+        SentimentRollup.bucket_start, SentimentRollup.sentiment_label
+    ).order_by(SentimentRollup.bucket_start))).all()
 
     # Process results into structured JSON
     data_map = {}
@@ -120,24 +233,56 @@ async def get_sentiment_aggregate(
             data_map[ts_str] = {"timestamp": ts_str, "positive": 0, "negative": 0, "neutral": 0, "total": 0}
         
         if label in data_map[ts_str]:
-            data_map[ts_str][label] = count
-            data_map[ts_str]["total"] += count
+            data_map[ts_str][label] = int(count)
+            data_map[ts_str]["total"] += int(count)
 
     return {"period": period, "data": list(data_map.values())}
 
 # --- 4. Distribution ---
+def _rollup_ranges(since: datetime, until: datetime) -> list:
+    """
+    Cover [since, until] with as few rollup buckets as possible: whole hours from the
+    hour rollups, and the partial hours at both ends from the minute rollups.
+    Returns (granularity, start, end) ranges with an exclusive end.
+    """
+    first_hour = truncate_time(since, "hour")
+    if first_hour < since:
+        first_hour += timedelta(hours=1)
+    last_hour = truncate_time(until, "hour")
+
+    if first_hour >= last_hour:
+        return [("minute", truncate_time(since, "minute"), until + timedelta(minutes=1))]
+    return [
+        ("minute", truncate_time(since, "minute"), first_hour),
+        ("hour", first_hour, last_hour),
+        ("minute", last_hour, until + timedelta(minutes=1)),
+    ]
+
 @router.get("/api/sentiment/distribution")
-async def get_sentiment_distribution(hours: int = 24, db: Session = Depends(get_db)):
-    since = datetime.utcnow() - timedelta(hours=hours)
-    
-    results = db.query(
-        SentimentAnalysis.sentiment_label, func.count(SentimentAnalysis.id)
-    ).filter(SentimentAnalysis.analyzed_at >= since).group_by(SentimentAnalysis.sentiment_label).all()
+async def get_sentiment_distribution(hours: int = 24, source: Optional[str] = None, db: AsyncSession = Depends(get_db)):
+    now = datetime.utcnow()
+    since = now - timedelta(hours=hours)
+
+    # Minute resolution: the bucket containing `since` is counted in full
+    ranges = or_(*[
+        and_(
+            SentimentRollup.granularity == granularity,
+            SentimentRollup.bucket_start >= range_start,
+            SentimentRollup.bucket_start < range_end
+        )
+        for granularity, range_start, range_end in _rollup_ranges(since, now)
+    ])
+    query = select(
+        SentimentRollup.sentiment_label, func.sum(SentimentRollup.count)
+    ).where(ranges)
+    if source:
+        query = query.where(SentimentRollup.source == source)
+    results = (await db.execute(query.group_by(SentimentRollup.sentiment_label))).all()
 
     distribution = {"positive": 0, "negative": 0, "neutral": 0}
     for label, count in results:
         if label in distribution:
-            distribution[label] = count
+            distribution[label] = int(count)
 
     return distribution
 
@@ -146,15 +291,60 @@ async def get_sentiment_distribution(hours: int = 24, db: Session = Depends(get_
 async def websocket_endpoint(websocket: WebSocket):
     await manager.connect(websocket)
     try:
-        # Send confirmation
-        await websocket.send_json({
+        # Send confirmation (through the client's queue, like every other frame)
+        await manager.send(websocket, {
             "type": "connected", 
             "message": "Connected to sentiment stream",
             "timestamp": datetime.utcnow().isoformat()
         })
         
         while True:
-            # Keep connection alive
-            await websocket.receive_text()
+            # Clients may send {"type": "subscribe", "filters": {...}, "mode": "raw"|"aggregate",
+            # "interval_ms": 500}; anything else just keeps the connection alive
+            raw_message = await websocket.receive_text()
+            try:
+                message = json.loads(raw_message)
+            except ValueError:
+                continue
+            if not isinstance(message, dict) or message.get("type") != "subscribe":
+                continue
+
+            try:
+                subscription = Subscription.from_message(message)
+            except (ValueError, TypeError) as e:
+                await manager.send(websocket, {"type": "error", "message": str(e)})
+                continue
+            manager.subscribe(websocket, subscription)
+            await manager.send(websocket, {"type": "subscribed", **subscription.describe()})
     except WebSocketDisconnect:
-        manager.disconnect(websocket)
\ No newline at end of file
+        pass
+    finally:
+        manager.disconnect(websocket)
+
+@router.get("/api/websocket/stats")
+async def websocket_stats():
+    """Fan-out health: connected clients, queued frames, dropped frames, evicted clients"""
+    return manager.metrics()
+
+@router.get("/api/stream/lag")
+async def stream_lag():
+    """
+    Worker lag on the posts stream: backlog, ingest/processing rates, ETA to drain,
+    recommended worker count and the current backpressure level.
+    """
+    try:
+        snapshot = await lag_monitor.read()
+        if snapshot is None:
+            # Monitor hasn't published yet: one-off sample, without rates
+            snapshot = await StreamLagMonitor(lag_monitor.stream_name, lag_monitor.group_name).sample()
+    except Exception:
+        raise HTTPException(status_code=503, detail="Redis unavailable")
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="Stream or consumer group not found")
+    return snapshot
+
+@router.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus scrape endpoint"""
+    body, content_type = render_metrics()
+    return Response(body, media_type=content_type)
@@ -1,32 +1,295 @@
 # backend/app/api/websocket.py
 from fastapi import WebSocket, WebSocketDisconnect
-from typing import List
+from typing import Dict, List, Optional
+from datetime import datetime
+import os
 import json
+import time
+import asyncio
 import logging
 
+from app.metrics import WS_BROADCAST_SECONDS, WS_CONNECTIONS, WS_DROPPED, WS_EVICTED
+
 logger = logging.getLogger(__name__)
 
+OVERFLOW_POLICIES = ("drop_oldest", "drop_newest", "coalesce")
+DELIVERY_MODES = ("raw", "aggregate")
+FILTER_FIELDS = ("source", "sentiment_label", "emotion")
+MIN_AGGREGATE_INTERVAL_MS = 100
+
+class Subscription:
+    """
+    What a client wants from the live stream:
+      - filters: per field (source, sentiment_label, emotion) the allowed values; None = any
+      - mode: 'raw' (every matching post) or 'aggregate' (counts every interval_ms)
+    """
+    def __init__(self, filters: Optional[dict] = None, mode: str = "raw", interval_ms: int = 500):
+        if mode not in DELIVERY_MODES:
+            raise ValueError(f"mode must be one of {DELIVERY_MODES}")
+        filters = filters or {}
+        if not isinstance(filters, dict):
+            raise ValueError("filters must be an object of field -> value(s)")
+        unknown = set(filters) - set(FILTER_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown filter fields: {sorted(unknown)}")
+
+        self.filters = {}
+        for field, values in filters.items():
+            if values is None:
+                continue
+            if isinstance(values, str):
+                values = [values]
+            if not isinstance(values, list) or not all(isinstance(value, (str, int, float)) for value in values):
+                raise ValueError(f"Filter {field} must be a value or a list of values")
+            self.filters[field] = frozenset(str(value) for value in values)
+        self.mode = mode
+        self.interval_ms = max(MIN_AGGREGATE_INTERVAL_MS, int(interval_ms))
+
+    @classmethod
+    def from_message(cls, message: dict):
+        """Build from a client's {"type": "subscribe", ...} frame"""
+        return cls(message.get("filters"), message.get("mode", "raw"), message.get("interval_ms", 500))
+
+    def key(self):
+        """Clients with equal keys share one aggregate"""
+        filters = tuple(sorted((field, tuple(sorted(values))) for field, values in self.filters.items()))
+        return (self.mode, self.interval_ms, filters)
+
+    def matches(self, data: dict) -> bool:
+        return all(data.get(field) in values for field, values in self.filters.items())
+
+    def describe(self) -> dict:
+        return {
+            "filters": {field: sorted(values) for field, values in self.filters.items()},
+            "mode": self.mode,
+            "interval_ms": self.interval_ms,
+        }
+
+class AggregateGroup:
+    """Running counts for every client sharing an aggregate subscription"""
+    def __init__(self, subscription: Subscription):
+        self.subscription = subscription
+        self.clients = set()
+        self.window_start = datetime.utcnow()
+        self.next_flush = asyncio.get_running_loop().time() + subscription.interval_ms / 1000
+        self._reset()
+
+    def _reset(self):
+        self.total = 0
+        self.sentiments = {"positive": 0, "negative": 0, "neutral": 0}
+        self.emotions = {}
+        self.sources = {}
+
+    def add(self, data: dict):
+        self.total += 1
+        label = data.get("sentiment_label")
+        self.sentiments[label] = self.sentiments.get(label, 0) + 1
+        if data.get("emotion"):
+            self.emotions[data["emotion"]] = self.emotions.get(data["emotion"], 0) + 1
+        if data.get("source"):
+            self.sources[data["source"]] = self.sources.get(data["source"], 0) + 1
+
+    def flush(self) -> Optional[dict]:
+        """Return the delta since the last flush (None if nothing arrived) and start a new window"""
+        now = datetime.utcnow()
+        message = None
+        if self.total:
+            message = {
+                "type": "aggregate",
+                "window_start": self.window_start.isoformat(),
+                "window_end": now.isoformat(),
+                "total": self.total,
+                "sentiments": self.sentiments,
+                "emotions": self.emotions,
+                "sources": self.sources,
+            }
+        self.window_start = now
+        self._reset()
+        return message
+
+class ClientConnection:
+    """One connected client: its bounded send queue, the task draining it and its subscription"""
+    def __init__(self, websocket: WebSocket, max_queue: int):
+        self.websocket = websocket
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.sender_task = None
+        self.dropped = 0
+        self.subscription = Subscription()
+
 class ConnectionManager:
-    def __init__(self):
+    """
+    Fans messages out to WebSocket clients without letting one client slow down the rest.
+
+    Every client gets a bounded queue and its own sender task, so sends happen
+    concurrently. When a client's queue is full the overflow policy applies:
+      - drop_oldest: discard the oldest queued message to make room (default)
+      - drop_newest: discard the new message
+      - coalesce:    discard everything queued and keep only the new message
+    Clients whose send fails or takes longer than send_timeout are disconnected.
+
+    Clients may subscribe with filters and a delivery mode. 'raw' clients get only the
+    posts matching their filters; 'aggregate' clients get periodic count deltas instead,
+    computed once per distinct subscription and shared by every client that has it.
+    """
+    def __init__(self, max_queue: int = None, overflow_policy: str = None, send_timeout: float = None):
+        self.max_queue = max_queue or int(os.getenv("WS_CLIENT_QUEUE_SIZE", 100))
+        self.overflow_policy = overflow_policy or os.getenv("WS_OVERFLOW_POLICY", "drop_oldest")
+        self.send_timeout = send_timeout or float(os.getenv("WS_SEND_TIMEOUT", 5.0))
+        if self.overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"WS_OVERFLOW_POLICY must be one of {OVERFLOW_POLICIES}")
+
         self.active_connections: List[WebSocket] = []
+        self.clients: Dict[WebSocket, ClientConnection] = {}
+        self.aggregate_groups: Dict[tuple, AggregateGroup] = {}
+        self._flusher_task = None
+
+        # Metrics
+        self.dropped_messages = 0
+        self.evicted_connections = 0
 
     async def connect(self, websocket: WebSocket):
         await websocket.accept()
+        client = ClientConnection(websocket, self.max_queue)
+        client.sender_task = asyncio.create_task(self._sender(client))
+        self.clients[websocket] = client
         self.active_connections.append(websocket)
+        WS_CONNECTIONS.inc()
         logger.info(f"Client connected. Total: {len(self.active_connections)}")
 
     def disconnect(self, websocket: WebSocket):
+        client = self.clients.pop(websocket, None)
+        if client:
+            self._leave_group(client)
+        if client and client.sender_task and client.sender_task is not asyncio.current_task():
+            client.sender_task.cancel()
         if websocket in self.active_connections:
             self.active_connections.remove(websocket)
+            WS_CONNECTIONS.dec()
             logger.info(f"Client disconnected. Total: {len(self.active_connections)}")
 
+    async def send(self, websocket: WebSocket, message: dict):
+        """Queue a message for one client"""
+        client = self.clients.get(websocket)
+        if client:
+            self._enqueue(client, json.dumps(message))
+
+    def subscribe(self, websocket: WebSocket, subscription: Subscription):
+        """Replace a client's subscription"""
+        client = self.clients.get(websocket)
+        if not client:
+            return
+        self._leave_group(client)
+        client.subscription = subscription
+
+        if subscription.mode == "aggregate":
+            group = self.aggregate_groups.get(subscription.key())
+            if group is None:
+                group = self.aggregate_groups[subscription.key()] = AggregateGroup(subscription)
+            group.clients.add(client)
+            if self._flusher_task is None or self._flusher_task.done():
+                self._flusher_task = asyncio.create_task(self._flush_aggregates())
+
+    def _leave_group(self, client: ClientConnection):
+        key = client.subscription.key()
+        group = self.aggregate_groups.get(key)
+        if group:
+            group.clients.discard(client)
+            if not group.clients:
+                del self.aggregate_groups[key]
+
     async def broadcast(self, message: dict):
-        """Send a message to all connected clients"""
-        for connection in self.active_connections:
+        """
+        Deliver a message to every client that wants it (serialized at most once,
+        never waits on a client). Posts are filtered per subscription and counted into
+        aggregates; any other message type goes to every client.
+        """
+        start = time.perf_counter()
+        self._fan_out(message)
+        WS_BROADCAST_SECONDS.observe(time.perf_counter() - start)
+
+    def _fan_out(self, message: dict):
+        if message.get("type") != "new_post":
+            payload = json.dumps(message)
+            for client in list(self.clients.values()):
+                self._enqueue(client, payload)
+            return
+
+        data = message.get("data", {})
+        payload = None
+        for client in list(self.clients.values()):
+            if client.subscription.mode == "raw" and client.subscription.matches(data):
+                payload = payload or json.dumps(message)
+                self._enqueue(client, payload)
+
+        for group in self.aggregate_groups.values():
+            if group.subscription.matches(data):
+                group.add(data)
+
+    async def _flush_aggregates(self):
+        """Send each aggregate group its delta when its interval is up (runs while groups exist)"""
+        loop = asyncio.get_running_loop()
+        while self.aggregate_groups:
+            await asyncio.sleep(MIN_AGGREGATE_INTERVAL_MS / 1000 / 2)
+            now = loop.time()
+            for group in list(self.aggregate_groups.values()):
+                if now < group.next_flush:
+                    continue
+                group.next_flush = now + group.subscription.interval_ms / 1000
+                message = group.flush()
+                if message:
+                    message["subscription"] = group.subscription.describe()
+                    payload = json.dumps(message)
+                    for client in list(group.clients):
+                        self._enqueue(client, payload)
+
+    def _enqueue(self, client: ClientConnection, payload: str):
+        if client.queue.full():
+            if self.overflow_policy == "drop_newest":
+                self._count_dropped(client, 1)
+                return
+            if self.overflow_policy == "coalesce":
+                dropped = client.queue.qsize()
+                while not client.queue.empty():
+                    client.queue.get_nowait()
+            else:
+                dropped = 1
+                client.queue.get_nowait()
+            self._count_dropped(client, dropped)
+        client.queue.put_nowait(payload)
+
+    def _count_dropped(self, client: ClientConnection, count: int):
+        client.dropped += count
+        self.dropped_messages += count
+        WS_DROPPED.inc(count)
+
+    async def _sender(self, client: ClientConnection):
+        """Drain one client's queue; evict the client if a send fails or stalls"""
+        while True:
+            payload = await client.queue.get()
             try:
-                await connection.send_json(message)
+                await asyncio.wait_for(client.websocket.send_text(payload), timeout=self.send_timeout)
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
-                logger.error(f"Error sending message: {e}")
-                # We might remove the connection here in a production app
+                logger.warning(f"Evicting WebSocket client: {type(e).__name__} {e}")
+                self.evicted_connections += 1
+                WS_EVICTED.inc()
+                self.disconnect(client.websocket)
+                try:
+                    await client.websocket.close()
+                except Exception:
+                    pass
+                return
+
+    def metrics(self) -> dict:
+        depths = [client.queue.qsize() for client in self.clients.values()]
+        return {
+            "connections": len(self.clients),
+            "aggregate_groups": len(self.aggregate_groups),
+            "queue_depth_total": sum(depths),
+            "queue_depth_max": max(depths, default=0),
+            "dropped_messages": self.dropped_messages,
+            "evicted_connections": self.evicted_connections,
+        }
 
-manager = ConnectionManager()
\ No newline at end of file
+manager = ConnectionManager()
@@ -4,12 +4,19 @@ from fastapi.middleware.cors import CORSMiddleware
 import asyncio
 import redis.asyncio as redis
 import json
+import logging
 import os
+import time
 
-from app.models.database import init_db
+from app.models.database import init_db, retry_with_backoff, get_async_redis, async_engine
 from app.api import routes
 from app.api.websocket import manager
 from app.services.alerting import AlertService
+from app.services.leader import LeaderElection
+from app.services.lag_monitor import lag_monitor
+from app.metrics import HTTP_REQUEST_SECONDS, db_pools
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI(title="Sentiment Analysis Platform")
 
@@ -25,31 +32,77 @@ app.add_middleware(
 # Include Routes
 app.include_router(routes.router)
 
-# Background Task: Redis Subscriber for WebSocket
-async def redis_subscriber():
+# Request latency per route template (so /api/posts?cursor=... is one series)
+@app.middleware("http")
+async def record_request_metrics(request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    HTTP_REQUEST_SECONDS.labels(request.method, route.path if route else "unmatched",
+                                response.status_code).observe(time.perf_counter() - start)
+    return response
+
+db_pools.add("api", async_engine.sync_engine)
+
+# Background Task: Redis Subscriber for WebSocket.
+# Every API process (replica or uvicorn worker) keeps exactly one subscription and
+# fans each update out to its own clients, so adding replicas adds client capacity
+# without adding per-message work anywhere else.
+async def redis_subscriber(connect=None):
+    """connect: returns a fresh async Redis client (default: REDIS_HOST)"""
     redis_host = os.getenv("REDIS_HOST", "redis")
-    r = redis.Redis(host=redis_host, port=6379, decode_responses=True)
-    pubsub = r.pubsub()
-    await pubsub.subscribe('sentiment_updates')
-    
-    async for message in pubsub.listen():
-        if message['type'] == 'message':
-            data = json.loads(message['data'])
-            # Broadcast to all connected WebSocket clients
-            await manager.broadcast(data)
+    connect = connect or (lambda: redis.Redis(host=redis_host, port=6379, decode_responses=True))
+    while True:
+        r = connect()
+        try:
+            pubsub = r.pubsub()
+            await pubsub.subscribe('sentiment_updates')
+
+            async for message in pubsub.listen():
+                if message['type'] == 'message':
+                    data = json.loads(message['data'])
+                    # Broadcast to all connected WebSocket clients
+                    await manager.broadcast(data)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Redis subscriber lost connection, reconnecting: {e}")
+            await asyncio.sleep(1)
+        finally:
+            await r.aclose()
+
+# Singleton jobs run on one replica only
+alert_leader = None
+lag_leader = None
 
 @app.on_event("startup")
 async def startup_event():
-    # 1. Initialize DB
-    init_db()
+    global alert_leader, lag_leader
+
+    # 1. Initialize DB (as soon as it accepts connections)
+    await asyncio.to_thread(retry_with_backoff, init_db, "Database")
     
-    # 2. Start Alert Service
+    # 2. Start Alert Service (only on the replica holding the alert lock)
     alert_service = AlertService()
-    asyncio.create_task(alert_service.run_monitoring_loop())
+    alert_leader = LeaderElection(get_async_redis(), "alert_monitor")
+    asyncio.create_task(alert_leader.run(alert_service.run))
     
     # 3. Start Redis Subscriber
     asyncio.create_task(redis_subscriber())
 
+    # 4. Start the stream lag monitor (also a singleton; publishes backpressure for the ingester)
+    lag_leader = LeaderElection(get_async_redis(), "lag_monitor")
+    asyncio.create_task(lag_leader.run(lag_monitor.run))
+
+    app.state.ready = True # Reported by /api/health
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Let another replica take over the singleton jobs immediately
+    for leader in (alert_leader, lag_leader):
+        if leader and leader.is_leader:
+            await leader.release()
+
 @app.get("/")
 def read_root():
     return {"status": "Sentiment Platform API is running"}
\ No newline at end of file
@@ -0,0 +1,90 @@
+# backend/app/metrics.py
+"""
+Prometheus metrics shared by the backend and the worker.
+
+The backend serves them on GET /metrics; the worker runs a small HTTP listener
+(start_metrics_server). With several API processes, or worker inference processes,
+PROMETHEUS_MULTIPROC_DIR makes both aggregate every process.
+"""
+import os
+from prometheus_client import (
+    CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest, multiprocess, start_http_server,
+    CONTENT_TYPE_LATEST,
+)
+from prometheus_client.core import GaugeMetricFamily
+
+# Seconds; covers sub-millisecond cache/DB steps up to multi-second model runs
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Worker
+WORKER_STAGE_SECONDS = Histogram("worker_stage_seconds", "Time per worker batch stage",
+                                 ["stage"], buckets=LATENCY_BUCKETS)
+WORKER_BATCH_SIZE = Histogram("worker_batch_size", "Posts per processed batch",
+                              buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512))
+WORKER_MESSAGES = Counter("worker_messages_total", "Stream entries handled by outcome",
+                          ["outcome"]) # saved, duplicate, failed, dead_lettered, reclaimed
+
+# Inference
+INFERENCE_SECONDS = Histogram("inference_seconds", "Time per inference step (tokenize, sentiment, emotion, multihead, preclassify)",
+                              ["step"], buckets=LATENCY_BUCKETS)
+INFERENCE_CACHE_LOOKUPS = Counter("inference_cache_lookups_total", "Inference cache lookups by result",
+                                  ["result"]) # local_hit, redis_hit, miss
+CASCADE_DECISIONS = Counter("cascade_decisions_total", "Posts answered by the pre-classifier or escalated",
+                            ["outcome"]) # answered, escalated
+
+# API
+HTTP_REQUEST_SECONDS = Histogram("http_request_seconds", "API request latency",
+                                 ["method", "route", "status"], buckets=LATENCY_BUCKETS)
+WS_BROADCAST_SECONDS = Histogram("websocket_broadcast_seconds", "Time to fan one message out to all clients",
+                                 buckets=LATENCY_BUCKETS)
+WS_CONNECTIONS = Gauge("websocket_connections", "Connected WebSocket clients", multiprocess_mode="livesum")
+WS_DROPPED = Counter("websocket_dropped_messages_total", "Frames dropped by the overflow policy")
+WS_EVICTED = Counter("websocket_evicted_connections_total", "Clients disconnected for failed or slow sends")
+
+# Alerts
+ALERTS_FIRED = Counter("alerts_fired_total", "Alerts triggered", ["alert_type"])
+ALERT_EVAL_SECONDS = Histogram("alert_evaluation_seconds", "Time to evaluate every alert rule once",
+                               buckets=LATENCY_BUCKETS)
+
+class DBPoolCollector:
+    """Reports the SQLAlchemy connection pool of each registered engine at scrape time"""
+    def __init__(self):
+        self.engines = {}
+
+    def add(self, name, engine):
+        self.engines[name] = engine
+
+    def collect(self):
+        families = {
+            "size": GaugeMetricFamily("db_pool_size", "Configured pool size", labels=["engine"]),
+            "checkedout": GaugeMetricFamily("db_pool_checked_out", "Connections in use", labels=["engine"]),
+            "checkedin": GaugeMetricFamily("db_pool_checked_in", "Idle connections in the pool", labels=["engine"]),
+            "overflow": GaugeMetricFamily("db_pool_overflow", "Connections beyond the pool size", labels=["engine"]),
+        }
+        for name, engine in self.engines.items():
+            for attribute, family in families.items():
+                method = getattr(engine.pool, attribute, None) # SQLite pools don't have all of them
+                if method is not None:
+                    family.add_metric([name], method())
+        return list(families.values())
+
+db_pools = DBPoolCollector()
+REGISTRY.register(db_pools)
+
+def _registry():
+    """What to export: this process only, or every process writing to PROMETHEUS_MULTIPROC_DIR"""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(db_pools) # Read at scrape time, so never written to the directory
+        return registry
+    return REGISTRY
+
+def render_metrics():
+    """(body, content type) for a /metrics response"""
+    return generate_latest(_registry()), CONTENT_TYPE_LATEST
+
+def start_metrics_server(port: int):
+    """Serve /metrics on its own port (worker); port 0 disables it"""
+    if port:
+        start_http_server(port, registry=_registry())
@@ -1,23 +1,76 @@
 # backend/app/models/database.py
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Text, ForeignKey, JSON
+from sqlalchemy import text, inspect, create_engine, Column, Integer, String, Float, DateTime, Text, ForeignKey, JSON, UniqueConstraint, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
-from datetime import datetime
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from datetime import datetime, timedelta
+from collections import Counter
 import os
+import time
+import logging
+import redis.asyncio as aioredis
+
+logger = logging.getLogger(__name__)
 
 # 1. Setup Database Connection
 DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise ValueError("DATABASE_URL environment variable is not set")
 
-engine = create_engine(DATABASE_URL)
+def _pool_settings(url: str) -> dict:
+    """Connection-pool tuning from env (SQLite uses its own pooling and takes none of these)"""
+    if url.startswith("sqlite"):
+        return {}
+    return {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", 10)),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", 20)),
+        "pool_timeout": int(os.getenv("DB_POOL_TIMEOUT", 30)),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", 1800)),
+        "pool_pre_ping": True,
+    }
+
+def _async_url(url: str) -> str:
+    """Same database, async driver: asyncpg for Postgres, aiosqlite for SQLite"""
+    if url.startswith("postgresql://") or url.startswith("postgres://"):
+        return "postgresql+asyncpg://" + url.split("://", 1)[1]
+    if url.startswith("sqlite://"):
+        return "sqlite+aiosqlite://" + url.split("://", 1)[1]
+    return url
+
+# Sync engine: worker, init_db and scripts
+engine = create_engine(DATABASE_URL, **_pool_settings(DATABASE_URL))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Async engine: FastAPI routes and the alert service, so I/O never blocks the event loop
+ASYNC_DATABASE_URL = _async_url(DATABASE_URL)
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **_pool_settings(ASYNC_DATABASE_URL))
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
+# Shared async Redis client for the API process (created on first use)
+_async_redis = None
+
+def get_async_redis():
+    global _async_redis
+    if _async_redis is None:
+        _async_redis = aioredis.Redis(
+            host=os.getenv("REDIS_HOST", "redis"),
+            port=int(os.getenv("REDIS_PORT", 6379)),
+            socket_timeout=2,
+            max_connections=int(os.getenv("REDIS_MAX_CONNECTIONS", 50))
+        )
+    return _async_redis
+
 # 2. Define Tables
 
 class SocialMediaPost(Base):
     __tablename__ = "social_media_posts"
+    # Newest-first keyset pagination of /api/posts, with and without a source filter
+    __table_args__ = (
+        Index("ix_posts_created_at_id", "created_at", "id"),
+        Index("ix_posts_source_created_at_id", "source", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     post_id = Column(String(255), unique=True, index=True)
@@ -29,6 +82,14 @@ class SocialMediaPost(Base):
 
 class SentimentAnalysis(Base):
     __tablename__ = "sentiment_analysis"
+    __table_args__ = (
+        # One analysis per post and model, so redelivered messages can't create duplicates.
+        # Declared as an index (post_id first) so init_db also adds it to existing tables,
+        # where it serves the /api/posts join as well.
+        Index("uq_sentiment_analysis_post_model", "post_id", "model_name", unique=True),
+        # /api/posts sentiment filter
+        Index("ix_analysis_label_post_id", "sentiment_label", "post_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     post_id = Column(String(255), ForeignKey("social_media_posts.post_id"))
@@ -51,6 +112,168 @@ class SentimentAlert(Base):
     triggered_at = Column(DateTime, default=datetime.utcnow, index=True)
     details = Column(JSON)
 
+class SentimentRollup(Base):
+    """
+    Pre-aggregated analysis counts per time bucket, kept up to date by the worker.
+    Dashboard queries read these instead of scanning sentiment_analysis.
+    Missing source/emotion are stored as '' so they take part in the unique key.
+    """
+    __tablename__ = "sentiment_rollups"
+    __table_args__ = (
+        UniqueConstraint("granularity", "bucket_start", "source", "sentiment_label", "emotion", name="uq_sentiment_rollup_bucket"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    granularity = Column(String(10)) # minute, hour, day
+    bucket_start = Column(DateTime)
+    source = Column(String(50), default="")
+    sentiment_label = Column(String(20))
+    emotion = Column(String(50), default="")
+    count = Column(Integer, default=0)
+
+ROLLUP_GRANULARITIES = ("minute", "hour", "day")
+
+def truncate_time(value: datetime, granularity: str) -> datetime:
+    """Python equivalent of Postgres date_trunc for our rollup granularities"""
+    if granularity == "minute":
+        return value.replace(second=0, microsecond=0)
+    if granularity == "hour":
+        return value.replace(minute=0, second=0, microsecond=0)
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
 # Function to initialize DB
 def init_db():
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    Base.metadata.create_all(bind=engine)
+    _drop_duplicate_analyses()
+    # create_all skips tables that already exist, so add any indexes they are missing
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+def _drop_duplicate_analyses():
+    """
+    A sentiment_analysis table created before the (post_id, model_name) unique key may hold
+    duplicates (redelivered messages) that would stop init_db from adding it. Delete them
+    first, keeping the oldest row of each; the rollups then over-count and need rebuild_rollups().
+    """
+    inspector = inspect(engine)
+    names = ({c["name"] for c in inspector.get_unique_constraints("sentiment_analysis")}
+             | {i["name"] for i in inspector.get_indexes("sentiment_analysis")})
+    if "uq_sentiment_analysis_post_model" in names:
+        return
+
+    with engine.begin() as conn:
+        deleted = conn.execute(text("""
+            DELETE FROM sentiment_analysis WHERE id NOT IN (
+                SELECT MIN(id) FROM sentiment_analysis GROUP BY post_id, model_name
+            )
+        """)).rowcount
+    if deleted:
+        logger.warning(f"Deleted {deleted} duplicate analyses; run rebuild_rollups() to correct the rollups")
+
+def retry_with_backoff(fn, description: str, timeout: float = None, initial_delay: float = 0.1, max_delay: float = 5.0):
+    """
+    Call fn until it stops raising, sleeping initial_delay, then twice as long each time
+    (at most max_delay) in between. Used at startup instead of a fixed sleep, so services
+    start as soon as their dependencies answer. Re-raises the last error after timeout
+    seconds (STARTUP_TIMEOUT, default 120).
+    """
+    timeout = float(os.getenv("STARTUP_TIMEOUT", 120)) if timeout is None else timeout
+    deadline = time.monotonic() + timeout
+    delay = initial_delay
+    while True:
+        try:
+            return fn()
+        except Exception as e:
+            if time.monotonic() + delay > deadline:
+                raise
+            logger.warning(f"{description} not ready ({e}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+            delay = min(delay * 2, max_delay)
+
+# Bulk, idempotent writes (used by the worker)
+def _dialect_insert(table):
+    """INSERT with ON CONFLICT support for the current database dialect"""
+    if engine.dialect.name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        from sqlalchemy.dialects.postgresql import insert
+    return insert(table)
+
+def _insert_ignoring_conflicts(table):
+    """INSERT ... ON CONFLICT DO NOTHING"""
+    return _dialect_insert(table).on_conflict_do_nothing()
+
+def _add_to_rollups(db, rows: list):
+    """
+    Increment rollup counters for newly written analyses.
+    rows: (analyzed_at, source, sentiment_label, emotion) tuples.
+    """
+    counts = Counter()
+    for analyzed_at, source, label, emotion in rows:
+        for granularity in ROLLUP_GRANULARITIES:
+            counts[(granularity, truncate_time(analyzed_at, granularity), source or "", label, emotion or "")] += 1
+    if not counts:
+        return
+
+    stmt = _dialect_insert(SentimentRollup.__table__)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["granularity", "bucket_start", "source", "sentiment_label", "emotion"],
+        set_={"count": SentimentRollup.__table__.c["count"] + stmt.excluded["count"]}
+    )
+    db.execute(stmt, [
+        {"granularity": g, "bucket_start": bucket, "source": source, "sentiment_label": label, "emotion": emotion, "count": count}
+        # Sorted so concurrent workers lock rollup rows in the same order (no deadlocks)
+        for (g, bucket, source, label, emotion), count in sorted(counts.items())
+    ])
+
+def bulk_save_analyses(db, posts: list, analyses: list) -> set:
+    """
+    Insert a batch of posts and their analyses (lists of column dicts) in one transaction.
+    Rows that already exist are skipped, so replaying a batch is harmless. Each insert is
+    sent as a multi-row executemany. Rollup counters are bumped in the same transaction
+    for the analyses actually written. Returns the post_ids whose analysis was newly written.
+    """
+    if posts:
+        db.execute(_insert_ignoring_conflicts(SocialMediaPost.__table__), posts)
+
+    inserted = set()
+    if analyses:
+        table = SentimentAnalysis.__table__
+        result = db.execute(
+            _insert_ignoring_conflicts(table).returning(
+                table.c.post_id, table.c.analyzed_at, table.c.sentiment_label, table.c.emotion
+            ),
+            analyses
+        ).all()
+        inserted = {row.post_id for row in result}
+
+        sources = {post["post_id"]: post.get("source") for post in posts}
+        _add_to_rollups(db, [
+            (row.analyzed_at, sources.get(row.post_id), row.sentiment_label, row.emotion) for row in result
+        ])
+
+    db.commit()
+    return inserted
+
+def rebuild_rollups():
+    """
+    Recompute sentiment_rollups from the full sentiment_analysis history (Postgres only).
+    Run once after upgrading, or to repair counters, with the workers stopped:
+        python -c "from app.models.database import rebuild_rollups; rebuild_rollups()"
+    """
+    db = SessionLocal()
+    try:
+        db.execute(text("DELETE FROM sentiment_rollups"))
+        for granularity in ROLLUP_GRANULARITIES:
+            db.execute(text("""
+                INSERT INTO sentiment_rollups (granularity, bucket_start, source, sentiment_label, emotion, count)
+                SELECT CAST(:granularity AS VARCHAR), date_trunc(:granularity, a.analyzed_at), COALESCE(p.source, ''),
+                       a.sentiment_label, COALESCE(a.emotion, ''), COUNT(*)
+                FROM sentiment_analysis a
+                JOIN social_media_posts p ON p.post_id = a.post_id
+                GROUP BY 2, 3, 4, 5
+            """), {"granularity": granularity})
+        db.commit()
+    finally:
+        db.close()
\ No newline at end of file
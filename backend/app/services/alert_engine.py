@@ -0,0 +1,332 @@
+# backend/app/services/alert_engine.py
+import json
+import math
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+import numpy as np
+
+EMOTIONS = ("anger", "disgust", "fear", "joy", "neutral", "sadness", "surprise")
+# Every window keeps one running sum per feature. 'one' is never added to: with the
+# denominator floored at 1 it turns a count into "count / 1".
+FEATURES = ("one", "total", "positive", "negative", "neutral", "confidence") + tuple(f"emotion:{e}" for e in EMOTIONS)
+FEATURE_INDEX = {name: index for index, name in enumerate(FEATURES)}
+TOTAL = FEATURE_INDEX["total"]
+
+METRICS = ("ratio", "share", "count", "mean")
+OPERATORS = (">", "<")
+MAX_BUCKETS_PER_WINDOW = 600
+
+class SlidingWindow:
+    """
+    Running sums over the last window_seconds, kept in a ring buffer of time buckets,
+    for several scopes at once (row 0 = all posts, other rows = one source, ...).
+
+    Adding an event touches one bucket and the running totals; buckets that fall out
+    of the window are subtracted as time moves forward, so the cost per event is O(1)
+    amortized no matter how many events the window holds.
+    """
+    def __init__(self, window_seconds: float, bucket_seconds: float = 1.0, rows: int = 1):
+        self.window_seconds = window_seconds
+        # Long windows get coarser buckets so memory stays bounded
+        self.bucket_seconds = max(bucket_seconds, window_seconds / MAX_BUCKETS_PER_WINDOW)
+        self.size = max(1, math.ceil(window_seconds / self.bucket_seconds))
+        self.buckets = np.zeros((self.size, rows, len(FEATURES)))
+        self.totals = np.zeros((rows, len(FEATURES)))
+        self.head = None # Absolute index of the newest bucket
+
+    def ensure_rows(self, rows: int):
+        extra = rows - self.totals.shape[0]
+        if extra > 0:
+            self.buckets = np.pad(self.buckets, ((0, 0), (0, extra), (0, 0)))
+            self.totals = np.pad(self.totals, ((0, extra), (0, 0)))
+
+    def advance(self, now: float):
+        """Expire buckets older than the window"""
+        index = int(now // self.bucket_seconds)
+        if self.head is None:
+            self.head = index
+            return
+        if index <= self.head:
+            return
+        steps = index - self.head
+        if steps >= self.size:
+            self.buckets[:] = 0
+            self.totals[:] = 0
+        else:
+            for step in range(1, steps + 1):
+                slot = (self.head + step) % self.size
+                self.totals -= self.buckets[slot]
+                self.buckets[slot] = 0
+        self.head = index
+
+    def add(self, now: float, rows: List[int], values: np.ndarray):
+        self.advance(now)
+        index = int(now // self.bucket_seconds)
+        if index <= self.head - self.size:
+            return # Older than the window
+        slot = index % self.size
+        self.buckets[slot, rows] += values
+        self.totals[rows] += values
+
+    def add_many(self, times: np.ndarray, rows: np.ndarray, values: np.ndarray):
+        """
+        Add a batch of events: times, rows and values (one row of features per event)
+        are parallel arrays. One set of array operations per bucket the batch spans,
+        not per event.
+        """
+        indices = (times // self.bucket_seconds).astype(np.int64)
+        for index in np.unique(indices):
+            self.advance(index * self.bucket_seconds)
+            if index <= self.head - self.size:
+                continue # Older than the window
+            mask = indices == index
+            sums = np.zeros_like(self.totals)
+            np.add.at(sums, rows[mask], values[mask])
+            self.buckets[index % self.size] += sums
+            self.totals += sums
+
+class AlertRule:
+    """
+    One declarative alert rule, e.g. {"name": "anger_spike", "metric": "share",
+    "numerator": "emotion:anger", "threshold": 0.3, "window_seconds": 300}.
+
+    metric is how the value is computed from the window's sums:
+      - ratio: numerator / denominator (denominator floored at 1)
+      - share: numerator / total posts
+      - mean:  numerator / total posts, for sums like 'confidence'
+      - count: numerator over the window
+    The rule fires when the value goes above (op '>') or below (op '<') threshold with
+    at least min_posts in the window, optionally per value of a post field
+    (dimension='source'). It won't fire again until the value has moved back past
+    threshold * clear_ratio (threshold / clear_ratio for '<') and cooldown_seconds
+    have passed since the last alert.
+    """
+    FIELDS = ("name", "metric", "numerator", "denominator", "op", "threshold", "window_seconds",
+              "min_posts", "dimension", "clear_ratio", "cooldown_seconds")
+
+    def __init__(self, name: str = "high_negative_ratio", metric: str = "ratio", numerator: str = "negative",
+                 denominator: str = "positive", op: str = ">", threshold: float = 2.0,
+                 window_seconds: float = 300, min_posts: int = 5, dimension: Optional[str] = None,
+                 clear_ratio: float = 0.8, cooldown_seconds: float = 300):
+        if not name or len(name) > 50:
+            raise ValueError(f"Rule name must be 1-50 characters: {name!r}")
+        if metric not in METRICS:
+            raise ValueError(f"{name}: metric must be one of {METRICS}")
+        if op not in OPERATORS:
+            raise ValueError(f"{name}: op must be one of {OPERATORS}")
+        if numerator not in FEATURE_INDEX or (metric == "ratio" and denominator not in FEATURE_INDEX):
+            raise ValueError(f"{name}: numerator/denominator must be one of {FEATURES}")
+        if window_seconds <= 0 or not 0 < clear_ratio <= 1:
+            raise ValueError(f"{name}: window_seconds must be > 0 and clear_ratio in (0, 1]")
+
+        self.name = name
+        self.metric = metric
+        self.numerator = numerator
+        self.denominator = {"ratio": denominator, "share": "total", "mean": "total", "count": "one"}[metric]
+        self.op = op
+        self.threshold = float(threshold)
+        self.window_seconds = float(window_seconds)
+        self.min_posts = min_posts
+        self.dimension = dimension
+        self.clear_ratio = clear_ratio
+        self.cooldown_seconds = float(cooldown_seconds)
+
+    @classmethod
+    def from_dict(cls, spec: dict):
+        unknown = set(spec) - set(cls.FIELDS)
+        if unknown:
+            raise ValueError(f"{spec.get('name')}: unknown rule fields {sorted(unknown)}")
+        if "name" not in spec:
+            raise ValueError("Every rule needs a name")
+        return cls(**spec)
+
+    @property
+    def clear_level(self) -> float:
+        return self.threshold * self.clear_ratio if self.op == ">" else self.threshold / self.clear_ratio
+
+def load_rules(path: str) -> List[AlertRule]:
+    """Read a JSON list of rule specs; raises ValueError on an invalid file"""
+    with open(path) as f:
+        specs = json.load(f)
+    if not isinstance(specs, list):
+        raise ValueError(f"{path} must contain a JSON list of rules")
+    rules = [AlertRule.from_dict(spec) for spec in specs]
+    names = [rule.name for rule in rules]
+    if len(set(names)) != len(names):
+        raise ValueError(f"{path}: rule names must be unique")
+    return rules
+
+class StreamingAlertEngine:
+    """
+    Keeps sliding windows of post counts and evaluates every rule against them together.
+
+    add() only queues a post; the queue is counted into every window in bulk when the
+    windows are next read (each evaluation tick), so the per-post cost on the event
+    loop is a list append. evaluate() takes one snapshot of all window sums and
+    computes every (rule, scope) pair with array operations, so its cost barely grows
+    with the number of rules.
+    """
+    def __init__(self, rules: List[AlertRule], bucket_seconds: float = 1.0, eval_interval: float = 0.0):
+        self.bucket_seconds = bucket_seconds
+        self.eval_interval = eval_interval
+        self.last_eval = None
+        self.scopes = [(None, "all")] # Row -> (dimension, value)
+        self.scope_index = {(None, "all"): 0}
+        self.windows = {} # window_seconds -> SlidingWindow
+        self.pending = [] # (now, payload) added since the last flush
+        self.states = {} # (rule name, scope) -> (active, last_fired), kept across recompiles
+        self.instances = []
+        self.set_rules(rules)
+
+    def set_rules(self, rules: List[AlertRule]):
+        """Swap the rule set (hot reload); windows still in use keep their counts"""
+        self.flush()
+        self._save_states()
+        self.rules = list(rules)
+        self.dimensions = sorted({rule.dimension for rule in self.rules if rule.dimension})
+        lengths = sorted({rule.window_seconds for rule in self.rules})
+        self.windows = {length: self.windows.get(length) or
+                        SlidingWindow(length, self.bucket_seconds, len(self.scopes)) for length in lengths}
+        self._dirty = True
+
+    @staticmethod
+    def event_values(data: dict) -> np.ndarray:
+        values = np.zeros(len(FEATURES))
+        values[TOTAL] = 1
+        if data.get("sentiment_label") in FEATURE_INDEX:
+            values[FEATURE_INDEX[data["sentiment_label"]]] = 1
+        values[FEATURE_INDEX["confidence"]] = data.get("confidence_score") or 0.0
+        emotion = f"emotion:{data.get('emotion')}"
+        if emotion in FEATURE_INDEX:
+            values[FEATURE_INDEX[emotion]] = 1
+        return values
+
+    def _rows_for(self, data: dict) -> List[int]:
+        rows = [0]
+        for dimension in self.dimensions:
+            value = data.get(dimension)
+            if value is None:
+                continue
+            scope = (dimension, str(value))
+            row = self.scope_index.get(scope)
+            if row is None:
+                row = self.scope_index[scope] = len(self.scopes)
+                self.scopes.append(scope)
+                for window in self.windows.values():
+                    window.ensure_rows(len(self.scopes))
+                self._dirty = True
+            rows.append(row)
+        return rows
+
+    def add(self, data: dict, now: float):
+        """Count one post (a 'new_post' payload) at the next flush"""
+        self.pending.append((now, data))
+
+    def flush(self):
+        """Count every queued post into the windows, a whole batch per array operation"""
+        if not self.pending:
+            return
+        pending, self.pending = self.pending, []
+        events, rows = [], []
+        for i, (_, data) in enumerate(pending):
+            for row in self._rows_for(data): # Also registers new scopes
+                events.append(i)
+                rows.append(row)
+
+        labels = np.array([FEATURE_INDEX.get(data.get("sentiment_label"), -1) for _, data in pending])
+        emotions = np.array([FEATURE_INDEX.get(f"emotion:{data.get('emotion')}", -1) for _, data in pending])
+        values = np.zeros((len(pending), len(FEATURES)))
+        values[:, TOTAL] = 1
+        values[:, FEATURE_INDEX["confidence"]] = [data.get("confidence_score") or 0.0 for _, data in pending]
+        for columns in (labels, emotions):
+            known = np.flatnonzero(columns >= 0)
+            values[known, columns[known]] = 1
+
+        events = np.array(events)
+        times = np.array([now for now, _ in pending])[events]
+        rows = np.array(rows)
+        for window in self.windows.values():
+            window.add_many(times, rows, values[events])
+
+    def process(self, data: dict, now: float) -> List[dict]:
+        """Count one post and, unless evaluated less than eval_interval ago, return new alerts"""
+        self.add(data, now)
+        if self.last_eval is not None and now - self.last_eval < self.eval_interval:
+            return []
+        return self.evaluate(now)
+
+    def _save_states(self):
+        for i, (rule, row) in enumerate(self.instances):
+            self.states[(rule.name, self.scopes[row])] = (bool(self.active[i]), float(self.last_fired[i]))
+
+    def _compile(self):
+        """Lay the (rule, scope) pairs out as parallel arrays"""
+        self._save_states()
+        lengths = list(self.windows)
+        self.instances = [(rule, row) for rule in self.rules
+                          for row, (dimension, _) in enumerate(self.scopes) if dimension == rule.dimension]
+        rows = len(self.scopes)
+
+        def array(values, dtype=float):
+            return np.array(list(values), dtype=dtype)
+
+        self.snapshot_rows = array((lengths.index(r.window_seconds) * rows + row for r, row in self.instances), int)
+        self.numerators = array((FEATURE_INDEX[r.numerator] for r, _ in self.instances), int)
+        self.denominators = array((FEATURE_INDEX[r.denominator] for r, _ in self.instances), int)
+        self.signs = array(1.0 if r.op == ">" else -1.0 for r, _ in self.instances)
+        self.thresholds = array(r.threshold for r, _ in self.instances)
+        self.clear_levels = array(r.clear_level for r, _ in self.instances)
+        self.min_posts = array(r.min_posts for r, _ in self.instances)
+        self.cooldowns = array(r.cooldown_seconds for r, _ in self.instances)
+        states = [self.states.get((r.name, self.scopes[row]), (False, -np.inf)) for r, row in self.instances]
+        self.active = array((active for active, _ in states), bool)
+        self.last_fired = array(last_fired for _, last_fired in states)
+        self._dirty = False
+
+    def snapshot(self, now: float) -> np.ndarray:
+        """Sums of every window and scope as one (windows * scopes, features) matrix"""
+        self.flush()
+        for window in self.windows.values():
+            window.advance(now)
+        return np.concatenate([window.totals for window in self.windows.values()])
+
+    def evaluate(self, now: float) -> List[dict]:
+        self.flush() # May add scopes, so before compiling
+        if self._dirty:
+            self._compile()
+        self.last_eval = now
+        if not self.instances:
+            return []
+
+        sums = self.snapshot(now)[self.snapshot_rows]
+        picks = np.arange(len(self.instances))
+        values = sums[picks, self.numerators] / np.maximum(sums[picks, self.denominators], 1)
+        totals = sums[:, TOTAL]
+
+        above = self.signs * (values - self.thresholds) > 0
+        cleared = self.signs * (values - self.clear_levels) < 0
+        fire = (~self.active & above & (totals >= self.min_posts)
+                & (now - self.last_fired >= self.cooldowns))
+        self.active = (self.active & ~cleared) | fire
+        self.last_fired[fire] = now
+
+        return [self._alert(i, values[i], sums[i]) for i in np.flatnonzero(fire)]
+
+    def _alert(self, i: int, value: float, sums: np.ndarray) -> dict:
+        rule, row = self.instances[i]
+        window_end = datetime.utcnow()
+        details = {label: int(sums[FEATURE_INDEX[label]]) for label in ("positive", "negative", "neutral")}
+        details["metric"] = rule.metric
+        details["numerator"] = rule.numerator
+        if rule.dimension:
+            details[rule.dimension] = self.scopes[row][1]
+        return {
+            "alert_type": rule.name,
+            "threshold_value": rule.threshold,
+            "actual_value": float(value),
+            "window_start": window_end - timedelta(seconds=rule.window_seconds),
+            "window_end": window_end,
+            "post_count": int(sums[TOTAL]),
+            "details": details,
+        }
@@ -1,66 +1,175 @@
 # backend/app/services/alerting.py
+import os
+import json
+import time
 import asyncio
 import logging
+import redis.asyncio as redis
 from datetime import datetime, timedelta
-from sqlalchemy import func
-from app.models.database import SessionLocal, SentimentAnalysis, SentimentAlert
+from sqlalchemy import select, func
+from app.models.database import AsyncSessionLocal, SentimentAnalysis, SentimentAlert, get_async_redis
+from app.services.alert_engine import AlertRule, StreamingAlertEngine, load_rules
+from app.metrics import ALERTS_FIRED, ALERT_EVAL_SECONDS
 
 logger = logging.getLogger(__name__)
 
+ALERT_MODES = ("streaming", "polling")
+
 class AlertService:
+    """
+    Sentiment alerts, in one of two modes (ALERT_MODE):
+      - streaming: count every post published on sentiment_updates into sliding
+        windows and evaluate all rules together several times a second (default;
+        no DB reads). Rules come from ALERT_RULES_FILE, reloaded when it changes.
+      - polling:   re-query the last 5 minutes of analyses every minute (one
+        negative-ratio rule)
+    """
     def __init__(self):
         self.threshold = 2.0 # Ratio of Negative to Positive
         self.window_minutes = 5
         self.min_posts = 5
+        self.mode = os.getenv("ALERT_MODE", "streaming")
+        if self.mode not in ALERT_MODES:
+            raise ValueError(f"ALERT_MODE must be one of {ALERT_MODES}")
+        self.rules_file = os.getenv("ALERT_RULES_FILE")
+        self.rules_mtime = None
+        self.reload_seconds = float(os.getenv("ALERT_RULES_RELOAD_SECONDS", 5))
+        self.engine = StreamingAlertEngine(self.default_rules(), float(os.getenv("ALERT_BUCKET_SECONDS", 1)),
+                                           float(os.getenv("ALERT_EVAL_INTERVAL_MS", 100)) / 1000)
+        self.reload_rules()
 
-    async def check_thresholds(self):
-        db = SessionLocal()
+    def default_rules(self):
+        cooldown = float(os.getenv("ALERT_COOLDOWN_SECONDS", 300))
+        rules = [AlertRule("high_negative_ratio", threshold=self.threshold, window_seconds=self.window_minutes * 60,
+                           min_posts=self.min_posts, cooldown_seconds=cooldown)]
+        for dimension in filter(None, os.getenv("ALERT_DIMENSIONS", "source").split(",")):
+            rules.append(AlertRule(f"high_negative_ratio_by_{dimension.strip()}", threshold=self.threshold,
+                                   window_seconds=self.window_minutes * 60, min_posts=self.min_posts,
+                                   dimension=dimension.strip(), cooldown_seconds=cooldown))
+        return rules
+
+    def reload_rules(self):
+        """Load ALERT_RULES_FILE if it changed since the last load; a broken file keeps the old rules"""
+        if not self.rules_file:
+            return
         try:
-            now = datetime.utcnow()
-            window_start = now - timedelta(minutes=self.window_minutes)
-
-            # Get counts
-            results = db.query(
-                SentimentAnalysis.sentiment_label, func.count(SentimentAnalysis.id)
-            ).filter(SentimentAnalysis.analyzed_at >= window_start).group_by(SentimentAnalysis.sentiment_label).all()
-
-            counts = {"positive": 0, "negative": 0, "neutral": 0}
-            for label, count in results:
-                if label in counts:
-                    counts[label] = count
-
-            total = sum(counts.values())
-            
-            if total < self.min_posts:
+            mtime = os.path.getmtime(self.rules_file)
+            if mtime == self.rules_mtime:
                 return
+            self.rules_mtime = mtime
+            rules = load_rules(self.rules_file)
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not load alert rules from {self.rules_file}: {e}")
+            return
+        self.engine.set_rules(rules)
+        logger.info(f"Loaded {len(rules)} alert rules from {self.rules_file}")
+
+    async def check_thresholds(self):
+        try:
+            async with AsyncSessionLocal() as db:
+                now = datetime.utcnow()
+                window_start = now - timedelta(minutes=self.window_minutes)
+
+                # Get counts
+                results = (await db.execute(
+                    select(SentimentAnalysis.sentiment_label, func.count(SentimentAnalysis.id))
+                    .where(SentimentAnalysis.analyzed_at >= window_start)
+                    .group_by(SentimentAnalysis.sentiment_label)
+                )).all()
+
+                counts = {"positive": 0, "negative": 0, "neutral": 0}
+                for label, count in results:
+                    if label in counts:
+                        counts[label] = count
+
+                total = sum(counts.values())
+                
+                if total < self.min_posts:
+                    return
 
-            # Avoid division by zero
-            pos_count = counts["positive"] if counts["positive"] > 0 else 1
-            ratio = counts["negative"] / pos_count
-
-            if ratio > self.threshold:
-                logger.warning(f"ALERT TRIGGERED: Negative Ratio {ratio:.2f}")
-                    
-                # Save Alert
-                alert = SentimentAlert(
-                    alert_type="high_negative_ratio",
-                    threshold_value=self.threshold,
-                    actual_value=ratio,
-                    window_start=window_start,
-                    window_end=now,
-                    post_count=total,
-                    details=counts
-                )
-                db.add(alert)
-                db.commit()
+                # Avoid division by zero
+                pos_count = counts["positive"] if counts["positive"] > 0 else 1
+                ratio = counts["negative"] / pos_count
+
+                if ratio > self.threshold:
+                    logger.warning(f"ALERT TRIGGERED: Negative Ratio {ratio:.2f}")
+                        
+                    # Save Alert
+                    alert = SentimentAlert(
+                        alert_type="high_negative_ratio",
+                        threshold_value=self.threshold,
+                        actual_value=ratio,
+                        window_start=window_start,
+                        window_end=now,
+                        post_count=total,
+                        details=counts
+                    )
+                    db.add(alert)
+                    await db.commit()
 
         except Exception as e:
             logger.error(f"Alert check failed: {e}")
-        finally:
-            db.close()
 
     async def run_monitoring_loop(self):
         logger.info("Starting Alert Monitoring Loop...")
         while True:
             await self.check_thresholds()
-            await asyncio.sleep(60) # Check every minute
\ No newline at end of file
+            await asyncio.sleep(60) # Check every minute
+
+    async def save_alerts(self, alerts):
+        """Store alerts from the streaming engine and push them to the dashboard"""
+        try:
+            async with AsyncSessionLocal() as db:
+                db.add_all([SentimentAlert(**alert) for alert in alerts])
+                await db.commit()
+            for alert in alerts:
+                ALERTS_FIRED.labels(alert['alert_type']).inc()
+                logger.warning(f"ALERT TRIGGERED: {alert['alert_type']} {alert['actual_value']:.2f} {alert['details']}")
+                message = {"type": "alert", "data": {**alert, "window_start": alert["window_start"].isoformat(),
+                                                     "window_end": alert["window_end"].isoformat()}}
+                await get_async_redis().publish('sentiment_updates', json.dumps(message))
+        except Exception as e:
+            logger.error(f"Saving alerts failed: {e}")
+
+    async def run_streaming_loop(self):
+        logger.info("Starting streaming alert engine...")
+        tick = max(self.engine.eval_interval, 0.05)
+        last_reload = time.monotonic()
+        while True:
+            # Own connection: the shared client's socket timeout would end an idle subscription
+            r = redis.Redis(host=os.getenv("REDIS_HOST", "redis"), port=int(os.getenv("REDIS_PORT", 6379)))
+            pubsub = r.pubsub()
+            try:
+                await pubsub.subscribe('sentiment_updates')
+                while True:
+                    # Wake up at least every tick so windows expire (and alerts clear) when it's quiet
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=tick)
+                    now = time.time()
+                    if message:
+                        update = json.loads(message['data'])
+                        if update.get("type") == "new_post":
+                            self.engine.add(update["data"], now)
+
+                    if self.engine.last_eval is None or now - self.engine.last_eval >= self.engine.eval_interval:
+                        with ALERT_EVAL_SECONDS.time():
+                            alerts = self.engine.evaluate(now)
+                        if alerts:
+                            await self.save_alerts(alerts)
+
+                    if time.monotonic() - last_reload >= self.reload_seconds:
+                        last_reload = time.monotonic()
+                        self.reload_rules()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Streaming alert engine lost its subscription, reconnecting: {e}")
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+                await r.aclose()
+
+    async def run(self):
+        if self.mode == "streaming":
+            await self.run_streaming_loop()
+        else:
+            await self.run_monitoring_loop()
\ No newline at end of file
@@ -0,0 +1,141 @@
+# backend/app/services/inference_cache.py
+import os
+import re
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+from app.metrics import INFERENCE_CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+class InferenceCache:
+    """
+    Memoizes analyzer results by content hash so duplicate posts (retweets,
+    copy-paste, templated text) skip the transformer.
+
+    Two tiers:
+      1. A bounded in-process LRU (always on)
+      2. An optional Redis tier shared by every worker, with a TTL
+
+    Keys include the model names and neutral threshold, so changing
+    HUGGINGFACE_MODEL / EMOTION_MODEL automatically stops old entries from matching.
+    """
+
+    def __init__(self, model_key: str, max_size: int = 10000, redis_client=None, ttl_seconds: int = 3600):
+        self.model_key = model_key
+        self.max_size = max_size
+        self.redis = redis_client
+        self.ttl_seconds = ttl_seconds
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Counters
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls, model_key: str):
+        """Build a cache from INFERENCE_CACHE_* settings (Redis tier only if enabled)."""
+        redis_client = None
+        if os.getenv("INFERENCE_CACHE_REDIS", "false").lower() in ("1", "true", "yes"):
+            import redis
+            redis_client = redis.Redis(
+                host=os.getenv("REDIS_HOST", "redis"),
+                port=int(os.getenv("REDIS_PORT", 6379)),
+                decode_responses=True,
+                socket_timeout=2
+            )
+        return cls(
+            model_key,
+            max_size=int(os.getenv("INFERENCE_CACHE_SIZE", 10000)),
+            redis_client=redis_client,
+            ttl_seconds=int(os.getenv("INFERENCE_CACHE_TTL", 3600))
+        )
+
+    def key_for(self, text: str) -> str:
+        """Cache key: models + hash of the whitespace-normalized text."""
+        normalized = _WHITESPACE.sub(" ", text).strip()
+        digest = hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+        return f"inference:{self.model_key}:{digest}"
+
+    def get_many(self, texts: list) -> list:
+        """Look up a list of texts. Returns a result dict (copy) or None per text."""
+        keys = [self.key_for(text) for text in texts]
+        results = [None] * len(texts)
+        missing = []
+        redis_hits = 0
+
+        with self._lock:
+            for i, key in enumerate(keys):
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    results[i] = dict(self._entries[key])
+                    self.local_hits += 1
+                else:
+                    missing.append(i)
+
+        if missing and self.redis is not None:
+            try:
+                values = self.redis.mget([keys[i] for i in missing])
+            except Exception as e:
+                logger.warning(f"Inference cache Redis lookup failed: {e}")
+                values = [None] * len(missing)
+
+            still_missing = []
+            for i, value in zip(missing, values):
+                if value is None:
+                    still_missing.append(i)
+                    continue
+                results[i] = json.loads(value)
+                self._store_local(keys[i], results[i])
+            redis_hits = len(missing) - len(still_missing)
+            with self._lock:
+                self.redis_hits += redis_hits
+            missing = still_missing
+
+        with self._lock:
+            self.misses += len(missing)
+        INFERENCE_CACHE_LOOKUPS.labels("local_hit").inc(len(texts) - len(missing) - redis_hits)
+        INFERENCE_CACHE_LOOKUPS.labels("redis_hit").inc(redis_hits)
+        INFERENCE_CACHE_LOOKUPS.labels("miss").inc(len(missing))
+        return results
+
+    def set_many(self, texts: list, results: list):
+        """Store freshly computed results in both tiers."""
+        keys = [self.key_for(text) for text in texts]
+        for key, result in zip(keys, results):
+            self._store_local(key, result)
+
+        if self.redis is not None:
+            try:
+                pipe = self.redis.pipeline(transaction=False)
+                for key, result in zip(keys, results):
+                    pipe.set(key, json.dumps(result), ex=self.ttl_seconds)
+                pipe.execute()
+            except Exception as e:
+                logger.warning(f"Inference cache Redis write failed: {e}")
+
+    def _store_local(self, key: str, result: dict):
+        with self._lock:
+            self._entries[key] = dict(result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        lookups = self.local_hits + self.redis_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_rate": (self.local_hits + self.redis_hits) / lookups if lookups else 0.0
+        }
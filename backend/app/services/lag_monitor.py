@@ -0,0 +1,137 @@
+# backend/app/services/lag_monitor.py
+import os
+import json
+import math
+import time
+import asyncio
+import logging
+from typing import Optional
+
+from app.models.database import get_async_redis
+
+logger = logging.getLogger(__name__)
+
+def _text(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+class StreamLagMonitor:
+    """
+    Watches how far the worker group is behind on the posts stream.
+
+    Every interval it reads XINFO STREAM/GROUPS/CONSUMERS and works out:
+      - backlog: entries not yet delivered (lag) plus delivered but unacknowledged (pending)
+      - ingest and processing rates (entries/sec since the previous sample)
+      - eta_seconds: time to drain the backlog at the current net rate (None = not draining)
+      - recommended_workers: workers needed to keep up and drain the backlog within
+        target_drain_seconds, for an external autoscaler
+      - backpressure: 'ok', 'throttle' (backlog above throttle_threshold) or 'shed'
+        (above shed_threshold); it drops a level only once the backlog is 20% under it
+    The snapshot is stored under backpressure:<stream> (expiring after a few intervals),
+    where the ingester and every API replica can read it.
+    """
+    def __init__(self, stream_name: str = None, group_name: str = None):
+        self.stream_name = stream_name or os.getenv("REDIS_STREAM_NAME", "social_posts_stream")
+        self.group_name = group_name or os.getenv("REDIS_CONSUMER_GROUP", "sentiment_workers")
+        self.key = f"backpressure:{self.stream_name}"
+        self.interval = float(os.getenv("LAG_MONITOR_INTERVAL", 5))
+        self.throttle_threshold = int(os.getenv("LAG_THROTTLE_THRESHOLD", 10000))
+        self.shed_threshold = int(os.getenv("LAG_SHED_THRESHOLD", 100000))
+        self.target_drain_seconds = float(os.getenv("LAG_TARGET_DRAIN_SECONDS", 300))
+        self.min_workers = int(os.getenv("LAG_MIN_WORKERS", 1))
+        self.max_workers = int(os.getenv("LAG_MAX_WORKERS", 32))
+        self.active_consumer_ms = 60000 # Consumers idle longer than this don't count as workers
+        self.previous = None
+        self.level = "ok"
+
+    def _backpressure(self, backlog: int) -> str:
+        if backlog >= self.shed_threshold or (self.level == "shed" and backlog >= self.shed_threshold * 0.8):
+            self.level = "shed"
+        elif backlog >= self.throttle_threshold or (self.level != "ok" and backlog >= self.throttle_threshold * 0.8):
+            self.level = "throttle"
+        else:
+            self.level = "ok"
+        return self.level
+
+    def update(self, stream_info: dict, group_info: dict, active_consumers: int, now: float) -> dict:
+        """Turn one XINFO sample into a lag snapshot (rates need a previous sample)"""
+        added = stream_info.get("entries-added")
+        read = group_info.get("entries-read")
+        pending = group_info.get("pending", 0)
+        lag = group_info.get("lag")
+        if lag is None:
+            # Redis can't always tell (e.g. after deletions); the stream length is an upper bound
+            lag = max(0, stream_info.get("length", 0) - pending)
+        backlog = lag + pending
+
+        ingest_rate = processing_rate = None
+        if self.previous and added is not None and read is not None:
+            elapsed = now - self.previous["time"]
+            if elapsed > 0:
+                ingest_rate = (added - self.previous["added"]) / elapsed
+                # Acknowledged = read minus what is still pending
+                processing_rate = max(0.0, ((read - self.previous["read"]) - (pending - self.previous["pending"])) / elapsed)
+        self.previous = {"time": now, "added": added, "read": read, "pending": pending}
+
+        eta = None
+        if backlog == 0:
+            eta = 0.0
+        elif processing_rate is not None and processing_rate > ingest_rate:
+            eta = backlog / (processing_rate - ingest_rate)
+
+        recommended = max(active_consumers, self.min_workers)
+        if processing_rate and active_consumers:
+            per_worker = processing_rate / active_consumers
+            needed = (ingest_rate + backlog / self.target_drain_seconds) / per_worker
+            recommended = min(self.max_workers, max(self.min_workers, math.ceil(needed)))
+
+        return {
+            "stream": self.stream_name,
+            "group": self.group_name,
+            "lag": lag,
+            "pending": pending,
+            "backlog": backlog,
+            "ingest_rate": ingest_rate,
+            "processing_rate": processing_rate,
+            "eta_seconds": eta,
+            "active_workers": active_consumers,
+            "recommended_workers": recommended,
+            "backpressure": self._backpressure(backlog),
+            "sampled_at": time.time(),
+        }
+
+    async def sample(self) -> Optional[dict]:
+        """Read XINFO from Redis and return a snapshot (None if the group doesn't exist yet)"""
+        redis = get_async_redis()
+        try:
+            stream_info = await redis.xinfo_stream(self.stream_name)
+            groups = await redis.xinfo_groups(self.stream_name)
+        except Exception as e:
+            logger.warning(f"Lag monitor could not read {self.stream_name}: {e}")
+            return None
+        group_info = next((g for g in groups if _text(g.get("name")) == self.group_name), None)
+        if group_info is None:
+            return None
+        consumers = await redis.xinfo_consumers(self.stream_name, self.group_name)
+        active = sum(1 for consumer in consumers if consumer.get("idle", 0) < self.active_consumer_ms)
+        return self.update(stream_info, group_info, active, time.monotonic())
+
+    async def read(self) -> Optional[dict]:
+        """The latest published snapshot (from whichever replica runs the monitor)"""
+        raw = await get_async_redis().get(self.key)
+        return json.loads(raw) if raw else None
+
+    async def run(self):
+        logger.info(f"Starting lag monitor for {self.stream_name}/{self.group_name}...")
+        while True:
+            try:
+                snapshot = await self.sample()
+                if snapshot:
+                    await get_async_redis().set(self.key, json.dumps(snapshot), ex=max(1, int(self.interval * 3)))
+                    if snapshot["backpressure"] != "ok":
+                        logger.warning(f"Stream backlog {snapshot['backlog']}: backpressure {snapshot['backpressure']}, "
+                                       f"recommended workers {snapshot['recommended_workers']}")
+            except Exception as e:
+                logger.error(f"Lag monitor failed: {e}")
+            await asyncio.sleep(self.interval)
+
+lag_monitor = StreamLagMonitor()
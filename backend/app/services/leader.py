@@ -0,0 +1,90 @@
+# backend/app/services/leader.py
+import os
+import uuid
+import socket
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Only touch the key if we still own it (compare-and-set has to be atomic, hence Lua)
+_RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+class LeaderElection:
+    """
+    Redis-lock leader election so a background job runs on exactly one API replica.
+
+    Every replica competes for the key `leader:<name>` (SET NX with a TTL). The holder
+    runs the job and renews the lock every renew_interval seconds; if renewal fails
+    (Redis hiccup, long GC pause, lost lock) it stops the job and goes back to
+    competing. If the leader dies, its lock expires after ttl seconds and another
+    replica takes over.
+    """
+    def __init__(self, redis_client, name: str, ttl_seconds: float = None, renew_interval: float = None):
+        self.redis = redis_client
+        self.key = f"leader:{name}"
+        self.token = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.ttl_seconds = ttl_seconds or float(os.getenv("LEADER_LOCK_TTL", 15))
+        self.renew_interval = renew_interval or self.ttl_seconds / 3
+        self.is_leader = False
+
+    async def try_acquire(self) -> bool:
+        acquired = await self.redis.set(self.key, self.token, nx=True, px=int(self.ttl_seconds * 1000))
+        self.is_leader = bool(acquired)
+        return self.is_leader
+
+    async def renew(self) -> bool:
+        renewed = await self.redis.eval(_RENEW_SCRIPT, 1, self.key, self.token, int(self.ttl_seconds * 1000))
+        self.is_leader = bool(renewed)
+        return self.is_leader
+
+    async def release(self):
+        try:
+            await self.redis.eval(_RELEASE_SCRIPT, 1, self.key, self.token)
+        except Exception as e:
+            logger.warning(f"Could not release {self.key}: {e}")
+        self.is_leader = False
+
+    async def run(self, job):
+        """Run `job()` (a coroutine function) only while this replica holds the lock"""
+        while True:
+            try:
+                if not await self.try_acquire():
+                    await asyncio.sleep(self.renew_interval)
+                    continue
+            except Exception as e:
+                logger.warning(f"Leader election for {self.key} failed: {e}")
+                await asyncio.sleep(self.renew_interval)
+                continue
+
+            logger.info(f"{self.token} is now leader for {self.key}")
+            task = asyncio.create_task(job())
+            try:
+                while not task.done():
+                    await asyncio.sleep(self.renew_interval)
+                    try:
+                        if not await self.renew():
+                            break
+                    except Exception as e:
+                        logger.warning(f"Renewing {self.key} failed: {e}")
+                        break
+            finally:
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled() and task.exception():
+                    # The job crashed; surface it now instead of as "never retrieved" at exit
+                    logger.error(f"{self.key} job failed, re-electing", exc_info=task.exception())
+                # Hand the lock over right away instead of waiting for the TTL
+                await self.release()
+            logger.info(f"{self.token} gave up leadership for {self.key}")
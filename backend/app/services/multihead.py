@@ -0,0 +1,101 @@
+# backend/app/services/multihead.py
+"""
+Sentiment and emotion in one pass, for models that share a tokenizer.
+
+The texts are tokenized once and each padded chunk is fed to both models. When the
+two models also have identical encoder weights (two heads fine-tuned on one frozen
+encoder, or a combined model exported as two checkpoints) the encoder runs once and
+only the two classification heads run separately. Results have the same
+{'label', 'score'} shape as the text-classification pipelines.
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Architectures whose classification head head_logits() can run on its own
+SPLIT_HEAD_TYPES = ("distilbert", "roberta", "xlm-roberta", "camembert", "bert")
+
+def same_tokenizer(a, b) -> bool:
+    return (type(a) is type(b) and a.get_vocab() == b.get_vocab()
+            and a.all_special_tokens == b.all_special_tokens
+            and a.init_kwargs.get("do_lower_case") == b.init_kwargs.get("do_lower_case"))
+
+def same_encoder(a, b) -> bool:
+    """True if both models have the same encoder architecture and weights"""
+    import torch
+
+    if type(a.base_model) is not type(b.base_model):
+        return False
+    state_a, state_b = a.base_model.state_dict(), b.base_model.state_dict()
+    return state_a.keys() == state_b.keys() and all(torch.equal(state_a[k], state_b[k]) for k in state_a)
+
+def head_logits(model, outputs):
+    """The classification head of a *ForSequenceClassification model applied to its encoder's outputs"""
+    import torch
+
+    hidden = outputs[0]
+    if model.config.model_type == "distilbert":
+        # [CLS] -> pre_classifier -> ReLU -> classifier (dropout is off in eval mode)
+        return model.classifier(torch.nn.functional.relu(model.pre_classifier(hidden[:, 0])))
+    if model.config.model_type in ("roberta", "xlm-roberta", "camembert"):
+        return model.classifier(hidden) # The head picks the first token itself
+    if model.config.model_type == "bert":
+        return model.classifier(outputs[1]) # Pooled output
+    raise ValueError(f"Can't split the head off a {model.config.model_type} model")
+
+class MultiHeadRunner:
+    def __init__(self, sentiment_model, emotion_model, tokenizer, shared_encoder: bool):
+        self.sentiment_model = sentiment_model
+        self.emotion_model = emotion_model
+        self.tokenizer = tokenizer
+        self.shared_encoder = shared_encoder
+
+    @classmethod
+    def create(cls, sentiment_pipeline, emotion_pipeline):
+        """A runner for the two pipelines' models, or None if they don't share a tokenizer"""
+        if not same_tokenizer(sentiment_pipeline.tokenizer, emotion_pipeline.tokenizer):
+            logger.warning("Multi-head mode needs models with the same tokenizer; running them separately")
+            return None
+        sentiment_model, emotion_model = sentiment_pipeline.model, emotion_pipeline.model
+        shared = (sentiment_model.config.model_type == emotion_model.config.model_type
+                  and sentiment_model.config.model_type in SPLIT_HEAD_TYPES
+                  and same_encoder(sentiment_model, emotion_model))
+        logger.info(f"Multi-head mode: one tokenization, {'one encoder pass' if shared else 'two encoder passes'}")
+        return cls(sentiment_model, emotion_model, sentiment_pipeline.tokenizer, shared)
+
+    def tokenize(self, texts: list) -> dict:
+        """Token ids for every text (unpadded; chunks are padded in run())"""
+        return self.tokenizer(texts, truncation=True)
+
+    def run(self, encodings, indices: list):
+        """(sentiment results, emotion results) for the texts at indices, one forward pass each"""
+        import torch
+
+        batch = self.tokenizer.pad({key: [encodings[key][i] for i in indices] for key in encodings.keys()},
+                                   return_tensors="pt")
+        with torch.no_grad():
+            if self.shared_encoder:
+                outputs = self.sentiment_model.base_model(**self._encoder_inputs(batch))
+                sentiment_logits = head_logits(self.sentiment_model, outputs)
+                emotion_logits = head_logits(self.emotion_model, outputs)
+            else:
+                sentiment_logits = self.sentiment_model(**self._encoder_inputs(batch)).logits
+                emotion_logits = self.emotion_model(**self._encoder_inputs(batch)).logits
+        return self._top(self.sentiment_model, sentiment_logits), self._top(self.emotion_model, emotion_logits)
+
+    def _encoder_inputs(self, batch) -> dict:
+        # DistilBERT/RoBERTa tokenizers may return token_type_ids their models don't accept
+        return {key: value for key, value in batch.items() if key in ("input_ids", "attention_mask")}
+
+    def _top(self, model, logits) -> list:
+        """Top label and score per row, scored like the text-classification pipeline"""
+        import torch
+
+        config = model.config
+        if config.problem_type == "multi_label_classification" or config.num_labels == 1:
+            scores = torch.sigmoid(logits)
+        else:
+            scores = torch.softmax(logits, dim=-1)
+        best = scores.max(dim=-1)
+        return [{"label": config.id2label[int(index)], "score": float(score)}
+                for score, index in zip(best.values, best.indices)]
@@ -0,0 +1,134 @@
+# backend/app/services/pre_classifier.py
+"""
+Cheap first tier of the cascaded analyzer (MODEL_CASCADE).
+
+A weighted lexicon scores a whole batch at once with NumPy: every word of every text
+becomes one entry of a flat token array, and per-text polarity and emotion votes are
+summed with bincount/add.at. Short posts with clear, one-sided polarity ("I absolutely
+love X", "Hate X") are answered here; everything else (no lexicon words, mixed
+polarity, negated words only, long posts, low confidence) is escalated to the
+transformers.
+"""
+import os
+import re
+import json
+import hashlib
+import numpy as np
+
+# word -> (polarity weight, emotion it signals)
+DEFAULT_LEXICON = {
+    "love": (3.0, "joy"), "loving": (2.5, "joy"), "loved": (2.5, "joy"), "amazing": (3.0, "joy"),
+    "awesome": (3.0, "joy"), "excellent": (3.0, "joy"), "fantastic": (3.0, "joy"), "wonderful": (3.0, "joy"),
+    "great": (2.0, "joy"), "best": (2.5, "joy"), "perfect": (2.5, "joy"), "happy": (2.5, "joy"),
+    "delighted": (3.0, "joy"), "brilliant": (2.5, "joy"), "incredible": (2.5, "surprise"),
+    "impressed": (2.5, "surprise"), "wow": (2.0, "surprise"), "good": (1.5, "joy"), "nice": (1.5, "joy"),
+    "enjoy": (2.0, "joy"), "recommend": (2.0, "joy"), "thrilled": (3.0, "joy"), "beautiful": (2.5, "joy"),
+    "hate": (-3.0, "anger"), "hated": (-3.0, "anger"), "furious": (-3.0, "anger"), "angry": (-3.0, "anger"),
+    "worst": (-3.0, "anger"), "awful": (-3.0, "disgust"), "terrible": (-3.0, "disgust"),
+    "horrible": (-3.0, "disgust"), "disgusting": (-3.0, "disgust"), "gross": (-2.5, "disgust"),
+    "useless": (-2.5, "anger"), "scam": (-3.0, "anger"), "broken": (-2.0, "anger"), "bad": (-2.0, "sadness"),
+    "disappointed": (-2.5, "sadness"), "disappointing": (-2.5, "sadness"), "sad": (-2.5, "sadness"),
+    "unhappy": (-2.5, "sadness"), "regret": (-2.5, "sadness"), "poor": (-2.0, "sadness"),
+    "scared": (-2.5, "fear"), "afraid": (-2.5, "fear"), "worried": (-2.0, "fear"), "dangerous": (-2.5, "fear"),
+}
+NEGATORS = ("not", "no", "never", "isn't", "wasn't", "don't", "doesn't", "didn't", "can't", "won't", "nothing")
+
+_WORD = re.compile(r"[a-z']+")
+
+class LexiconClassifier:
+    """
+    Lexicon sentiment/emotion scorer for whole batches.
+      - threshold: minimum confidence (a logistic of the polarity score) to answer a post
+      - max_words: longer posts always go to the transformer
+    """
+    MODEL_NAME = "lexicon"
+
+    def __init__(self, lexicon: dict = None, threshold: float = 0.9, max_words: int = 24, scale: float = 1.5):
+        lexicon = lexicon or DEFAULT_LEXICON
+        self.threshold = threshold
+        self.max_words = max_words
+        self.scale = scale
+
+        words = list(lexicon) + [word for word in NEGATORS if word not in lexicon]
+        self.vocab = {word: i for i, word in enumerate(words)}
+        self.unknown = len(words) # Index for every other word
+        self.emotions = sorted({emotion for _, emotion in lexicon.values()})
+        emotion_index = {emotion: i for i, emotion in enumerate(self.emotions)}
+
+        self.weights = np.zeros(len(words) + 1)
+        self.emotion_ids = np.full(len(words) + 1, -1)
+        for word, (weight, emotion) in lexicon.items():
+            self.weights[self.vocab[word]] = weight
+            self.emotion_ids[self.vocab[word]] = emotion_index[emotion]
+        self.is_negator = np.zeros(len(words) + 1, dtype=bool)
+        self.is_negator[[self.vocab[word] for word in NEGATORS]] = True
+        # Content hash, so cached results stop matching when the word list changes
+        spec = json.dumps([sorted((word, list(entry)) for word, entry in lexicon.items()), NEGATORS, scale])
+        self.fingerprint = hashlib.sha256(spec.encode()).hexdigest()[:16]
+
+    @classmethod
+    def from_env(cls):
+        """Build from CASCADE_* settings (PRECLASSIFIER_LEXICON: JSON file of word -> [weight, emotion])"""
+        lexicon = None
+        path = os.getenv("PRECLASSIFIER_LEXICON")
+        if path:
+            with open(path) as f:
+                lexicon = {word: (float(weight), emotion) for word, (weight, emotion) in json.load(f).items()}
+        return cls(lexicon, threshold=float(os.getenv("CASCADE_THRESHOLD", 0.9)),
+                   max_words=int(os.getenv("CASCADE_MAX_WORDS", 24)))
+
+    def cache_key(self) -> str:
+        """Part of the analyzer's cache key: everything that changes which posts are answered and how"""
+        return f"{self.MODEL_NAME}:{self.fingerprint}:{self.threshold}:{self.max_words}"
+
+    def score(self, texts: list) -> dict:
+        """Per-text arrays: polarity score, confidence, word count, emotion and whether to answer"""
+        tokens = [_WORD.findall(text.lower()) for text in texts]
+        lengths = np.fromiter((len(words) for words in tokens), dtype=np.int64, count=len(texts))
+        ids = np.fromiter((self.vocab.get(word, self.unknown) for words in tokens for word in words),
+                          dtype=np.int64, count=int(lengths.sum()))
+        rows = np.repeat(np.arange(len(texts)), lengths)
+
+        # A negator flips the word right after it (in the same text)
+        negated = np.zeros(len(ids), dtype=bool)
+        negated[1:] = self.is_negator[ids[:-1]] & (rows[1:] == rows[:-1])
+        weights = np.where(negated, -self.weights[ids], self.weights[ids])
+
+        n = len(texts)
+        scores = np.bincount(rows, weights=weights, minlength=n)
+        positive = np.bincount(rows, weights=weights > 0, minlength=n)
+        negative = np.bincount(rows, weights=weights < 0, minlength=n)
+
+        # Emotion votes only come from words that weren't negated ("not happy" isn't sadness)
+        votes = np.zeros((n, len(self.emotions)))
+        voting = (self.emotion_ids[ids] >= 0) & ~negated
+        np.add.at(votes, (rows[voting], self.emotion_ids[ids[voting]]), np.abs(weights[voting]))
+        emotion_totals = votes.sum(axis=1)
+
+        confidence = 1.0 / (1.0 + np.exp(-self.scale * np.abs(scores)))
+        accept = ((confidence >= self.threshold) & (lengths > 0) & (lengths <= self.max_words)
+                  & ~((positive > 0) & (negative > 0)) & (emotion_totals > 0))
+        return {
+            "score": scores,
+            "confidence": confidence,
+            "words": lengths,
+            "emotion": votes.argmax(axis=1),
+            "emotion_score": votes.max(axis=1) / np.maximum(emotion_totals, 1e-9),
+            "accept": accept,
+        }
+
+    def classify(self, texts: list) -> list:
+        """Result dicts (like SentimentAnalyzer.classify_batch) for confident texts, None for the rest"""
+        if not texts:
+            return []
+        scored = self.score(texts)
+        results = [None] * len(texts)
+        for i in np.flatnonzero(scored["accept"]):
+            results[i] = {
+                'sentiment_label': "positive" if scored["score"][i] > 0 else "negative",
+                'confidence_score': float(scored["confidence"][i]),
+                'model_name': self.MODEL_NAME,
+                'emotion': self.emotions[scored["emotion"][i]],
+                'emotion_score': float(scored["emotion_score"][i]),
+            }
+        return results
@@ -1,8 +1,16 @@
 # backend/app/services/sentiment_analyzer.py
-from transformers import pipeline
+# transformers (and torch) are imported when the models are first needed, not here:
+# importing them alone takes seconds
+from concurrent.futures import ThreadPoolExecutor
+from app.services.inference_cache import InferenceCache
+from app.services.pre_classifier import LexiconClassifier
+from app.metrics import INFERENCE_SECONDS, CASCADE_DECISIONS
 import os
+import time
+import shutil
 import asyncio
 import logging
+import threading
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -12,90 +20,372 @@ class SentimentAnalyzer:
     """
     Unified interface for sentiment analysis using multiple model backends
     with threshold logic to support Neutral categorization.
+
+    Model types backed by HF pipelines (same results contract for all three):
+      - 'local':     fp32 PyTorch
+      - 'quantized': PyTorch with dynamic int8 quantization of the Linear layers
+      - 'onnx':      ONNX export run through ONNX Runtime (needs optimum[onnxruntime])
+
+    The pipelines are built on first use (or by load()/warm_up()), so creating an
+    analyzer is instant. With MODEL_SHARED_WEIGHTS (default on) the 'local' models map
+    their weights from shared files, so every process on a host uses the same copy.
     """
+
+    PIPELINE_BACKENDS = ('local', 'quantized', 'onnx')
+    ONNX_FILE = "model.onnx" # Only present in a finished ONNX export
     
     def __init__(self, model_type: str = 'local', model_name: str = None):
         self.model_type = model_type
         # Set the threshold: If confidence is below 0.6, we call it neutral
         self.neutral_threshold = 0.60 
+        # Batched inference limits: padded tokens per forward pass and texts per pass
+        self.max_batch_tokens = int(os.getenv("INFERENCE_MAX_BATCH_TOKENS", 8192))
+        self.max_batch_size = int(os.getenv("INFERENCE_MAX_BATCH_SIZE", 64))
+        self.ready = False # Models loaded and warmed up
+        self._sentiment_pipeline = None
+        self._emotion_pipeline = None
+        self._load_lock = threading.Lock()
+        self.shared_weights = os.getenv("MODEL_SHARED_WEIGHTS", "true").lower() in ("1", "true", "yes")
+        # Single-pass mode: tokenize once (and run one encoder) for both models when they allow it
+        self.multihead = os.getenv("MODEL_MULTIHEAD", "false").lower() in ("1", "true", "yes")
+        self._multihead_runner = None
+        # Cascade: a NumPy lexicon answers clear-cut posts, only the rest reach the transformers
+        self.pre_classifier = None
+        if os.getenv("MODEL_CASCADE", "false").lower() in ("1", "true", "yes"):
+            self.pre_classifier = LexiconClassifier.from_env()
+        self.answered = 0
+        self.escalated = 0
         
-        if self.model_type == 'local':
+        if self.model_type in self.PIPELINE_BACKENDS:
             # Load default models from env if not provided
             self.sentiment_model_name = model_name or os.getenv("HUGGINGFACE_MODEL", "distilbert-base-uncased-finetuned-sst-2-english")
             self.emotion_model_name = os.getenv("EMOTION_MODEL", "j-hartmann/emotion-english-distilroberta-base")
-            
-            logger.info(f"Loading local models: {self.sentiment_model_name}...")
-            
-            # Initialize Pipelines
-            # device=-1 means CPU (use 0 for GPU if available)
-            self.sentiment_pipeline = pipeline("text-classification", model=self.sentiment_model_name, device=-1)
-            self.emotion_pipeline = pipeline("text-classification", model=self.emotion_model_name, device=-1)
+
+            # Torch releases the GIL inside its kernels, so the emotion model can run on
+            # this thread while the sentiment model runs on the caller's thread
+            self._emotion_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="emotion")
+
+            # Content-hash memoization; the key changes whenever a model or the threshold does
+            model_key = f"{self.model_type}|{self.sentiment_model_name}|{self.emotion_model_name}|{self.neutral_threshold}"
+            if self.pre_classifier:
+                model_key += f"|cascade:{self.pre_classifier.cache_key()}"
+            self.cache = InferenceCache.from_env(model_key)
             
         elif self.model_type == 'external':
             self.api_key = os.getenv("EXTERNAL_LLM_API_KEY")
             logger.info("External LLM mode initialized")
 
-    async def analyze_sentiment(self, text: str) -> dict:
-        """Analyze sentiment (Positive/Negative/Neutral) with threshold logic"""
-        if not text:
-            raise ValueError("Input text cannot be empty")
+    @property
+    def sentiment_pipeline(self):
+        if self._sentiment_pipeline is None:
+            self.load()
+        return self._sentiment_pipeline
+
+    @property
+    def emotion_pipeline(self):
+        if self._emotion_pipeline is None:
+            self.load()
+        return self._emotion_pipeline
+
+    def load(self):
+        """Build both pipelines (once; threads asking at the same time wait for the first)"""
+        with self._load_lock:
+            if self._sentiment_pipeline is not None:
+                return
+            start = time.perf_counter()
+            logger.info(f"Loading {self.model_type} models: {self.sentiment_model_name}, {self.emotion_model_name}...")
+            emotion = self._build_pipeline(self.emotion_model_name)
+            self._sentiment_pipeline = self._build_pipeline(self.sentiment_model_name)
+            self._emotion_pipeline = emotion
+            if self.multihead and self.model_type != 'onnx':
+                from app.services.multihead import MultiHeadRunner
+                self._multihead_runner = MultiHeadRunner.create(self._sentiment_pipeline, emotion)
+            logger.info(f"Models loaded in {time.perf_counter() - start:.1f}s")
+
+    def warm_up(self, batch_size: int = 8) -> float:
+        """
+        Load the models and run one dummy batch through both, so kernels and buffers are
+        set up before the first real post. Returns the seconds it took.
+        """
+        start = time.perf_counter()
+        if self.model_type in self.PIPELINE_BACKENDS:
+            self.load()
+            self._run_models(["Warming up the models, nothing to see here."] * batch_size) # Bypasses the cache
+        self.ready = True
+        elapsed = time.perf_counter() - start
+        logger.info(f"Analyzer ready after {elapsed:.1f}s")
+        return elapsed
+
+    def export_shared_weights(self):
+        """Export both models for sharing up front, so processes started together don't all do it"""
+        if self.model_type == 'local' and self.shared_weights:
+            from app.services.shared_weights import export_model
+            for model_name in (self.sentiment_model_name, self.emotion_model_name):
+                export_model(model_name)
+
+    def _build_pipeline(self, model_name: str):
+        """Create a text-classification pipeline for model_name on the configured backend"""
+        from transformers import pipeline, AutoTokenizer, AutoModelForSequenceClassification
 
         if self.model_type == 'local':
-            # Run in a threadpool since transformers is blocking
-            result = await asyncio.to_thread(self.sentiment_pipeline, text)
-            top_result = result[0]
-            
-            raw_label = top_result['label'].upper()
-            confidence = float(top_result['score'])
-
-            # THRESHOLD LOGIC:
-            # DistilBert only knows POS/NEG. If it's unsure (low score), we force NEUTRAL.
-            if confidence < self.neutral_threshold:
-                final_label = "neutral"
-            else:
-                label_map = {
-                    "POSITIVE": "positive",
-                    "NEGATIVE": "negative",
-                    "LABEL_1": "positive", # Support for some model variants
-                    "LABEL_0": "negative"
-                }
-                final_label = label_map.get(raw_label, "neutral")
-
-            return {
-                'sentiment_label': final_label,
-                'confidence_score': confidence,
-                'model_name': self.sentiment_model_name
+            if self.shared_weights:
+                from app.services.shared_weights import load_model
+                model, tokenizer = load_model(model_name)
+                return pipeline("text-classification", model=model, tokenizer=tokenizer, device=-1)
+            # device=-1 means CPU (use 0 for GPU if available)
+            return pipeline("text-classification", model=model_name, device=-1)
+
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+
+        if self.model_type == 'quantized':
+            import torch
+            model = AutoModelForSequenceClassification.from_pretrained(model_name)
+            # int8 weights for every Linear layer; activations are quantized on the fly
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+            return pipeline("text-classification", model=model, tokenizer=tokenizer, device=-1)
+
+        return pipeline("text-classification", model=self._load_onnx_model(model_name), tokenizer=tokenizer)
+
+    def _load_onnx_model(self, model_name: str):
+        """ONNX Runtime model for model_name: exported once, then reused on later starts"""
+        try:
+            from optimum.onnxruntime import ORTModelForSequenceClassification
+        except ImportError as e:
+            raise ImportError("model_type='onnx' needs optimum[onnxruntime] installed") from e
+
+        export_dir = os.path.join(os.getenv("ONNX_CACHE_DIR", "/tmp/onnx_models"), model_name.replace("/", "__"))
+        if not os.path.isfile(os.path.join(export_dir, self.ONNX_FILE)):
+            logger.info(f"Exporting {model_name} to ONNX in {export_dir}...")
+            tmp = f"{export_dir}.tmp-{os.getpid()}"
+            ORTModelForSequenceClassification.from_pretrained(model_name, export=True).save_pretrained(tmp)
+            if os.path.isdir(export_dir) and not os.path.isfile(os.path.join(export_dir, self.ONNX_FILE)):
+                shutil.rmtree(export_dir, ignore_errors=True) # Left behind by an interrupted export
+            try:
+                os.rename(tmp, export_dir) # Atomic: other processes see the whole export or none of it
+            except OSError:
+                shutil.rmtree(tmp, ignore_errors=True) # Another process finished first
+        return ORTModelForSequenceClassification.from_pretrained(export_dir)
+
+    def _format_sentiment(self, top_result: dict) -> dict:
+        """Turn a raw pipeline prediction into our sentiment result dict"""
+        raw_label = top_result['label'].upper()
+        confidence = float(top_result['score'])
+
+        # THRESHOLD LOGIC:
+        # DistilBert only knows POS/NEG. If it's unsure (low score), we force NEUTRAL.
+        if confidence < self.neutral_threshold:
+            final_label = "neutral"
+        else:
+            label_map = {
+                "POSITIVE": "positive",
+                "NEGATIVE": "negative",
+                "LABEL_1": "positive", # Support for some model variants
+                "LABEL_0": "negative"
             }
+            final_label = label_map.get(raw_label, "neutral")
+
+        return {
+            'sentiment_label': final_label,
+            'confidence_score': confidence,
+            'model_name': self.sentiment_model_name
+        }
+
+    def _format_emotion(self, top_result: dict) -> dict:
+        """Turn a raw pipeline prediction into our emotion result dict"""
+        return {
+            'emotion': top_result['label'],
+            'confidence_score': float(top_result['score']),
+            'model_name': self.emotion_model_name
+        }
+
+    def analyze_sentiment_sync(self, text: str) -> dict:
+        """Blocking version of analyze_sentiment, for callers without an event loop"""
+        if not text:
+            raise ValueError("Input text cannot be empty")
+
+        if self.model_type in self.PIPELINE_BACKENDS:
+            if self.pre_classifier is not None:
+                answered = self._classify_uncached([text], escalate=False)[0]
+                if answered is not None:
+                    return {key: answered[key] for key in ('sentiment_label', 'confidence_score', 'model_name')}
+            result = self.sentiment_pipeline(text)
+            return self._format_sentiment(result[0])
         
         return {"sentiment_label": "neutral", "confidence_score": 0.0}
 
-    async def analyze_emotion(self, text: str) -> dict:
-        """Detect emotion (joy, anger, etc)"""
+    def analyze_emotion_sync(self, text: str) -> dict:
+        """Blocking version of analyze_emotion, for callers without an event loop"""
         if not text:
             raise ValueError("Input text cannot be empty")
 
-        if self.model_type == 'local':
-            result = await asyncio.to_thread(self.emotion_pipeline, text)
-            top_result = result[0]
-            
-            return {
-                'emotion': top_result['label'],
-                'confidence_score': float(top_result['score']),
-                'model_name': self.emotion_model_name
-            }
+        if self.model_type in self.PIPELINE_BACKENDS:
+            result = self.emotion_pipeline(text)
+            return self._format_emotion(result[0])
             
         return {}
 
+    async def analyze_sentiment(self, text: str) -> dict:
+        """Analyze sentiment (Positive/Negative/Neutral) with threshold logic"""
+        # Run in a threadpool since transformers is blocking
+        return await asyncio.to_thread(self.analyze_sentiment_sync, text)
+
+    async def analyze_emotion(self, text: str) -> dict:
+        """Detect emotion (joy, anger, etc)"""
+        return await asyncio.to_thread(self.analyze_emotion_sync, text)
+
+    def _plan_batches(self, texts: list, lengths: list = None) -> list:
+        """
+        Group text indices into length buckets so each forward pass pads to a similar
+        length. Texts are sorted by token count and cut into chunks whose padded size
+        (longest text x batch size) stays within max_batch_tokens.
+        """
+        if lengths is None:
+            with INFERENCE_SECONDS.labels("tokenize").time():
+                lengths = [len(ids) for ids in self.sentiment_pipeline.tokenizer(texts)['input_ids']]
+        order = sorted(range(len(texts)), key=lambda i: lengths[i])
+
+        batches, current = [], []
+        for i in order:
+            # Sorted ascending, so the newest text is always the longest in the chunk
+            padded_tokens = lengths[i] * (len(current) + 1)
+            if current and (padded_tokens > self.max_batch_tokens or len(current) >= self.max_batch_size):
+                batches.append(current)
+                current = []
+            current.append(i)
+        if current:
+            batches.append(current)
+        return batches
+
+    def classify_batch(self, texts: list) -> list:
+        """
+        Run sentiment AND emotion over a whole list of texts with batched forward passes.
+        Blocking (meant for the worker). Returns one dict per text, in input order, with
+        the sentiment fields plus 'emotion' and 'emotion_score'.
+        Texts already seen (same normalized content, same models) come from the cache.
+        """
+        if not texts:
+            return []
+        if any(not text for text in texts):
+            raise ValueError("Input text cannot be empty")
+        if self.model_type not in self.PIPELINE_BACKENDS:
+            return [{"sentiment_label": "neutral", "confidence_score": 0.0, "emotion": None} for _ in texts]
+
+        results = self.cache.get_many(texts)
+
+        # Run the models once per distinct text that missed the cache
+        pending = {}
+        for i, result in enumerate(results):
+            if result is None:
+                pending.setdefault(texts[i], []).append(i)
+
+        if pending:
+            unique_texts = list(pending)
+            computed = self._classify_uncached(unique_texts)
+            for text, result in zip(unique_texts, computed):
+                for i in pending[text]:
+                    results[i] = dict(result)
+            self.cache.set_many(unique_texts, computed)
+        return results
+
+    def _classify_uncached(self, texts: list, escalate: bool = True) -> list:
+        """
+        Pre-classifier first (when the cascade is on), then the models for whatever it
+        escalates. With escalate=False escalated texts are left as None for the caller.
+        """
+        if self.pre_classifier is None:
+            return self._run_models(texts) if escalate else [None] * len(texts)
+
+        with INFERENCE_SECONDS.labels("preclassify").time():
+            results = self.pre_classifier.classify(texts)
+        escalated = [i for i, result in enumerate(results) if result is None]
+        self.answered += len(texts) - len(escalated)
+        self.escalated += len(escalated)
+        CASCADE_DECISIONS.labels("answered").inc(len(texts) - len(escalated))
+        CASCADE_DECISIONS.labels("escalated").inc(len(escalated))
+
+        if escalated and escalate:
+            for i, result in zip(escalated, self._run_models([texts[i] for i in escalated])):
+                results[i] = result
+        return results
+
+    def escalation_rate(self) -> float:
+        """Share of cascade decisions sent on to the transformers (0 before any)"""
+        total = self.answered + self.escalated
+        return self.escalated / total if total else 0.0
+
+    def _merge(self, sentiment: dict, emotion: dict) -> dict:
+        """One result dict from the top sentiment and emotion predictions of a text"""
+        result = self._format_sentiment(sentiment)
+        emotion_result = self._format_emotion(emotion)
+        result['emotion'] = emotion_result['emotion']
+        result['emotion_score'] = emotion_result['confidence_score']
+        return result
+
+    def _run_models(self, texts: list) -> list:
+        """Run both pipelines over texts in length-bucketed chunks, preserving input order."""
+        self.load() # Also sets up the multi-head runner when enabled
+        if self._multihead_runner is not None:
+            return self._run_multihead(texts)
+
+        results = [None] * len(texts)
+        for indices in self._plan_batches(texts):
+            chunk = [texts[i] for i in indices]
+            # Passing a list lets the pipeline pad the chunk once and run one forward pass.
+            # Both models run at the same time: emotion on the helper thread, sentiment here.
+            emotion_future = self._emotion_executor.submit(self._run_emotion, chunk)
+            with INFERENCE_SECONDS.labels("sentiment").time():
+                sentiments = self.sentiment_pipeline(chunk, batch_size=len(chunk))
+            emotions = emotion_future.result()
+
+            for i, sentiment, emotion in zip(indices, sentiments, emotions):
+                # Pipelines return a dict per text for lists (a list of dicts when top_k is set)
+                sentiment = sentiment[0] if isinstance(sentiment, list) else sentiment
+                emotion = emotion[0] if isinstance(emotion, list) else emotion
+
+                results[i] = self._merge(sentiment, emotion)
+        return results
+
+    def _run_multihead(self, texts: list) -> list:
+        """Same results as the two pipelines, from one tokenization of texts (see MultiHeadRunner)."""
+        runner = self._multihead_runner
+        with INFERENCE_SECONDS.labels("tokenize").time():
+            encodings = runner.tokenize(texts)
+        lengths = [len(ids) for ids in encodings['input_ids']]
+
+        results = [None] * len(texts)
+        for indices in self._plan_batches(texts, lengths):
+            with INFERENCE_SECONDS.labels("multihead").time():
+                sentiments, emotions = runner.run(encodings, indices)
+            for i, sentiment, emotion in zip(indices, sentiments, emotions):
+                results[i] = self._merge(sentiment, emotion)
+        return results
+
+    def _run_emotion(self, chunk: list) -> list:
+        with INFERENCE_SECONDS.labels("emotion").time():
+            return self.emotion_pipeline(chunk, batch_size=len(chunk))
+
     async def batch_analyze(self, texts: list) -> list:
+        """
+        Analyze sentiment and emotion for many texts at once.
+        Returns one result per text (None for texts that could not be analyzed).
+        """
         if not texts:
             return []
-        
-        results = []
-        for text in texts:
-            try:
-                res = await self.analyze_sentiment(text)
-                results.append(res)
-            except Exception as e:
-                logger.error(f"Error analyzing text: {e}")
-                results.append(None)
-        return results
\ No newline at end of file
+
+        valid = [i for i, text in enumerate(texts) if text]
+        results = [None] * len(texts)
+        try:
+            batch_results = await asyncio.to_thread(self.classify_batch, [texts[i] for i in valid])
+        except Exception as e:
+            logger.error(f"Batch analysis failed, falling back to single texts: {e}")
+            batch_results = []
+            for i in valid:
+                try:
+                    batch_results.extend(await asyncio.to_thread(self.classify_batch, [texts[i]]))
+                except Exception as e:
+                    logger.error(f"Error analyzing text: {e}")
+                    batch_results.append(None)
+
+        for i, result in zip(valid, batch_results):
+            results[i] = result
+        return results
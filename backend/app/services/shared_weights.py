@@ -0,0 +1,111 @@
+# backend/app/services/shared_weights.py
+"""
+Model weights that several processes on one host share instead of copying.
+
+Each model is exported once to a safetensors file (SHARED_WEIGHTS_DIR, on the
+hf_cache volume in docker-compose). Every process then maps that file read-only
+(copy-on-write) and builds its tensors directly on the mapping. The pages live in
+the kernel's page cache, so inference processes, worker replicas and containers
+that mount the same volume all use one physical copy of the weights. Only the
+activations and the framework runtime are private to each process.
+"""
+import os
+import json
+import mmap
+import shutil
+import struct
+import logging
+
+logger = logging.getLogger(__name__)
+
+WEIGHTS_FILE = "model.safetensors"
+
+# safetensors dtype names -> torch dtype attribute names
+DTYPES = {
+    "F64": "float64", "F32": "float32", "F16": "float16", "BF16": "bfloat16",
+    "I64": "int64", "I32": "int32", "I16": "int16", "I8": "int8", "U8": "uint8", "BOOL": "bool",
+}
+
+def shared_weights_dir() -> str:
+    return os.getenv("SHARED_WEIGHTS_DIR", os.path.expanduser("~/.cache/huggingface/shared_weights"))
+
+def export_dir(model_name: str) -> str:
+    return os.path.join(shared_weights_dir(), model_name.replace("/", "__"))
+
+def read_header(path: str):
+    """(tensor entries, metadata, byte offset where the tensor data starts) of a safetensors file"""
+    with open(path, "rb") as f:
+        (length,) = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(length))
+    metadata = header.pop("__metadata__", None) or {}
+    return header, metadata, 8 + length
+
+def save_state_dict(state_dict: dict, path: str):
+    """
+    Write a state dict as safetensors. Tensors that share memory (tied embeddings) are
+    stored once; the other names are recorded as aliases in the metadata.
+    """
+    from safetensors.torch import save_file
+
+    tensors, aliases, seen = {}, {}, {}
+    for name, tensor in state_dict.items():
+        key = (tensor.data_ptr(), tensor.dtype, tuple(tensor.shape))
+        if tensor.numel() and key in seen:
+            aliases[name] = seen[key]
+            continue
+        seen[key] = name
+        tensors[name] = tensor.detach().contiguous()
+    save_file(tensors, path, metadata={"aliases": json.dumps(aliases)})
+
+def load_state_dict(path: str) -> dict:
+    """
+    State dict whose tensors point into a private (copy-on-write) mapping of the file:
+    nothing is read or copied until pages are touched, and untouched pages stay shared.
+    """
+    import torch
+
+    header, metadata, data_start = read_header(path)
+    with open(path, "rb") as f:
+        mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    data = torch.frombuffer(mapping, dtype=torch.uint8) # Keeps the mapping alive
+    state = {}
+    for name, entry in header.items():
+        begin, end = entry["data_offsets"]
+        tensor = data[data_start + begin:data_start + end].view(getattr(torch, DTYPES[entry["dtype"]]))
+        state[name] = tensor.reshape(entry["shape"])
+    for alias, name in json.loads(metadata.get("aliases", "{}")).items():
+        state[alias] = state[name]
+    return state
+
+def export_model(model_name: str) -> str:
+    """Export model_name (config, tokenizer, weights) once; returns its directory"""
+    target = export_dir(model_name)
+    if os.path.isfile(os.path.join(target, WEIGHTS_FILE)):
+        return target
+
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+    logger.info(f"Exporting {model_name} weights for sharing to {target}...")
+    tmp = f"{target}.tmp-{os.getpid()}"
+    os.makedirs(tmp, exist_ok=True)
+    model = AutoModelForSequenceClassification.from_pretrained(model_name)
+    model.config.save_pretrained(tmp)
+    AutoTokenizer.from_pretrained(model_name).save_pretrained(tmp)
+    save_state_dict(model.state_dict(), os.path.join(tmp, WEIGHTS_FILE))
+    try:
+        os.rename(tmp, target) # Atomic: other processes see the whole export or none of it
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True) # Another process finished first
+    return target
+
+def load_model(model_name: str):
+    """(model, tokenizer) for model_name with weights on the shared mapping"""
+    from transformers import AutoConfig, AutoTokenizer, AutoModelForSequenceClassification
+
+    directory = export_model(model_name)
+    model = AutoModelForSequenceClassification.from_config(AutoConfig.from_pretrained(directory))
+    # assign=True swaps the freshly initialized parameters for the mapped tensors instead
+    # of copying into them; the initial ones are freed
+    model.load_state_dict(load_state_dict(os.path.join(directory, WEIGHTS_FILE)), assign=True)
+    model.eval()
+    return model, AutoTokenizer.from_pretrained(directory)
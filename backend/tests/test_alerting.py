@@ -1,7 +1,10 @@
-import pytest
+import json
 import uuid
 from datetime import datetime, timedelta
+import numpy as np
+import pytest
 from backend.app.services.alerting import AlertService
+from backend.app.services.alert_engine import AlertRule, SlidingWindow, StreamingAlertEngine, FEATURE_INDEX, load_rules
 from backend.app.models.database import SessionLocal, SocialMediaPost, SentimentAnalysis
 
 @pytest.mark.anyio
@@ -37,4 +40,109 @@ async def test_alert_triggering_logic():
         db.execute(text(f"DELETE FROM sentiment_analysis WHERE post_id = '{unique_id}'"))
         db.execute(text(f"DELETE FROM social_media_posts WHERE post_id = '{unique_id}'"))
         db.commit()
-        db.close()
\ No newline at end of file
+        db.close()
+
+def test_sliding_window_expires_old_buckets():
+    window = SlidingWindow(window_seconds=10, bucket_seconds=1)
+    total, negative = FEATURE_INDEX["total"], FEATURE_INDEX["negative"]
+    window.add(100.0, [0], StreamingAlertEngine.event_values({"sentiment_label": "negative"}))
+    window.add(105.5, [0], StreamingAlertEngine.event_values({"sentiment_label": "positive"}))
+    assert window.totals[0, total] == 2
+
+    window.advance(110.2) # First event is now out of the window
+    assert window.totals[0, total] == 1 and window.totals[0, negative] == 0
+
+    window.advance(500.0)
+    assert not window.totals.any()
+
+
+def test_buffered_adds_match_per_post_counting():
+    rule = AlertRule(window_seconds=10, dimension="source")
+    engine = StreamingAlertEngine([rule])
+    reference = SlidingWindow(window_seconds=10, bucket_seconds=1, rows=3)
+    rows = {"twitter": 1, "reddit": 2}
+    for i in range(60):
+        post = {"source": ["twitter", "reddit"][i % 2], "sentiment_label": ["positive", "negative", "neutral"][i % 3],
+                "emotion": "anger", "confidence_score": i / 60}
+        engine.add(post, 100 + i * 0.25)
+        reference.add(100 + i * 0.25, [0, rows[post["source"]]], StreamingAlertEngine.event_values(post))
+        if i % 7 == 0: # Flush at uneven points, like evaluation ticks
+            engine.evaluate(100 + i * 0.25)
+
+    reference.advance(115)
+    assert engine.scopes == [(None, "all"), ("source", "twitter"), ("source", "reddit")]
+    assert np.allclose(engine.snapshot(115), reference.totals)
+
+
+def test_streaming_engine_hysteresis_and_cooldown():
+    rule = AlertRule(window_seconds=60, threshold=2.0, min_posts=3, clear_ratio=0.6, cooldown_seconds=30)
+    engine = StreamingAlertEngine([rule])
+    negative = {"source": "twitter", "sentiment_label": "negative"}
+    positive = {"source": "twitter", "sentiment_label": "positive"}
+
+    fired = [engine.process(negative, t) for t in (0, 1, 2)]
+    assert [len(alerts) for alerts in fired] == [0, 0, 1] # 3 negative / max(0, 1) positive
+    assert fired[2][0]["post_count"] == 3
+
+    # Still above threshold: no duplicate alert while active
+    assert engine.process(negative, 3) == []
+
+    # Drops below threshold * clear_ratio (4/4 < 1.2) -> re-armed
+    for t in (4, 5, 6, 7):
+        engine.process(positive, t)
+    # Back above threshold (9/4) but inside the cooldown
+    assert [engine.process(negative, t) for t in (8, 9, 10, 11, 12)] == [[]] * 5
+    assert len(engine.process(negative, 40)) == 1
+
+
+def test_streaming_engine_per_source_dimension():
+    engine = StreamingAlertEngine([AlertRule("by_source", window_seconds=60, threshold=1.0, min_posts=2, dimension="source")])
+    alerts = []
+    for source in ("twitter", "reddit", "reddit"):
+        alerts += engine.process({"source": source, "sentiment_label": "negative"}, 1.0)
+    assert [alert["details"]["source"] for alert in alerts] == ["reddit"]
+
+
+def test_rule_metrics_and_operators():
+    engine = StreamingAlertEngine([
+        AlertRule("anger_spike", metric="share", numerator="emotion:anger", threshold=0.5, min_posts=4),
+        AlertRule("confidence_drop", metric="mean", numerator="confidence", op="<", threshold=0.6, min_posts=4),
+        AlertRule("volume_surge", metric="count", numerator="total", threshold=4, min_posts=1),
+    ])
+    fired = []
+    for t, emotion in enumerate(["anger", "anger", "anger", "joy", "anger"]):
+        fired += engine.process({"sentiment_label": "negative", "emotion": emotion, "confidence_score": 0.5}, t)
+    assert sorted(alert["alert_type"] for alert in fired) == ["anger_spike", "confidence_drop", "volume_surge"]
+    anger = next(alert for alert in fired if alert["alert_type"] == "anger_spike")
+    assert anger["actual_value"] == 0.75 and anger["post_count"] == 4
+
+
+def test_invalid_rules_are_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        AlertRule.from_dict({"name": "x", "metric": "median"})
+    with pytest.raises(ValueError):
+        AlertRule.from_dict({"name": "x", "numerator": "emotion:boredom"})
+    with pytest.raises(ValueError):
+        AlertRule.from_dict({"name": "x", "windw_seconds": 60})
+
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps([{"name": "a"}, {"name": "a", "threshold": 3}]))
+    with pytest.raises(ValueError):
+        load_rules(str(path))
+
+
+def test_rule_reload_keeps_windows_and_state(tmp_path):
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps([{"name": "neg", "threshold": 1.0, "min_posts": 2, "window_seconds": 60}]))
+    engine = StreamingAlertEngine(load_rules(str(path)))
+    alerts = [engine.process({"sentiment_label": "negative"}, t) for t in (0, 1)]
+    assert len(alerts[1]) == 1
+
+    # Same rule plus a new per-source one: counts carry over, 'neg' stays active
+    path.write_text(json.dumps([{"name": "neg", "threshold": 1.0, "min_posts": 2, "window_seconds": 60},
+                                {"name": "neg_by_source", "threshold": 0.5, "min_posts": 1,
+                                 "window_seconds": 60, "dimension": "source"}]))
+    engine.set_rules(load_rules(str(path)))
+    alerts = engine.process({"sentiment_label": "negative", "source": "reddit"}, 2)
+    assert [alert["alert_type"] for alert in alerts] == ["neg_by_source"]
+    assert np.isclose(engine.snapshot(2)[0, FEATURE_INDEX["total"]], 3)
@@ -0,0 +1,65 @@
+from backend.app.services.inference_cache import InferenceCache
+
+
+class DictRedis:
+    """Just enough of redis.Redis for the shared cache tier"""
+    def __init__(self):
+        self.data = {}
+
+    def mget(self, keys):
+        return [self.data.get(key) for key in keys]
+
+    def pipeline(self, transaction=True):
+        return self
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    def execute(self):
+        pass
+
+
+RESULT = {"sentiment_label": "positive", "confidence_score": 0.9, "emotion": "joy"}
+
+
+def test_whitespace_normalized_hits_and_counters():
+    cache = InferenceCache("models", max_size=10)
+    assert cache.get_many(["I love it"]) == [None]
+
+    cache.set_many(["I love it"], [RESULT])
+    assert cache.get_many(["  I   love\nit "]) == [RESULT]
+
+    stats = cache.stats()
+    assert stats["local_hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["hit_rate"] == 0.5
+
+
+def test_lru_eviction():
+    cache = InferenceCache("models", max_size=2)
+    cache.set_many(["a", "b"], [RESULT, RESULT])
+    cache.get_many(["a"]) # 'a' is now most recently used
+    cache.set_many(["c"], [RESULT])
+
+    assert cache.get_many(["a", "b", "c"]) == [RESULT, None, RESULT]
+
+
+def test_model_change_invalidates():
+    shared = DictRedis()
+    old = InferenceCache("distilbert|roberta|0.6", redis_client=shared)
+    old.set_many(["Hate it"], [RESULT])
+
+    new = InferenceCache("other-model|roberta|0.6", redis_client=shared)
+    assert new.get_many(["Hate it"]) == [None]
+
+
+def test_redis_tier_shared_between_workers():
+    shared = DictRedis()
+    InferenceCache("models", redis_client=shared).set_many(["Hate it"], [RESULT])
+
+    other_worker = InferenceCache("models", redis_client=shared)
+    assert other_worker.get_many(["Hate it"]) == [RESULT]
+    assert other_worker.stats()["redis_hits"] == 1
+    # Promoted into the local tier
+    assert other_worker.get_many(["Hate it"]) == [RESULT]
+    assert other_worker.stats()["local_hits"] == 1
@@ -0,0 +1,102 @@
+import time
+import pytest
+import json
+from ingester.ingester import DataIngester, TokenBucket, Backpressure, make_profile
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def xadd(self, stream, fields, maxlen=None, approximate=True):
+        self.commands.append((stream, fields, maxlen))
+
+    def execute(self):
+        self.redis.round_trips += 1
+        self.redis.entries.extend(self.commands)
+
+
+class FakeRedis:
+    def __init__(self):
+        self.entries = []
+        self.round_trips = 0
+
+        self.values = {}
+
+    def pipeline(self, transaction=False):
+        return FakePipeline(self)
+
+    def get(self, key):
+        return self.values.get(key)
+
+
+def make_ingester(max_len=None):
+    ingester = DataIngester.__new__(DataIngester)
+    ingester.redis_client = FakeRedis()
+    ingester.stream_name = "test_stream"
+    ingester.max_len = max_len
+    ingester.backpressure = None
+    return ingester
+
+
+def test_run_load_hits_target_rate_with_pipelined_batches():
+    ingester = make_ingester(max_len=1000)
+    published = ingester.run_load(make_profile("constant", 2000), batch_size=50, duration=0.5)
+
+    # Sleep overshoot is made up, so the real rate stays close to the target
+    assert 900 <= published <= 1050
+    assert len(ingester.redis_client.entries) == published
+    assert ingester.redis_client.round_trips <= published / 10
+    assert all(maxlen == 1000 for _, _, maxlen in ingester.redis_client.entries)
+
+
+def test_token_bucket_caps_catch_up():
+    bucket = TokenBucket(lambda t: 1000, burst=20)
+    time.sleep(0.1) # 100 tokens due, but at most a burst is granted
+    assert bucket.take(1000) == 20
+    assert bucket.take(1000) == 0
+
+
+def test_token_bucket_burst_follows_the_rate():
+    rate = {"value": 10000}
+    bucket = TokenBucket(lambda t: rate["value"], burst=20, burst_seconds=0.1)
+    time.sleep(0.2) # 2000 tokens due, 100ms worth can be made up
+    assert bucket.take(5000) == 1000
+
+    rate["value"] = 100 # Ramp down: the fixed burst is the floor again
+    time.sleep(0.5) # 50 tokens due
+    assert bucket.take(5000) == 20
+
+
+def test_profiles():
+    ramp = make_profile("ramp", 100, 1000, period=10)
+    assert ramp(0) == 100 and ramp(5) == 550 and ramp(60) == 1000
+
+    spike = make_profile("spike", 100, 1000, period=10)
+    assert spike(0.5) == 1000 and spike(5) == 100 and spike(10.5) == 1000
+
+    diurnal = make_profile("diurnal", 100, 1000, period=10)
+    assert diurnal(0) == pytest.approx(100) and diurnal(5) == pytest.approx(1000)
+
+    with pytest.raises(ValueError):
+        make_profile("sawtooth", 100)
+
+
+def test_backpressure_throttles_and_sheds():
+    ingester = make_ingester()
+    ingester.backpressure = Backpressure(ingester.redis_client, "test_stream", throttle_factor=0.25)
+    key = "backpressure:test_stream"
+
+    ingester.redis_client.values[key] = json.dumps({"backpressure": "throttle"})
+    throttled = ingester.run_load(make_profile("constant", 2000), batch_size=50, duration=0.3)
+    assert 100 <= throttled <= 200 # ~25% of 600
+
+    ingester.redis_client.values[key] = json.dumps({"backpressure": "shed"})
+    ingester.backpressure.checked = None
+    assert ingester.run_load(make_profile("constant", 2000), batch_size=50, duration=0.2) == 0
+
+    # No verdict (monitor not running) -> full speed
+    del ingester.redis_client.values[key]
+    ingester.backpressure.checked = None
+    assert ingester.run_load(make_profile("constant", 2000), batch_size=50, duration=0.2) >= 350
@@ -2,9 +2,13 @@ import pytest
 from fastapi.testclient import TestClient
 from backend.app.main import app
 
-client = TestClient(app)
+@pytest.fixture(scope="module")
+def client():
+    # One client (one event loop) for the module: pooled async DB/Redis connections are loop-bound
+    with TestClient(app) as client:
+        yield client
 
-def test_endpoints():
+def test_endpoints(client):
     # Health check
     for path in ["/api/health", "/health"]:
         response = client.get(path)
@@ -0,0 +1,36 @@
+from backend.app.services.lag_monitor import StreamLagMonitor
+
+
+def make_monitor():
+    monitor = StreamLagMonitor("stream", "group")
+    monitor.throttle_threshold = 1000
+    monitor.shed_threshold = 10000
+    monitor.target_drain_seconds = 100
+    return monitor
+
+
+def test_lag_rates_eta_and_recommended_workers():
+    monitor = make_monitor()
+    first = monitor.update({"entries-added": 10000}, {"entries-read": 9000, "pending": 100, "lag": 1000}, 2, now=0.0)
+    assert first["backlog"] == 1100 and first["processing_rate"] is None
+
+    # 10s later: 1000 more added, 1500 more read and acked -> draining at 50/s net
+    second = monitor.update({"entries-added": 11000}, {"entries-read": 10500, "pending": 100, "lag": 500}, 2, now=10.0)
+    assert second["ingest_rate"] == 100 and second["processing_rate"] == 150
+    assert second["eta_seconds"] == 600 / 50
+    # 75/s per worker; need (100 + 600/100) / 75 -> 2 workers
+    assert second["recommended_workers"] == 2
+
+
+def test_falling_behind_recommends_more_workers():
+    monitor = make_monitor()
+    monitor.update({"entries-added": 0}, {"entries-read": 0, "pending": 0, "lag": 0}, 1, now=0.0)
+    snapshot = monitor.update({"entries-added": 5000}, {"entries-read": 1000, "pending": 0, "lag": 4000}, 1, now=10.0)
+    assert snapshot["eta_seconds"] is None # Not draining
+    assert snapshot["recommended_workers"] == 6 # (500 + 40) / 100 per worker
+
+
+def test_backpressure_levels_with_hysteresis():
+    monitor = make_monitor()
+    levels = [monitor._backpressure(backlog) for backlog in (500, 1200, 900, 700, 12000, 9000, 7000, 500)]
+    assert levels == ["ok", "throttle", "throttle", "ok", "shed", "shed", "throttle", "ok"]
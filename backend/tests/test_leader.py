@@ -0,0 +1,92 @@
+import asyncio
+import pytest
+from backend.app.services.leader import LeaderElection
+
+
+class FakeRedis:
+    """Just enough of redis.asyncio for the lock: SET NX and the two compare-and-X scripts"""
+    def __init__(self):
+        self.data = {}
+
+    async def set(self, key, value, nx=False, px=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    async def eval(self, script, numkeys, key, token, *args):
+        if self.data.get(key) != token:
+            return 0
+        if "del" in script:
+            del self.data[key]
+        return 1
+
+
+@pytest.mark.anyio
+async def test_only_one_replica_runs_the_job():
+    redis = FakeRedis()
+    runs = []
+
+    def job_for(name):
+        async def job():
+            runs.append(name)
+            await asyncio.sleep(10)
+        return job
+
+    replicas = [LeaderElection(redis, "alerts", ttl_seconds=0.3, renew_interval=0.05) for _ in range(3)]
+    tasks = [asyncio.create_task(r.run(job_for(i))) for i, r in enumerate(replicas)]
+    await asyncio.sleep(0.2)
+
+    assert len(runs) == 1
+    assert sum(r.is_leader for r in replicas) == 1
+
+    # Leader goes away: another replica takes over
+    leader = next(i for i, r in enumerate(replicas) if r.is_leader)
+    tasks[leader].cancel()
+    await replicas[leader].release()
+    await asyncio.sleep(0.2)
+
+    assert len(runs) == 2 and runs[1] != runs[0]
+    for task in tasks:
+        task.cancel()
+
+
+@pytest.mark.anyio
+async def test_lost_lock_stops_the_job():
+    redis = FakeRedis()
+    stopped = asyncio.Event()
+
+    async def job():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            stopped.set()
+            raise
+
+    election = LeaderElection(redis, "alerts", ttl_seconds=1, renew_interval=0.05)
+    task = asyncio.create_task(election.run(job))
+    await asyncio.sleep(0.02)
+    assert election.is_leader
+
+    redis.data["leader:alerts"] = "someone-else" # Lock expired and was taken over
+    await asyncio.wait_for(stopped.wait(), timeout=1)
+    assert not election.is_leader
+    task.cancel()
+
+
+@pytest.mark.anyio
+async def test_crashed_job_is_logged(caplog):
+    attempts = []
+
+    async def job():
+        attempts.append(1)
+        raise RuntimeError("alert service crashed")
+
+    election = LeaderElection(FakeRedis(), "alerts", ttl_seconds=1, renew_interval=0.02)
+    task = asyncio.create_task(election.run(job))
+    await asyncio.sleep(0.1)
+    task.cancel()
+
+    assert len(attempts) >= 2 # Re-elected and restarted
+    failures = [r for r in caplog.records if "job failed" in r.getMessage()]
+    assert failures and str(failures[0].exc_info[1]) == "alert service crashed"
@@ -0,0 +1,61 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+
+from backend.app.services.sentiment_analyzer import SentimentAnalyzer
+from backend.app.services.multihead import MultiHeadRunner
+
+WORDS = ["i", "love", "hate", "netflix", "chatgpt", "is", "terrible", "amazing", "just", "bought", "iphone"]
+EMOTIONS = ["anger", "disgust", "fear", "joy", "neutral", "sadness", "surprise"]
+TEXTS = ["I love Netflix", "ChatGPT is terrible", "Just bought iPhone", "hate hate hate", "amazing"]
+
+
+def make_tokenizer(words=WORDS):
+    tokens = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + words
+    return transformers.DistilBertTokenizer(vocab={token: i for i, token in enumerate(tokens)}, do_lower_case=True)
+
+
+def make_pipeline(tokenizer, labels, seed):
+    torch.manual_seed(seed)
+    config = transformers.DistilBertConfig(vocab_size=tokenizer.vocab_size, dim=32, n_layers=2, n_heads=2,
+                                           hidden_dim=64, num_labels=len(labels),
+                                           id2label=dict(enumerate(labels)),
+                                           label2id={label: i for i, label in enumerate(labels)})
+    model = transformers.DistilBertForSequenceClassification(config).eval()
+    return transformers.pipeline("text-classification", model=model, tokenizer=tokenizer, device=-1)
+
+
+def make_analyzer(sentiment, emotion):
+    analyzer = SentimentAnalyzer(model_type="local")
+    analyzer._sentiment_pipeline = sentiment
+    analyzer._emotion_pipeline = emotion
+    return analyzer
+
+
+@pytest.mark.parametrize("shared_encoder", [False, True])
+def test_multihead_matches_two_model_path(shared_encoder):
+    tokenizer = make_tokenizer()
+    sentiment = make_pipeline(tokenizer, ["NEGATIVE", "POSITIVE"], seed=0)
+    emotion = make_pipeline(tokenizer, EMOTIONS, seed=1)
+    if shared_encoder:
+        emotion.model.distilbert.load_state_dict(sentiment.model.distilbert.state_dict())
+    analyzer = make_analyzer(sentiment, emotion)
+
+    expected = analyzer._run_models(TEXTS)
+    analyzer._multihead_runner = MultiHeadRunner.create(sentiment, emotion)
+    assert analyzer._multihead_runner.shared_encoder == shared_encoder
+    results = analyzer._run_models(TEXTS)
+
+    for got, want in zip(results, expected):
+        assert set(got) == set(want) # Same schema as the two-model path
+        assert got["sentiment_label"] == want["sentiment_label"]
+        assert got["emotion"] == want["emotion"]
+        assert got["confidence_score"] == pytest.approx(want["confidence_score"], abs=1e-5)
+        assert got["emotion_score"] == pytest.approx(want["emotion_score"], abs=1e-5)
+
+
+def test_different_tokenizers_fall_back():
+    sentiment = make_pipeline(make_tokenizer(), ["NEGATIVE", "POSITIVE"], seed=0)
+    emotion = make_pipeline(make_tokenizer(WORDS + ["extra"]), EMOTIONS, seed=1)
+    assert MultiHeadRunner.create(sentiment, emotion) is None
@@ -0,0 +1,82 @@
+import json
+import pytest
+
+from backend.app.services.sentiment_analyzer import SentimentAnalyzer
+from backend.app.services.pre_classifier import LexiconClassifier
+
+
+def test_clear_posts_are_answered():
+    results = LexiconClassifier().classify(["I absolutely love Netflix", "Hate ChatGPT", "Disappointed by Tesla"])
+
+    assert [r["sentiment_label"] for r in results] == ["positive", "negative", "negative"]
+    assert [r["emotion"] for r in results] == ["joy", "anger", "sadness"]
+    assert all(r["model_name"] == "lexicon" and r["confidence_score"] >= 0.9 for r in results)
+
+
+def test_uncertain_posts_escalate():
+    texts = [
+        "Just bought iPhone 16",                    # No lexicon words
+        "I love the screen but hate the battery",   # Mixed polarity
+        "Not happy with Netflix",                   # Negated only
+        "love " + "word " * 30,                     # Too long
+    ]
+    assert LexiconClassifier().classify(texts) == [None] * len(texts)
+
+
+def test_negation_flips_polarity():
+    scored = LexiconClassifier().score(["not bad", "bad", "never not great"])
+    assert scored["score"][0] == -scored["score"][1] > 0
+    assert scored["score"][2] < 0
+
+
+def test_threshold_controls_escalation():
+    texts = ["great phone", "I love it", "nice"]
+    strict = LexiconClassifier(threshold=0.99).classify(texts)
+    loose = LexiconClassifier(threshold=0.8).classify(texts)
+    assert sum(r is None for r in strict) > sum(r is None for r in loose)
+
+
+def test_from_env(tmp_path, monkeypatch):
+    lexicon = tmp_path / "lexicon.json"
+    lexicon.write_text(json.dumps({"meh": [-3.0, "sadness"]}))
+    monkeypatch.setenv("PRECLASSIFIER_LEXICON", str(lexicon))
+    monkeypatch.setenv("CASCADE_THRESHOLD", "0.95")
+    monkeypatch.setenv("CASCADE_MAX_WORDS", "5")
+
+    classifier = LexiconClassifier.from_env()
+    assert (classifier.threshold, classifier.max_words) == (0.95, 5)
+    assert classifier.classify(["meh", "love it"])[0]["emotion"] == "sadness"
+    assert classifier.classify(["love it"]) == [None]
+
+
+def test_cache_key_follows_the_lexicon(tmp_path, monkeypatch):
+    lexicon = tmp_path / "lexicon.json"
+    monkeypatch.setenv("MODEL_CASCADE", "true")
+    monkeypatch.setenv("PRECLASSIFIER_LEXICON", str(lexicon))
+
+    keys = []
+    for weight in (-3.0, -2.0):
+        lexicon.write_text(json.dumps({"meh": [weight, "sadness"]}))
+        keys.append(SentimentAnalyzer(model_type="local").cache.model_key)
+    assert keys[0] != keys[1] # Same path and settings, different contents
+    lexicon.write_text(json.dumps({"meh": [-3.0, "sadness"]}))
+    assert SentimentAnalyzer(model_type="local").cache.model_key == keys[0]
+
+
+def test_cascade_only_escalates_uncertain_posts(monkeypatch):
+    monkeypatch.setenv("MODEL_CASCADE", "true")
+    monkeypatch.setenv("INFERENCE_CACHE_SIZE", "0")
+    analyzer = SentimentAnalyzer(model_type="local")
+
+    seen = []
+    def run_models(texts):
+        seen.extend(texts)
+        return [{"sentiment_label": "neutral", "confidence_score": 0.5, "model_name": "model",
+                 "emotion": "neutral", "emotion_score": 0.5} for _ in texts]
+    monkeypatch.setattr(analyzer, "_run_models", run_models)
+
+    results = analyzer.classify_batch(["I absolutely love Netflix", "Just bought iPhone 16", "Hate Tesla"])
+
+    assert seen == ["Just bought iPhone 16"]
+    assert [r["model_name"] for r in results] == ["lexicon", "model", "lexicon"]
+    assert analyzer.escalation_rate() == pytest.approx(1 / 3)
@@ -1,3 +1,6 @@
+import os
+import sys
+import subprocess
 import pytest
 from backend.app.services.sentiment_analyzer import SentimentAnalyzer
 
@@ -29,4 +32,88 @@ async def test_error_branches(analyzer):
     
     # Hits Line 90-101 (Emotion error handling)
     with pytest.raises(Exception):
-        await analyzer.analyze_emotion("")
\ No newline at end of file
+        await analyzer.analyze_emotion("")
+
+@pytest.mark.anyio
+async def test_batch_matches_single_path(analyzer):
+    texts = ["I absolutely love Netflix", "Hate ChatGPT", "Just bought iPhone 16", "Neutral.", ""]
+    batch = await analyzer.batch_analyze(texts)
+
+    # Empty input is reported as None, everything else in input order
+    assert batch[-1] is None
+    for text, result in zip(texts[:-1], batch[:-1]):
+        single = await analyzer.analyze_sentiment(text)
+        emotion = await analyzer.analyze_emotion(text)
+        assert result["sentiment_label"] == single["sentiment_label"]
+        assert result["confidence_score"] == pytest.approx(single["confidence_score"], abs=1e-4)
+        assert result["emotion"] == emotion["emotion"]
+
+
+def test_plan_batches_respects_token_budget(analyzer):
+    analyzer.max_batch_tokens = 64
+    analyzer.max_batch_size = 4
+    texts = ["short"] * 6 + ["a much longer post " * 5] * 3
+
+    lengths = [len(ids) for ids in analyzer.sentiment_pipeline.tokenizer(texts)["input_ids"]]
+    batches = analyzer._plan_batches(texts)
+
+    assert sorted(i for batch in batches for i in batch) == list(range(len(texts)))
+    for batch in batches:
+        assert len(batch) <= 4
+        assert len(batch) == 1 or max(lengths[i] for i in batch) * len(batch) <= 64
+
+
+@pytest.mark.anyio
+async def test_quantized_backend_keeps_contract():
+    quantized = SentimentAnalyzer(model_type='quantized')
+    result = await quantized.analyze_sentiment("I absolutely love Netflix")
+    assert result["sentiment_label"] in ("positive", "negative", "neutral")
+    assert 0.0 <= result["confidence_score"] <= 1.0
+
+    batch = quantized.classify_batch(["Hate ChatGPT"])
+    assert set(batch[0]) >= {"sentiment_label", "confidence_score", "model_name", "emotion"}
+
+
+def test_import_and_construction_do_not_load_models():
+    # transformers/torch are only imported when a pipeline is first needed
+    code = ("import sys; from app.services.sentiment_analyzer import SentimentAnalyzer; "
+            "a = SentimentAnalyzer(model_type='local'); "
+            "print('transformers' in sys.modules, 'torch' in sys.modules, a._sentiment_pipeline, a.ready)")
+    backend_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                            env={**os.environ, "PYTHONPATH": backend_dir}).stdout.split()
+    assert output == ["False", "False", "None", "False"]
+
+
+def test_interrupted_onnx_export_is_redone(tmp_path, monkeypatch):
+    exports = []
+
+    class FakeORTModel:
+        @classmethod
+        def from_pretrained(cls, source, export=False):
+            model = cls()
+            model.source = source
+            if export:
+                exports.append(source)
+            return model
+
+        def save_pretrained(self, directory):
+            os.makedirs(directory)
+            open(os.path.join(directory, SentimentAnalyzer.ONNX_FILE), "w").close()
+
+    onnxruntime = type(sys)("optimum.onnxruntime")
+    onnxruntime.ORTModelForSequenceClassification = FakeORTModel
+    monkeypatch.setitem(sys.modules, "optimum", type(sys)("optimum"))
+    monkeypatch.setitem(sys.modules, "optimum.onnxruntime", onnxruntime)
+    monkeypatch.setenv("ONNX_CACHE_DIR", str(tmp_path))
+
+    partial = tmp_path / "org__model"
+    partial.mkdir()
+    (partial / "config.json").write_text("{}") # Export killed before the graph was written
+    analyzer = SentimentAnalyzer(model_type='onnx')
+
+    assert analyzer._load_onnx_model("org/model").source == str(partial)
+    assert (partial / SentimentAnalyzer.ONNX_FILE).exists()
+    assert analyzer._load_onnx_model("org/model").source == str(partial)
+    assert exports == ["org/model"] # Reused once complete
+    assert sorted(os.listdir(tmp_path)) == ["org__model"] # No temp dirs left behind
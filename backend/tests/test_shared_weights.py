@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+from safetensors.numpy import save_file
+from backend.app.services.shared_weights import read_header, DTYPES
+
+
+def test_read_header_offsets(tmp_path):
+    path = str(tmp_path / "weights.safetensors")
+    arrays = {"weight": np.arange(12, dtype=np.float32).reshape(3, 4), "ids": np.arange(5, dtype=np.int64)}
+    save_file(arrays, path, metadata={"aliases": "{}"})
+
+    header, metadata, data_start = read_header(path)
+    assert metadata == {"aliases": "{}"}
+    assert set(header) == {"weight", "ids"}
+    with open(path, "rb") as f:
+        raw = f.read()
+    for name, array in arrays.items():
+        begin, end = header[name]["data_offsets"]
+        assert header[name]["dtype"] in DTYPES
+        # Offsets are aligned, so tensors can be viewed in place on the mapping
+        assert (data_start + begin) % array.itemsize == 0
+        loaded = np.frombuffer(raw[data_start + begin:data_start + end], dtype=array.dtype).reshape(array.shape)
+        assert np.array_equal(loaded, array)
+
+
+def test_state_dict_round_trip_shares_memory(tmp_path):
+    torch = pytest.importorskip("torch")
+    from backend.app.services.shared_weights import save_state_dict, load_state_dict
+
+    model = torch.nn.Sequential(torch.nn.Embedding(10, 4), torch.nn.Linear(4, 10))
+    model[1].weight = model[0].weight # Tied, like input/output embeddings
+    path = str(tmp_path / "model.safetensors")
+    save_state_dict(model.state_dict(), path)
+
+    header, _, _ = read_header(path)
+    assert "1.weight" not in header # Stored once, restored as an alias
+
+    state = load_state_dict(path)
+    assert state["1.weight"].data_ptr() == state["0.weight"].data_ptr()
+    copy = torch.nn.Sequential(torch.nn.Embedding(10, 4), torch.nn.Linear(4, 10))
+    copy.load_state_dict(state, assign=True)
+    assert copy[0].weight.data_ptr() == state["0.weight"].data_ptr() # Not copied
+    ids = torch.tensor([1, 2, 3])
+    assert torch.equal(copy(ids), model(ids))
@@ -0,0 +1,142 @@
+import asyncio
+import json
+import pytest
+from backend.app.api.websocket import ConnectionManager, Subscription
+
+
+class FakeWebSocket:
+    """Records frames; can be slow (delay) or broken (fail)"""
+    def __init__(self, delay=0.0, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.frames = []
+        self.closed = False
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, payload):
+        if self.fail:
+            raise RuntimeError("connection reset")
+        await asyncio.sleep(self.delay)
+        self.frames.append(json.loads(payload))
+
+    async def close(self):
+        self.closed = True
+
+
+@pytest.mark.anyio
+async def test_slow_client_does_not_block_others():
+    manager = ConnectionManager(max_queue=10, send_timeout=5)
+    fast, slow = FakeWebSocket(), FakeWebSocket(delay=1.0)
+    await manager.connect(fast)
+    await manager.connect(slow)
+
+    for i in range(3):
+        await manager.broadcast({"n": i})
+    await asyncio.sleep(0.05)
+
+    assert [frame["n"] for frame in fast.frames] == [0, 1, 2]
+    assert slow.frames == []
+    assert manager.metrics()["queue_depth_max"] >= 1
+
+    manager.disconnect(fast)
+    manager.disconnect(slow)
+
+
+@pytest.mark.anyio
+async def test_dead_client_is_evicted():
+    manager = ConnectionManager(max_queue=10)
+    dead = FakeWebSocket(fail=True)
+    await manager.connect(dead)
+
+    await manager.broadcast({"n": 1})
+    await asyncio.sleep(0.01)
+
+    assert manager.active_connections == []
+    assert dead.closed
+    assert manager.metrics()["evicted_connections"] == 1
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("policy,expected", [
+    ("drop_oldest", [0, 3, 4, 5]),
+    ("drop_newest", [0, 1, 2, 3]),
+    ("coalesce", [0, 4, 5]),
+])
+async def test_overflow_policies(policy, expected):
+    manager = ConnectionManager(max_queue=3, overflow_policy=policy)
+    client = FakeWebSocket(delay=0.05)
+    await manager.connect(client)
+
+    await manager.broadcast({"n": 0})
+    await asyncio.sleep(0) # Sender picks up frame 0 and starts sending it
+    for i in range(1, 6):
+        await manager.broadcast({"n": i})
+    await asyncio.sleep(0.3)
+
+    assert [frame["n"] for frame in client.frames] == expected
+    assert manager.dropped_messages == 6 - len(expected)
+    manager.disconnect(client)
+
+
+def post(source="twitter", label="positive", emotion="joy"):
+    return {"type": "new_post", "data": {"post_id": "p", "source": source,
+                                         "sentiment_label": label, "emotion": emotion}}
+
+
+@pytest.mark.anyio
+async def test_raw_subscription_filters():
+    manager = ConnectionManager()
+    everything, negative_reddit = FakeWebSocket(), FakeWebSocket()
+    await manager.connect(everything)
+    await manager.connect(negative_reddit)
+    manager.subscribe(negative_reddit, Subscription({"source": ["reddit"], "sentiment_label": "negative"}))
+
+    await manager.broadcast(post("twitter", "negative"))
+    await manager.broadcast(post("reddit", "positive"))
+    await manager.broadcast(post("reddit", "negative"))
+    await asyncio.sleep(0.01)
+
+    assert len(everything.frames) == 3
+    assert [(f["data"]["source"], f["data"]["sentiment_label"]) for f in negative_reddit.frames] == [("reddit", "negative")]
+    manager.disconnect(everything)
+    manager.disconnect(negative_reddit)
+
+
+@pytest.mark.anyio
+async def test_aggregate_mode_sends_periodic_deltas():
+    manager = ConnectionManager()
+    first, second = FakeWebSocket(), FakeWebSocket()
+    await manager.connect(first)
+    await manager.connect(second)
+    subscription = {"source": "twitter"}
+    manager.subscribe(first, Subscription(subscription, mode="aggregate", interval_ms=100))
+    manager.subscribe(second, Subscription(subscription, mode="aggregate", interval_ms=100))
+    assert manager.metrics()["aggregate_groups"] == 1 # Identical subscriptions share one aggregate
+
+    for label in ["positive", "positive", "negative"]:
+        await manager.broadcast(post("twitter", label))
+    await manager.broadcast(post("reddit", "negative"))
+    await asyncio.sleep(0.25)
+
+    for client in (first, second):
+        # No raw posts, just one delta with the matching counts
+        assert [frame["type"] for frame in client.frames] == ["aggregate"]
+        assert client.frames[0]["total"] == 3
+        assert client.frames[0]["sentiments"] == {"positive": 2, "negative": 1, "neutral": 0}
+
+    manager.disconnect(first)
+    manager.disconnect(second)
+    assert manager.metrics()["aggregate_groups"] == 0
+
+
+def test_invalid_subscription():
+    with pytest.raises(ValueError):
+        Subscription({"author": "x"})
+    with pytest.raises(ValueError):
+        Subscription(mode="everything")
+    with pytest.raises(ValueError):
+        Subscription(["source"])
+    with pytest.raises(ValueError):
+        Subscription({"source": {"reddit": 1}})
@@ -0,0 +1,394 @@
+import os
+import json
+import uuid
+import signal
+import subprocess
+import sys
+from collections import deque
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from sqlalchemy import text
+from worker.worker import SentimentWorker
+from backend.app.models.database import SessionLocal, SentimentAnalysis, SentimentRollup, retry_with_backoff
+
+
+class FakeAnalyzer:
+    def classify_batch(self, texts):
+        return [
+            {"sentiment_label": "positive", "confidence_score": 0.9, "model_name": "fake", "emotion": "joy"}
+            for _ in texts
+        ]
+
+
+class FailingAnalyzer:
+    def classify_batch(self, texts):
+        raise RuntimeError("model crashed")
+
+
+class FakeRedis:
+    """Just enough of redis.Redis for the worker's batch path, with a pending entries list"""
+    def __init__(self, entries):
+        self.entries = list(entries)
+        self.published = []
+        self.acked = []
+        self.pending = {} # id -> [data, times delivered]
+        self.dead = []
+        self.keys = {}
+
+    def xreadgroup(self, groupname, consumername, streams, count, block):
+        batch, self.entries = self.entries[:count], self.entries[count:]
+        for message_id, data in batch:
+            self.pending[message_id] = [data, 1]
+        return [("stream", batch)] if batch else []
+
+    def xack(self, stream, group, *ids):
+        self.acked.append(ids)
+        for message_id in ids:
+            self.pending.pop(message_id, None)
+
+    def xautoclaim(self, stream, group, consumer, min_idle_time, start_id="0-0", count=100):
+        # Everything pending counts as idle here
+        claimed = []
+        for message_id, entry in list(self.pending.items())[:count]:
+            entry[1] += 1
+            claimed.append((message_id, entry[0]))
+        return ["0-0", claimed, []]
+
+    def xpending_range(self, stream, group, min, max, count, consumername=None):
+        return [{"message_id": message_id, "times_delivered": entry[1]} for message_id, entry in self.pending.items()]
+
+    def xinfo_consumers(self, stream, group):
+        return []
+
+    def xadd(self, stream, fields, maxlen=None, approximate=True):
+        self.dead.append(fields)
+
+    def set(self, key, value, ex=None):
+        self.keys[key] = value
+
+    def pipeline(self, transaction=True):
+        return self
+
+    def publish(self, channel, message):
+        self.published.append(message)
+
+    def execute(self):
+        pass
+
+
+class WarmingAnalyzer(FakeAnalyzer):
+    def __init__(self):
+        self.warmed = False
+
+    def warm_up(self):
+        self.warmed = True
+
+
+class FakePool(FakeAnalyzer):
+    processes = 2
+
+    def submit(self, texts):
+        future = Future()
+        future.set_result(self.classify_batch(texts))
+        return future
+
+
+class BrokenPool(FakePool):
+    """Its first batch was in flight when an inference process died"""
+    def __init__(self):
+        self.broken = True
+
+    def submit(self, texts):
+        future = Future()
+        if self.broken:
+            self.broken = False
+            future.set_exception(BrokenProcessPool("A child process terminated abruptly"))
+        else:
+            future.set_result(self.classify_batch(texts))
+        return future
+
+
+def _init_fake_process(torch_threads):
+    """InferencePool initializer without torch or models"""
+    from worker import inference_pool
+    inference_pool._analyzer = FakeAnalyzer()
+
+
+class MeteredAnalyzer(FakeAnalyzer):
+    def classify_batch(self, texts):
+        from app.metrics import INFERENCE_CACHE_LOOKUPS
+        INFERENCE_CACHE_LOOKUPS.labels("miss").inc(len(texts))
+        return super().classify_batch(texts)
+
+
+def _init_metered_process(torch_threads):
+    from worker import inference_pool
+    inference_pool._analyzer = MeteredAnalyzer()
+
+
+def make_worker(entries, batch_size):
+    worker = SentimentWorker.__new__(SentimentWorker) # Skip Redis/DB/model setup
+    worker.stream_name = "stream"
+    worker.group_name = "group"
+    worker.consumer_name = "test"
+    worker.batch_size = batch_size
+    worker.batch_linger_ms = 0
+    worker.stage_timings = {}
+    worker.pool = None
+    worker.in_flight = deque()
+    worker.claim_idle_ms = 0
+    worker.reclaim_interval = 3600
+    worker.max_deliveries = 3
+    worker.dead_letter_stream = "stream:dead"
+    worker.consumer_expire_ms = 3600000
+    worker.last_reclaim = 0.0
+    worker.status_interval = 15.0
+    worker.state = "starting"
+    worker.warm_up_seconds = None
+    worker.last_status = 0.0
+    worker.redis = FakeRedis(entries)
+    worker.analyzer = FakeAnalyzer()
+    return worker
+
+
+def make_entries(post_ids, source="test"):
+    return [
+        (f"{i}-0", {"post_id": pid, "content": "Great", "source": source, "author": "a",
+                    "created_at": datetime.utcnow().isoformat()})
+        for i, pid in enumerate(post_ids)
+    ]
+
+
+def cleanup(db, post_ids, source="test"):
+    ids = ", ".join(f"'{pid}'" for pid in post_ids)
+    db.execute(text(f"DELETE FROM sentiment_rollups WHERE source = '{source}'"))
+    db.execute(text(f"DELETE FROM sentiment_analysis WHERE post_id IN ({ids})"))
+    db.execute(text(f"DELETE FROM social_media_posts WHERE post_id IN ({ids})"))
+    db.commit()
+    db.close()
+
+
+def test_consume_once_batches_and_acks_once():
+    post_ids = [str(uuid.uuid4()) for _ in range(5)]
+    worker = make_worker(make_entries(post_ids), batch_size=3)
+    db = SessionLocal()
+    try:
+        assert worker.consume_once() == 3
+        assert worker.consume_once() == 2
+        assert set(worker.stage_timings) == {"read", "inference", "db", "publish", "ack"}
+        assert worker.consume_once() == 0
+
+        # One XACK call per batch, every post published and saved
+        assert [len(ids) for ids in worker.redis.acked] == [3, 2]
+        assert len(worker.redis.published) == 5
+        saved = db.query(SentimentAnalysis).filter(SentimentAnalysis.post_id.in_(post_ids)).count()
+        assert saved == 5
+    finally:
+        cleanup(db, post_ids)
+
+
+def test_pool_mode_keeps_batches_in_flight():
+    post_ids = [str(uuid.uuid4()) for _ in range(7)]
+    worker = make_worker(make_entries(post_ids), batch_size=2)
+    worker.pool = worker.analyzer = FakePool()
+    db = SessionLocal()
+    try:
+        # First call queues processes * 2 batches and completes the oldest
+        assert worker.consume_once() == 2
+        assert len(worker.in_flight) == 3
+        handled = 2
+        while worker.in_flight:
+            handled += worker.consume_once()
+
+        assert handled == 7
+        assert [len(ids) for ids in worker.redis.acked] == [2, 2, 2, 1]
+        saved = db.query(SentimentAnalysis).filter(SentimentAnalysis.post_id.in_(post_ids)).count()
+        assert saved == 7
+    finally:
+        cleanup(db, post_ids)
+
+
+def test_pool_mode_resubmits_batches_after_a_process_dies():
+    post_ids = [str(uuid.uuid4()) for _ in range(2)]
+    worker = make_worker(make_entries(post_ids), batch_size=2)
+    worker.pool = worker.analyzer = BrokenPool()
+    db = SessionLocal()
+    try:
+        assert worker.consume_once() == 2
+        assert [len(ids) for ids in worker.redis.acked] == [2]
+        saved = db.query(SentimentAnalysis).filter(SentimentAnalysis.post_id.in_(post_ids)).count()
+        assert saved == 2
+    finally:
+        cleanup(db, post_ids)
+
+
+def test_inference_pool_restarts_after_a_process_is_killed(monkeypatch):
+    from worker import inference_pool
+
+    monkeypatch.setenv("MODEL_SHARED_WEIGHTS", "false") # Nothing to export
+    monkeypatch.setattr(inference_pool, "_init_process", _init_fake_process)
+    pool = inference_pool.InferencePool(processes=2, torch_threads=1)
+    try:
+        pool.warm_up()
+        pids = set(pool._executor._processes)
+        for pid in pids: # e.g. OOM-killed
+            os.kill(pid, signal.SIGKILL)
+
+        results = pool.classify_batch(["Great", "Awful"])
+        assert [r["model_name"] for r in results] == ["fake", "fake"]
+        assert pool.restarts == 1
+        assert pool.submit(["Great"]).result()[0]["sentiment_label"] == "positive"
+        assert not pids & set(pool._executor._processes)
+    finally:
+        pool.shutdown()
+
+
+def test_redelivered_batch_is_idempotent():
+    post_ids = [str(uuid.uuid4()) for _ in range(3)]
+    source = f"test_{uuid.uuid4().hex[:8]}"
+    entries = make_entries(post_ids, source)
+    worker = make_worker(entries + entries, batch_size=3)
+    db = SessionLocal()
+    try:
+        worker.consume_once()
+        worker.consume_once() # Same three messages delivered again
+
+        saved = db.query(SentimentAnalysis).filter(SentimentAnalysis.post_id.in_(post_ids)).count()
+        assert saved == 3
+        assert len(worker.redis.published) == 3
+
+        # Rollups count each analysis once per granularity
+        rollups = db.query(SentimentRollup.granularity, SentimentRollup.count).filter(
+            SentimentRollup.source == source
+        ).all()
+        assert sorted(rollups) == [("day", 3), ("hour", 3), ("minute", 3)]
+    finally:
+        cleanup(db, post_ids, source)
+
+
+def test_failed_messages_stay_pending_and_are_reclaimed():
+    post_ids = [str(uuid.uuid4()) for _ in range(2)]
+    worker = make_worker(make_entries(post_ids), batch_size=2)
+    worker.analyzer = FailingAnalyzer()
+    db = SessionLocal()
+    try:
+        assert worker.consume_once() == 2
+        assert worker.redis.acked == [] # Nothing lost: both entries are still pending
+        assert len(worker.redis.pending) == 2
+
+        # Another worker picks them up once they've been idle long enough
+        rescuer = make_worker([], batch_size=2)
+        rescuer.consumer_name = "rescuer"
+        rescuer.redis = worker.redis
+        assert rescuer.reclaim_pending() == 2
+        assert worker.redis.pending == {}
+        saved = db.query(SentimentAnalysis).filter(SentimentAnalysis.post_id.in_(post_ids)).count()
+        assert saved == 2
+    finally:
+        cleanup(db, post_ids)
+
+
+def test_poison_and_malformed_messages_are_dead_lettered():
+    post_ids = [str(uuid.uuid4())]
+    malformed = ("9-0", {"post_id": "broken", "content": "x"}) # No created_at
+    worker = make_worker(make_entries(post_ids) + [malformed], batch_size=2)
+    worker.analyzer = FailingAnalyzer()
+
+    worker.consume_once()
+    # Malformed entry: dead-lettered and acked at once; the other one is retried
+    assert [entry["original_id"] for entry in worker.redis.dead] == ["9-0"]
+    assert list(worker.redis.pending) == ["0-0"]
+
+    worker.reclaim_pending() # 2nd delivery
+    worker.reclaim_pending() # 3rd delivery
+    assert list(worker.redis.pending) == ["0-0"]
+    worker.reclaim_pending() # 4th > max_deliveries
+    assert worker.redis.pending == {}
+    assert worker.redis.dead[-1]["original_id"] == "0-0"
+    assert worker.redis.dead[-1]["deliveries"] == 4
+
+
+def test_warm_up_reports_readiness():
+    worker = make_worker([], batch_size=2)
+    worker.analyzer = WarmingAnalyzer()
+    worker.warm_up()
+
+    assert worker.analyzer.warmed
+    status = json.loads(worker.redis.keys["worker_status:test"])
+    assert status["state"] == "ready"
+    assert status["warm_up_seconds"] is not None
+
+
+def test_retry_with_backoff():
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ConnectionError("not yet")
+        return "up"
+
+    assert retry_with_backoff(flaky, "flaky", timeout=5, initial_delay=0.01) == "up"
+    assert len(attempts) == 3
+
+    def down():
+        raise ConnectionError("still down")
+
+    try:
+        retry_with_backoff(down, "down", timeout=0.05, initial_delay=0.01)
+        assert False, "should give up after the timeout"
+    except ConnectionError:
+        pass
+
+
+def test_init_db_adds_unique_key_to_existing_table(tmp_path, monkeypatch):
+    from sqlalchemy import create_engine, inspect
+    from backend.app.models import database
+
+    legacy = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with legacy.begin() as conn:
+        # sentiment_analysis as created before the unique key existed, with a redelivered duplicate
+        conn.execute(text("CREATE TABLE sentiment_analysis (id INTEGER PRIMARY KEY, post_id VARCHAR(255), "
+                          "model_name VARCHAR(100), sentiment_label VARCHAR(20), confidence_score FLOAT, "
+                          "emotion VARCHAR(50), analyzed_at DATETIME)"))
+        conn.execute(text("INSERT INTO sentiment_analysis (post_id, model_name, sentiment_label) VALUES "
+                          "('a', 'm', 'positive'), ('a', 'm', 'positive'), ('a', 'other', 'negative'), ('b', 'm', 'neutral')"))
+    monkeypatch.setattr(database, "engine", legacy)
+
+    database.init_db()
+    database.init_db() # Idempotent
+
+    with legacy.connect() as conn:
+        rows = conn.execute(text("SELECT id, post_id, model_name FROM sentiment_analysis ORDER BY id")).fetchall()
+    assert [tuple(row) for row in rows] == [(1, "a", "m"), (3, "a", "other"), (4, "b", "m")]
+    # The unique index (post_id first) also serves the /api/posts join
+    indexes = {i["name"]: i for i in inspect(legacy).get_indexes("sentiment_analysis")}
+    assert indexes["uq_sentiment_analysis_post_model"]["column_names"] == ["post_id", "model_name"]
+    assert indexes["uq_sentiment_analysis_post_model"]["unique"]
+    assert "ix_analysis_label_post_id" in indexes
+
+
+def test_pool_process_metrics_are_exported(tmp_path):
+    # Multiprocess mode is chosen when prometheus_client loads, so run it in a fresh interpreter
+    script = """
+from worker import inference_pool
+import test_worker
+inference_pool._init_process = test_worker._init_metered_process
+pool = inference_pool.InferencePool(processes=2, torch_threads=1)
+pool.classify_batch(["a", "b", "c"])
+pool.shutdown()
+
+import socket, urllib.request
+from app.metrics import start_metrics_server
+with socket.socket() as probe:
+    probe.bind(("127.0.0.1", 0))
+    port = probe.getsockname()[1]
+start_metrics_server(port)
+print(urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics").read().decode())
+"""
+    env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(tmp_path), "MODEL_SHARED_WEIGHTS": "false",
+           "PYTHONPATH": os.pathsep.join([".", "backend", os.path.dirname(__file__)])}
+    output = subprocess.run([sys.executable, "-c", script], env=env, capture_output=True, text=True,
+                            timeout=120, check=True).stdout
+    assert 'inference_cache_lookups_total{result="miss"} 3.0' in output
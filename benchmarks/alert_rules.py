@@ -0,0 +1,105 @@
+# benchmarks/alert_rules.py
+"""
+Alert evaluation cost as the rule count grows (10 -> 1000 rules).
+
+Random rules (all metrics, several windows, half of them per source) are loaded
+into a StreamingAlertEngine fed with synthetic posts. For every rule count we time
+one vectorized evaluate() over all (rule, source) pairs and, for comparison, the
+same evaluation done one rule at a time in Python. We also replay --posts posts
+arriving at --rate posts/sec with an evaluation every --eval-ms, as the API leader
+does, and report the cost per post (add, bulk counting and evaluation) and the
+share of one core that takes at that rate. Needs no Redis/Postgres:
+
+    docker-compose run --rm backend python benchmarks/alert_rules.py --rules 10 100 1000
+"""
+import argparse
+import random
+import time
+
+from app.services.alert_engine import AlertRule, StreamingAlertEngine, EMOTIONS, FEATURE_INDEX, TOTAL
+
+SOURCES = ["twitter", "reddit", "facebook", "news", "forum"]
+
+
+def random_rules(count):
+    rules = []
+    for i in range(count):
+        metric = random.choice(["ratio", "share", "count", "mean"])
+        numerator = {"ratio": "negative", "share": f"emotion:{random.choice(EMOTIONS)}",
+                     "count": "total", "mean": "confidence"}[metric]
+        rules.append(AlertRule(f"rule_{i}", metric=metric, numerator=numerator,
+                               op="<" if metric == "mean" else ">",
+                               threshold={"ratio": 2.0, "share": 0.4, "count": 5000, "mean": 0.5}[metric],
+                               window_seconds=random.choice([60, 300, 900, 3600]),
+                               dimension=random.choice([None, "source"])))
+    return rules
+
+
+def random_post():
+    return {"source": random.choice(SOURCES), "sentiment_label": random.choice(["positive", "negative", "neutral"]),
+            "emotion": random.choice(EMOTIONS), "confidence_score": random.random()}
+
+
+def evaluate_per_rule(engine, now):
+    """Baseline: the same decision, one (rule, scope) pair at a time"""
+    sums = engine.snapshot(now)
+    windows = list(engine.windows)
+    fired = 0
+    for rule, row in engine.instances:
+        values = sums[windows.index(rule.window_seconds) * len(engine.scopes) + row]
+        value = values[FEATURE_INDEX[rule.numerator]] / max(values[FEATURE_INDEX[rule.denominator]], 1)
+        above = value > rule.threshold if rule.op == ">" else value < rule.threshold
+        fired += above and values[TOTAL] >= rule.min_posts
+    return fired
+
+
+def stream_cost(engine, posts, now, rate, eval_seconds):
+    """Seconds spent per post when posts arrive at rate/sec and rules run every eval_seconds"""
+    start = time.perf_counter()
+    last_eval = now
+    for i, post in enumerate(posts):
+        at = now + i / rate
+        engine.add(post, at)
+        if at - last_eval >= eval_seconds:
+            engine.evaluate(at)
+            last_eval = at
+    engine.evaluate(now + len(posts) / rate)
+    return (time.perf_counter() - start) / len(posts)
+
+
+def main(args):
+    print(f"{args.rate} posts/sec, evaluated every {args.eval_ms} ms")
+    print(f"{'rules':>6} | {'pairs':>6} | {'vectorized ms':>13} | {'per-rule ms':>11} | "
+          f"{'us/post':>7} | {'core @ rate':>11}")
+    for count in args.rules:
+        engine = StreamingAlertEngine(random_rules(count))
+        now = time.time()
+        posts = [random_post() for _ in range(args.posts)]
+
+        per_post = stream_cost(engine, posts, now, args.rate, args.eval_ms / 1000)
+        now += len(posts) / args.rate
+
+        engine.evaluate(now) # Compiles the rule arrays
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            engine.evaluate(now)
+        vectorized_ms = (time.perf_counter() - start) * 1000 / args.repeat
+
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            evaluate_per_rule(engine, now)
+        per_rule_ms = (time.perf_counter() - start) * 1000 / args.repeat
+
+        print(f"{count:>6} | {len(engine.instances):>6} | {vectorized_ms:>13.3f} | {per_rule_ms:>11.3f} | "
+              f"{per_post * 1e6:>7.1f} | {per_post * args.rate:>10.1%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rules", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--posts", type=int, default=50000)
+    parser.add_argument("--rate", type=int, default=10000, help="Posts/sec to replay (the soak target)")
+    parser.add_argument("--eval-ms", type=int, default=100, help="ALERT_EVAL_INTERVAL_MS")
+    parser.add_argument("--repeat", type=int, default=200)
+    random.seed(0)
+    main(parser.parse_args())
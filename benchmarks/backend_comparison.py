@@ -0,0 +1,91 @@
+# benchmarks/backend_comparison.py
+"""
+Accuracy vs latency of the inference backends ('local' fp32, 'quantized', 'onnx').
+
+The fp32 'local' models are the reference: for every other backend we report how
+often its sentiment/emotion labels agree with them and how far confidences drift.
+With --labeled FILE (JSONL with "text" and "label" = positive/negative/neutral)
+true sentiment accuracy is reported for every backend as well.
+
+    docker-compose run --rm worker python benchmarks/backend_comparison.py --posts 512
+"""
+import argparse
+import json
+import time
+
+from app.services.sentiment_analyzer import SentimentAnalyzer
+from ingester.ingester import DataIngester
+
+
+def load_sample(args):
+    if args.labeled:
+        with open(args.labeled) as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+        return [row["text"] for row in rows], [row["label"] for row in rows]
+
+    generator = DataIngester.__new__(DataIngester) # Only need generate_post, no Redis client
+    # Templates repeat a lot; tag each post so duplicates aren't collapsed into one inference
+    return [f"{generator.generate_post()['content']} #{i}" for i in range(args.posts)], None
+
+
+def measure(analyzer, texts):
+    """Returns (results, batched ms/post, single-text ms/post)."""
+    analyzer.cache.max_size = 0 # Measure the model, not the cache
+    analyzer.classify_batch(texts[:8]) # Warm-up
+
+    start = time.perf_counter()
+    results = analyzer.classify_batch(texts)
+    batched_ms = (time.perf_counter() - start) * 1000 / len(texts)
+
+    singles = texts[:min(len(texts), 64)]
+    start = time.perf_counter()
+    for text in singles:
+        analyzer.analyze_sentiment_sync(text)
+        analyzer.analyze_emotion_sync(text)
+    single_ms = (time.perf_counter() - start) * 1000 / len(singles)
+    return results, batched_ms, single_ms
+
+
+def agreement(results, reference, key):
+    return sum(r[key] == ref[key] for r, ref in zip(results, reference)) / len(reference)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--posts", type=int, default=512, help="Generated posts when no --labeled file is given")
+    parser.add_argument("--labeled", help="JSONL file with 'text' and 'label' fields")
+    parser.add_argument("--backends", nargs="+", default=list(SentimentAnalyzer.PIPELINE_BACKENDS))
+    args = parser.parse_args()
+
+    texts, labels = load_sample(args)
+    reference = None
+
+    header = f"{'backend':<10} | {'batched ms':>10} | {'single ms':>9} | {'sent agree':>10} | {'emo agree':>9} | {'max |dconf|':>11}"
+    if labels:
+        header += f" | {'accuracy':>8}"
+    print(header)
+
+    for backend in args.backends:
+        try:
+            analyzer = SentimentAnalyzer(model_type=backend)
+            analyzer.load() # Models load lazily; a missing optimum/onnxruntime shows up here
+        except ImportError as e:
+            print(f"{backend:<10} | skipped: {e}")
+            continue
+
+        results, batched_ms, single_ms = measure(analyzer, texts)
+        if reference is None:
+            reference = results # First backend (default 'local') is the reference
+
+        drift = max(abs(r['confidence_score'] - ref['confidence_score']) for r, ref in zip(results, reference))
+        row = (f"{backend:<10} | {batched_ms:>10.2f} | {single_ms:>9.2f} | "
+               f"{agreement(results, reference, 'sentiment_label'):>10.1%} | "
+               f"{agreement(results, reference, 'emotion'):>9.1%} | {drift:>11.4f}")
+        if labels:
+            accuracy = sum(r['sentiment_label'] == label for r, label in zip(results, labels)) / len(labels)
+            row += f" | {accuracy:>8.1%}"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
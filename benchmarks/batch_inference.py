@@ -0,0 +1,72 @@
+# benchmarks/batch_inference.py
+"""
+Inference throughput and per-message overhead:
+
+  * asyncio.run per call  - the old worker path (two event loops + to_thread hops per post)
+  * sync, one at a time   - classify_batch([text]): no event loop, both models concurrently
+  * batched               - classify_batch(texts)
+
+Only needs the models (no Redis/Postgres):
+
+    docker-compose run --rm worker python benchmarks/batch_inference.py --posts 256
+"""
+import argparse
+import asyncio
+import time
+
+from app.services.sentiment_analyzer import SentimentAnalyzer
+from ingester.ingester import DataIngester
+
+
+def asyncio_run_path(analyzer, texts):
+    for text in texts:
+        asyncio.run(analyzer.analyze_sentiment(text))
+        asyncio.run(analyzer.analyze_emotion(text))
+
+
+def sync_path(analyzer, texts):
+    for text in texts:
+        analyzer.classify_batch([text])
+
+
+def timed(fn, analyzer, texts):
+    """Returns mean milliseconds per post."""
+    start = time.perf_counter()
+    fn(analyzer, texts)
+    return (time.perf_counter() - start) * 1000 / len(texts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--posts", type=int, default=256)
+    args = parser.parse_args()
+
+    analyzer = SentimentAnalyzer(model_type='local')
+    analyzer.cache.max_size = 0 # Measure the model, not the cache (generated posts repeat a lot)
+    generator = DataIngester.__new__(DataIngester) # Only need generate_post, no Redis client
+    texts = [generator.generate_post()['content'] for _ in range(args.posts)]
+
+    # Warm-up
+    analyzer.classify_batch(texts[:8])
+
+    # Cost of the event-loop plumbing alone, without any model
+    start = time.perf_counter()
+    for _ in texts:
+        asyncio.run(asyncio.to_thread(lambda: None))
+        asyncio.run(asyncio.to_thread(lambda: None))
+    loop_ms = (time.perf_counter() - start) * 1000 / len(texts)
+
+    rows = [
+        ("asyncio.run per call", timed(asyncio_run_path, analyzer, texts)),
+        ("sync, one at a time", timed(sync_path, analyzer, texts)),
+        ("batched", timed(lambda a, t: a.classify_batch(t), analyzer, texts)),
+    ]
+
+    print(f"event-loop overhead alone: {loop_ms:.3f} ms/post")
+    print(f"{'path':<22} | {'ms/post':>8} | {'posts/sec':>9}")
+    for name, ms in rows:
+        print(f"{name:<22} | {ms:>8.2f} | {1000 / ms:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
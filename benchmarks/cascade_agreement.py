@@ -0,0 +1,109 @@
+# benchmarks/cascade_agreement.py
+"""
+Escalation rate and agreement of the cascaded analyzer (MODEL_CASCADE) per threshold.
+
+The full models (cascade off) label every post once and are the reference. For each
+--thresholds value the lexicon pre-classifier decides which posts it answers itself;
+we report the share escalated to the models, how often its answers agree with the
+models (sentiment and emotion, on the posts it answered), the overall sentiment
+agreement of the cascade and its cost per post. With --labeled FILE (JSONL with
+"text", "label" = positive/negative/neutral and optionally "emotion") the accuracy
+of the models alone and of the cascade are reported as well.
+
+    docker-compose run --rm worker python benchmarks/cascade_agreement.py --thresholds 0.8 0.9 0.95
+"""
+import argparse
+import json
+import os
+import time
+
+from app.services.pre_classifier import LexiconClassifier
+from app.services.sentiment_analyzer import SentimentAnalyzer
+from ingester.ingester import DataIngester
+
+
+def load_sample(args):
+    if args.labeled:
+        with open(args.labeled) as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+        return [row["text"] for row in rows], rows
+
+    generator = DataIngester.__new__(DataIngester) # Only need generate_post, no Redis client
+    # Templates repeat a lot; tag each post so duplicates aren't collapsed into one inference
+    return [f"{generator.generate_post()['content']} #{i}" for i in range(args.posts)], None
+
+
+def accuracy(results, rows, key, label_key):
+    labeled = [(r, row) for r, row in zip(results, rows) if row.get(label_key)]
+    if not labeled:
+        return None
+    return sum(r[key] == row[label_key] for r, row in labeled) / len(labeled)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--posts", type=int, default=512, help="Generated posts when no --labeled file is given")
+    parser.add_argument("--labeled", help="JSONL file with 'text', 'label' and optionally 'emotion' fields")
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.8, 0.9, 0.95, 0.99])
+    parser.add_argument("--max-words", type=int, default=int(os.getenv("CASCADE_MAX_WORDS", 24)))
+    parser.add_argument("--model", default="local", choices=SentimentAnalyzer.PIPELINE_BACKENDS)
+    parser.add_argument("--output", help="Also write the results as JSON")
+    args = parser.parse_args()
+
+    texts, rows = load_sample(args)
+    os.environ["MODEL_CASCADE"] = "false"
+    analyzer = SentimentAnalyzer(model_type=args.model)
+    analyzer.cache.max_size = 0 # Measure the model, not the cache
+    analyzer.warm_up()
+
+    start = time.perf_counter()
+    reference = analyzer.classify_batch(texts)
+    model_ms = (time.perf_counter() - start) * 1000 / len(texts)
+    print(f"{args.model} models: {model_ms:.2f} ms/post over {len(texts)} posts")
+
+    header = (f"{'threshold':>9} | {'escalated':>9} | {'sent agree':>10} | {'emo agree':>9} | "
+              f"{'overall':>7} | {'ms/post':>7} | {'speedup':>7}")
+    if rows:
+        header += f" | {'accuracy':>8} | {'emo acc':>7}"
+        models_accuracy = accuracy(reference, rows, "sentiment_label", "label")
+        print(f"models alone: sentiment accuracy {models_accuracy:.1%}")
+    print(header)
+
+    results = []
+    for threshold in args.thresholds:
+        classifier = LexiconClassifier(threshold=threshold, max_words=args.max_words)
+        start = time.perf_counter()
+        answers = classifier.classify(texts)
+        lexicon_ms = (time.perf_counter() - start) * 1000 / len(texts)
+
+        answered = [(a, ref) for a, ref in zip(answers, reference) if a is not None]
+        escalated = 1 - len(answered) / len(texts)
+        # Agreement on the posts the lexicon answered (1.0 when it answered none)
+        sentiment_agree = sum(a["sentiment_label"] == ref["sentiment_label"] for a, ref in answered) / len(answered) if answered else 1.0
+        emotion_agree = sum(a["emotion"] == ref["emotion"] for a, ref in answered) / len(answered) if answered else 1.0
+        cascade = [a if a is not None else ref for a, ref in zip(answers, reference)]
+        overall = sum(c["sentiment_label"] == ref["sentiment_label"] for c, ref in zip(cascade, reference)) / len(texts)
+        cascade_ms = lexicon_ms + escalated * model_ms # Escalated posts cost a model pass
+
+        result = {"threshold": threshold, "escalation_rate": round(escalated, 4),
+                  "sentiment_agreement": round(sentiment_agree, 4), "emotion_agreement": round(emotion_agree, 4),
+                  "overall_agreement": round(overall, 4), "ms_per_post": round(cascade_ms, 3),
+                  "speedup": round(model_ms / cascade_ms, 2)}
+        row = (f"{threshold:>9} | {escalated:>9.1%} | {sentiment_agree:>10.1%} | {emotion_agree:>9.1%} | "
+               f"{overall:>7.1%} | {cascade_ms:>7.2f} | {result['speedup']:>6.1f}x")
+        if rows:
+            result["accuracy"] = accuracy(cascade, rows, "sentiment_label", "label")
+            result["emotion_accuracy"] = accuracy(cascade, rows, "emotion", "emotion")
+            row += f" | {result['accuracy']:>8.1%} | "
+            row += f"{result['emotion_accuracy']:>7.1%}" if result["emotion_accuracy"] is not None else f"{'-':>7}"
+        results.append(result)
+        print(row)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"model": args.model, "posts": len(texts), "model_ms_per_post": round(model_ms, 3),
+                       "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
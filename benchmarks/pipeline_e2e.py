@@ -0,0 +1,343 @@
+# benchmarks/pipeline_e2e.py
+"""
+End-to-end pipeline benchmark: ingester -> stream -> worker -> DB -> pub/sub -> WebSocket.
+
+Everything runs in one process against local stand-ins: fakeredis for Redis and a
+throwaway SQLite file for the database (--database-url points it at e.g. a local
+Postgres instead). The model is a stub with a configurable cost per batch and per
+post (--model local, quantized or onnx loads the transformers).
+
+- DataIngester publishes generated posts at --rate posts/sec.
+- --workers SentimentWorker threads drain the stream.
+- The API's redis_subscriber fans every update out to --clients simulated WebSocket
+  clients through the real ConnectionManager.
+- The FastAPI app is queried over ASGI throughout, to measure API latency under load.
+
+Reports sustained posts/sec, ingest-to-client latency percentiles, API latency and
+memory, and writes them as JSON so runs can be compared between commits. Needs
+backend/ and the repository root on the path, as in the worker container:
+
+    docker-compose run --rm worker python benchmarks/pipeline_e2e.py --rate 500 --duration 30
+    PYTHONPATH=backend:. python benchmarks/pipeline_e2e.py --rate 500 --duration 30 --output before.json
+    PYTHONPATH=backend:. python benchmarks/pipeline_e2e.py --rate 500 --duration 30 --compare before.json
+
+Workers are threads sharing the GIL (and SQLite allows one writer at a time), so the
+numbers are for comparing commits and settings, not for sizing production.
+Note: with --database-url the benchmark posts are written to that database.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+
+import numpy as np
+
+POSITIVE_WORDS = ("love", "amazing", "best")
+NEGATIVE_WORDS = ("hate", "terrible", "disappointed")
+
+
+class StubAnalyzer:
+    """classify_batch() with keyword labels and a fixed cost, instead of the transformers"""
+    def __init__(self, batch_ms=5.0, post_ms=0.5):
+        self.batch_ms = batch_ms
+        self.post_ms = post_ms
+
+    def classify_batch(self, texts):
+        time.sleep((self.batch_ms + self.post_ms * len(texts)) / 1000)
+        results = []
+        for text in texts:
+            lowered = text.lower()
+            if any(word in lowered for word in POSITIVE_WORDS):
+                label, emotion = "positive", "joy"
+            elif any(word in lowered for word in NEGATIVE_WORDS):
+                label, emotion = "negative", "anger"
+            else:
+                label, emotion = "neutral", "neutral"
+            results.append({"sentiment_label": label, "confidence_score": 0.9, "model_name": "stub",
+                            "emotion": emotion})
+        return results
+
+
+class BenchClient:
+    """WebSocket stand-in; the first one records ingest-to-delivery latency per post"""
+    def __init__(self, sent=None):
+        self.sent = sent
+        self.received = 0
+        self.deliveries = [] # (delivered at, latency seconds)
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, payload):
+        self.received += 1
+        if self.sent is None:
+            return
+        message = json.loads(payload)
+        if message.get("type") != "new_post":
+            return
+        sent_at = self.sent.get(message["data"]["post_id"])
+        if sent_at is not None:
+            now = time.perf_counter()
+            self.deliveries.append((now, now - sent_at))
+
+    async def close(self):
+        pass
+
+
+def rss_mb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * resource.getpagesize() / 1e6
+
+
+def percentiles(values_ms):
+    if not values_ms:
+        return {}
+    p50, p90, p95, p99 = np.percentile(values_ms, [50, 90, 95, 99])
+    return {"p50": round(p50, 3), "p90": round(p90, 3), "p95": round(p95, 3), "p99": round(p99, 3),
+            "max": round(max(values_ms), 3), "count": len(values_ms)}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def make_ingester(DataIngester, server, stream_name, sent):
+    """DataIngester on the fake server that notes when each post was published"""
+    import fakeredis
+
+    class TimedIngester(DataIngester):
+        def publish_batch(self, posts):
+            now = time.perf_counter()
+            for post in posts:
+                sent[post['post_id']] = now
+            return super().publish_batch(posts)
+
+    return TimedIngester(None, None, stream_name, redis_client=fakeredis.FakeRedis(server=server, decode_responses=True))
+
+
+def worker_loop(worker, stop):
+    while not stop.is_set():
+        worker.consume_once()
+
+
+async def probe_api(app, interval, stop, latencies):
+    """Query the read endpoints over ASGI while the pipeline is loaded"""
+    import httpx
+
+    paths = ["/api/posts?limit=50", "/api/sentiment/distribution?hours=1", "/api/health"]
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        while not stop.is_set():
+            for path in paths:
+                start = time.perf_counter()
+                response = await client.get(path)
+                elapsed = (time.perf_counter() - start) * 1000
+                key = path.split("?")[0]
+                latencies.setdefault(key, []).append(elapsed)
+                if response.status_code != 200:
+                    latencies.setdefault(f"{key} errors", []).append(response.status_code)
+            await asyncio.sleep(interval)
+
+
+async def run(args):
+    import fakeredis
+    from fakeredis import aioredis as fake_aioredis
+
+    # Imported here: DATABASE_URL and the stream name must be set first
+    from app.models import database
+    from app.main import app, redis_subscriber
+    from app.api.websocket import manager
+    from worker.worker import SentimentWorker
+    from ingester.ingester import DataIngester, make_profile
+    logging.getLogger().setLevel(logging.WARNING) # Per-batch/per-client INFO logs would dominate the run
+
+    server = fakeredis.FakeServer()
+    database._async_redis = fake_aioredis.FakeRedis(server=server) # Used by /api/health
+    stream_name = os.environ["REDIS_STREAM_NAME"]
+
+    sent = {}
+    probe = BenchClient(sent)
+    clients = [probe] + [BenchClient() for _ in range(args.clients - 1)]
+    for client in clients:
+        await manager.connect(client)
+    subscriber = asyncio.create_task(
+        redis_subscriber(lambda: fake_aioredis.FakeRedis(server=server, decode_responses=True)))
+    await asyncio.sleep(0.1) # Let it subscribe before anything is published
+
+    if args.model == "stub":
+        analyzer = StubAnalyzer(args.stub_batch_ms, args.stub_post_ms)
+    else:
+        from app.services.sentiment_analyzer import SentimentAnalyzer
+        analyzer = SentimentAnalyzer(model_type=args.model)
+        analyzer.warm_up() # Model loading is not part of the measurement
+
+    workers = []
+    for i in range(args.workers):
+        worker = SentimentWorker(redis_client=fakeredis.FakeRedis(server=server, decode_responses=True),
+                                 analyzer=analyzer)
+        worker.consumer_name = f"bench_{i}"
+        worker.batch_size = args.batch_size
+        workers.append(worker)
+
+    stop = threading.Event()
+    threads = [threading.Thread(target=worker_loop, args=(worker, stop), daemon=True) for worker in workers]
+    ingester = make_ingester(DataIngester, server, stream_name, sent)
+
+    rss_start = rss_mb()
+    rss_peak = rss_start
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    ingest = asyncio.get_running_loop().run_in_executor(
+        None, ingester.run_load, make_profile("constant", args.rate), args.ingest_batch, args.duration, 3600)
+    api_stop = asyncio.Event()
+    api_latencies = {}
+    prober = asyncio.create_task(probe_api(app, args.api_interval, api_stop, api_latencies))
+
+    while not ingest.done():
+        rss_peak = max(rss_peak, rss_mb())
+        await asyncio.sleep(0.5)
+    published = await ingest
+    ingest_done = time.perf_counter()
+    api_stop.set()
+    await prober
+
+    # Let the workers catch up, so the backlog shows up as drain time rather than lost posts
+    while probe.received < published and time.perf_counter() - ingest_done < args.drain_timeout:
+        rss_peak = max(rss_peak, rss_mb())
+        await asyncio.sleep(0.05)
+    drain_seconds = time.perf_counter() - ingest_done
+    stop.set()
+    for thread in threads:
+        thread.join(timeout=5)
+    subscriber.cancel()
+    websocket = manager.metrics()
+    for client in clients:
+        manager.disconnect(client)
+
+    window_start, window_end = started + args.warmup, started + args.duration
+    in_window = [latency for delivered, latency in probe.deliveries if window_start <= delivered <= window_end]
+    delivered = len(probe.deliveries)
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.utcnow().isoformat(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "published": published,
+        "delivered": delivered,
+        "lost": published - delivered,
+        "ingest_posts_per_sec": round(published / args.duration, 1),
+        "sustained_posts_per_sec": round(len(in_window) / max(args.duration - args.warmup, 1e-9), 1),
+        "drain_seconds": round(drain_seconds, 3),
+        "latency_ms": percentiles([latency * 1000 for latency in in_window]),
+        "api_latency_ms": {path: percentiles(values) for path, values in api_latencies.items()
+                           if not path.endswith("errors")},
+        "api_errors": {path: len(values) for path, values in api_latencies.items() if path.endswith("errors")},
+        "frames_per_client": min(client.received for client in clients),
+        "websocket_dropped": websocket["dropped_messages"],
+        "memory_mb": {"rss_start": round(rss_start, 1), "rss_peak": round(rss_peak, 1), "rss_end": round(rss_mb(), 1),
+                      "max_rss": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3, 1)},
+    }
+
+
+# Metrics compared with --compare, and whether higher is better
+COMPARED = [
+    ("sustained_posts_per_sec", True),
+    ("drain_seconds", False),
+    ("latency_ms.p50", False),
+    ("latency_ms.p95", False),
+    ("latency_ms.p99", False),
+    ("memory_mb.rss_peak", False),
+]
+
+
+def lookup(result, path):
+    for part in path.split("."):
+        result = (result or {}).get(part)
+    return result
+
+
+def print_report(result, previous=None):
+    latency = result["latency_ms"]
+    print(f"published {result['published']} posts at {result['ingest_posts_per_sec']}/s, "
+          f"delivered {result['delivered']} ({result['lost']} missing, {result['websocket_dropped']} frames dropped "
+          f"by the WebSocket overflow policy), drained {result['drain_seconds']}s "
+          "after ingestion stopped")
+    print(f"sustained throughput: {result['sustained_posts_per_sec']} posts/s")
+    if latency:
+        print(f"ingest -> client latency: p50 {latency['p50']:.1f} ms, p95 {latency['p95']:.1f} ms, "
+              f"p99 {latency['p99']:.1f} ms, max {latency['max']:.1f} ms")
+    for path, stats in result["api_latency_ms"].items():
+        print(f"GET {path}: p50 {stats['p50']:.1f} ms, p95 {stats['p95']:.1f} ms ({stats['count']} requests)")
+    if result["api_errors"]:
+        print(f"API errors: {result['api_errors']}")
+    memory = result["memory_mb"]
+    print(f"memory: RSS {memory['rss_start']} -> peak {memory['rss_peak']} MB (max RSS {memory['max_rss']} MB)")
+
+    if previous:
+        print(f"\ncompared with {previous.get('commit')} ({previous.get('timestamp')}):")
+        for path, higher_is_better in COMPARED:
+            old, new = lookup(previous, path), lookup(result, path)
+            if old is None or new is None:
+                continue
+            change = (new - old) / old if old else 0.0
+            worse = change < 0 if higher_is_better else change > 0
+            flag = " (worse)" if worse and abs(change) > 0.1 else ""
+            print(f"  {path:<26} {old:>10} -> {new:<10} {change:+.1%}{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rate", type=float, default=200, help="Ingest rate, posts/sec")
+    parser.add_argument("--duration", type=float, default=20, help="Seconds of ingestion")
+    parser.add_argument("--warmup", type=float, default=2, help="Seconds excluded from the measurements")
+    parser.add_argument("--workers", type=int, default=1, help="SentimentWorker threads")
+    parser.add_argument("--batch-size", type=int, default=32, help="Worker micro-batch size")
+    parser.add_argument("--ingest-batch", type=int, default=100, help="Posts per ingester pipeline")
+    parser.add_argument("--clients", type=int, default=100, help="Simulated WebSocket clients")
+    parser.add_argument("--ws-queue", type=int, default=10000,
+                        help="Per-client WebSocket queue (small queues drop frames once the loop falls behind)")
+    parser.add_argument("--api-interval", type=float, default=0.2, help="Seconds between API probes")
+    parser.add_argument("--model", default="stub", help="'stub' or a MODEL_BACKEND (local, quantized, onnx)")
+    parser.add_argument("--stub-batch-ms", type=float, default=5.0, help="Stub model cost per batch")
+    parser.add_argument("--stub-post-ms", type=float, default=0.5, help="Stub model cost per post")
+    parser.add_argument("--database-url", help="Default: a throwaway SQLite file")
+    parser.add_argument("--drain-timeout", type=float, default=60, help="Max seconds to wait for the backlog")
+    parser.add_argument("--output", help="Result JSON (default: benchmarks/results/pipeline_<commit>_<time>.json)")
+    parser.add_argument("--compare", help="Earlier result JSON to compare against")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{tmp}/pipeline.db"
+        os.environ["REDIS_STREAM_NAME"] = f"bench_stream_{uuid.uuid4().hex[:8]}"
+        os.environ["WS_CLIENT_QUEUE_SIZE"] = str(args.ws_queue)
+        result = asyncio.run(run(args))
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+    print_report(result, previous)
+
+    output = args.output or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "results",
+        f"pipeline_{result['commit'] or 'unknown'}_{datetime.utcnow():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"\nresults written to {output}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
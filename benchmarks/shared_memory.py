@@ -0,0 +1,101 @@
+# benchmarks/shared_memory.py
+"""
+Memory per inference process with and without shared model weights.
+
+For every process count (default 1, 4 and 8) and both modes (MODEL_SHARED_WEIGHTS
+off = private copy per process, on = mapped shared weights) it starts that many
+processes. Each one loads and warms up SentimentAnalyzer('local'), then the script
+reads their RSS and PSS from /proc/<pid>/smaps_rollup. PSS splits shared pages
+between the processes that map them, so PSS per worker is what each extra worker
+really costs. Needs the models, no Redis/Postgres (Linux only):
+
+    docker-compose run --rm worker python benchmarks/shared_memory.py --processes 1 4 8
+"""
+import argparse
+import json
+import multiprocessing
+import os
+
+
+def _serve(shared, ready, stop):
+    os.environ["MODEL_SHARED_WEIGHTS"] = "true" if shared else "false"
+    os.environ["INFERENCE_CACHE_SIZE"] = "0"
+    import torch
+    torch.set_num_threads(1)
+
+    from app.services.sentiment_analyzer import SentimentAnalyzer
+    analyzer = SentimentAnalyzer(model_type="local")
+    analyzer.warm_up()
+    ready.set()
+    stop.wait()
+
+
+def memory_mb(pid):
+    """(RSS, PSS) of a process in MB"""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ("Rss:", "Pss:"):
+                values[parts[0][:-1]] = int(parts[1]) / 1024
+    return values["Rss"], values["Pss"]
+
+
+def measure(shared, processes):
+    context = multiprocessing.get_context("spawn") # Like the inference pool
+    stop = context.Event()
+    workers = []
+    for _ in range(processes):
+        ready = context.Event()
+        process = context.Process(target=_serve, args=(shared, ready, stop), daemon=True)
+        process.start()
+        workers.append((process, ready))
+    for process, ready in workers:
+        ready.wait()
+
+    samples = [memory_mb(process.pid) for process, _ in workers]
+    stop.set()
+    for process, _ in workers:
+        process.join()
+    rss = sum(s[0] for s in samples) / processes
+    pss = sum(s[1] for s in samples) / processes
+    return {"shared": shared, "processes": processes, "rss_per_worker_mb": round(rss, 1),
+            "pss_per_worker_mb": round(pss, 1), "pss_total_mb": round(pss * processes, 1)}
+
+
+def weights_mb():
+    """Size of both models' weights: one full copy"""
+    from app.services.sentiment_analyzer import SentimentAnalyzer
+    from app.services.shared_weights import WEIGHTS_FILE, export_model
+
+    analyzer = SentimentAnalyzer(model_type="local")
+    total = 0
+    for model_name in (analyzer.sentiment_model_name, analyzer.emotion_model_name):
+        total += os.path.getsize(os.path.join(export_model(model_name), WEIGHTS_FILE))
+    return total / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--output", help="Also write the results as JSON")
+    args = parser.parse_args()
+
+    model_mb = weights_mb() # Also exports the shared files before any process starts
+    print(f"model weights (both models): {model_mb:.0f} MB")
+    print(f"{'mode':>8} | {'processes':>9} | {'RSS/worker MB':>13} | {'PSS/worker MB':>13} | {'PSS total MB':>12}")
+    results = []
+    for processes in args.processes:
+        for shared in (False, True):
+            result = measure(shared, processes)
+            results.append(result)
+            print(f"{'shared' if shared else 'copy':>8} | {processes:>9} | {result['rss_per_worker_mb']:>13} | "
+                  f"{result['pss_per_worker_mb']:>13} | {result['pss_total_mb']:>12}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"model_weights_mb": round(model_mb, 1), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
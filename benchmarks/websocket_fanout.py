@@ -0,0 +1,95 @@
+# benchmarks/websocket_fanout.py
+"""
+WebSocket fan-out load test: thousands of simulated clients on one ConnectionManager.
+
+Clients are in-process fakes with a configurable send latency; a share of them are
+slow (--slow-ms) and a share are dead (every send fails). Reports how long
+broadcast() takes, how long until every healthy client has every frame, and the
+manager's queue/drop/eviction metrics. Needs no Redis/Postgres:
+
+    docker-compose run --rm backend python benchmarks/websocket_fanout.py --clients 5000
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from app.api.websocket import ConnectionManager
+
+
+class SimulatedClient:
+    def __init__(self, latency, dead=False):
+        self.latency = latency
+        self.dead = dead
+        self.received = 0
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, payload):
+        if self.dead:
+            raise ConnectionResetError("simulated dead client")
+        await asyncio.sleep(self.latency)
+        self.received += 1
+
+    async def close(self):
+        pass
+
+
+async def main(args):
+    manager = ConnectionManager(max_queue=args.queue, overflow_policy=args.policy)
+
+    clients = []
+    for _ in range(args.clients):
+        roll = random.random()
+        if roll < args.dead_share:
+            client = SimulatedClient(0, dead=True)
+        elif roll < args.dead_share + args.slow_share:
+            client = SimulatedClient(args.slow_ms / 1000)
+        else:
+            client = SimulatedClient(args.fast_ms / 1000)
+        clients.append(client)
+        await manager.connect(client)
+
+    message = {"type": "new_post", "data": {"post_id": "x" * 36, "content": "y" * 100, "source": "twitter",
+                                             "sentiment_label": "positive", "confidence_score": 0.98, "emotion": "joy"}}
+
+    broadcast_times = []
+    start = time.perf_counter()
+    for _ in range(args.messages):
+        t0 = time.perf_counter()
+        await manager.broadcast(message)
+        broadcast_times.append((time.perf_counter() - t0) * 1000)
+        await asyncio.sleep(args.interval_ms / 1000)
+
+    fast = [c for c in clients if not c.dead and c.latency == args.fast_ms / 1000]
+    while any(c.received < args.messages for c in fast):
+        await asyncio.sleep(0.01)
+    delivered_s = time.perf_counter() - start
+
+    broadcast_times.sort()
+    print(f"clients: {args.clients} ({len(fast)} fast, policy={args.policy}, queue={args.queue})")
+    print(f"broadcast(): p50 {broadcast_times[len(broadcast_times) // 2]:.2f} ms, "
+          f"max {broadcast_times[-1]:.2f} ms")
+    print(f"all fast clients had all {args.messages} frames after {delivered_s:.2f} s")
+    print(f"metrics: {manager.metrics()}")
+
+    # Stop every sender (slow clients may still be mid-send) before the loop closes
+    senders = [client.sender_task for client in manager.clients.values() if client.sender_task]
+    for client in list(manager.clients):
+        manager.disconnect(client)
+    await asyncio.gather(*senders, return_exceptions=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=5000)
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--interval-ms", type=float, default=5)
+    parser.add_argument("--fast-ms", type=float, default=1)
+    parser.add_argument("--slow-ms", type=float, default=200)
+    parser.add_argument("--slow-share", type=float, default=0.05)
+    parser.add_argument("--dead-share", type=float, default=0.02)
+    parser.add_argument("--queue", type=int, default=100)
+    parser.add_argument("--policy", default="drop_oldest")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,78 @@
+# benchmarks/worker_batch.py
+"""
+Worker throughput benchmark: posts/sec for different micro-batch sizes, plus the
+per-stage latency (read, inference, db, publish, ack) per post.
+
+Runs the real SentimentWorker (models, Postgres, Redis) against a throwaway stream,
+so run it inside the compose stack:
+
+    docker-compose run --rm worker python benchmarks/worker_batch.py --posts 512
+
+Add --processes N to run inference in N processes (WORKER_INFERENCE_PROCESSES).
+
+Note: benchmark posts are written to the database and published on
+'sentiment_updates' like real traffic (their source is 'benchmark').
+"""
+import argparse
+import os
+import time
+import uuid
+
+from worker.worker import SentimentWorker
+from ingester.ingester import DataIngester
+
+
+def run(worker, batch_size, n_posts):
+    """Push n_posts into a fresh stream and time how long the worker takes to drain it.
+    Returns (posts/sec, {stage: total ms})."""
+    worker.stream_name = f"bench_stream_{uuid.uuid4().hex[:8]}"
+    worker.batch_size = batch_size
+    worker._create_consumer_group()
+
+    generator = DataIngester.__new__(DataIngester) # Only need generate_post, no Redis client
+    pipe = worker.redis.pipeline(transaction=False)
+    for _ in range(n_posts):
+        post = generator.generate_post()
+        post['source'] = 'benchmark'
+        pipe.xadd(worker.stream_name, post)
+    pipe.execute()
+
+    processed = 0
+    stage_totals = {}
+    start = time.perf_counter()
+    while processed < n_posts:
+        processed += worker.consume_once()
+        for stage, ms in worker.stage_timings.items():
+            stage_totals[stage] = stage_totals.get(stage, 0.0) + ms
+    elapsed = time.perf_counter() - start
+
+    worker.redis.delete(worker.stream_name)
+    return processed / elapsed, stage_totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--posts", type=int, default=512, help="Posts per batch-size run")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32, 128])
+    parser.add_argument("--processes", type=int, default=1, help="Inference processes")
+    args = parser.parse_args()
+
+    os.environ["WORKER_INFERENCE_PROCESSES"] = str(args.processes)
+    # Generated posts repeat a lot; with the inference cache on, most runs would be cache hits
+    os.environ["INFERENCE_CACHE_SIZE"] = "0"
+    os.environ["INFERENCE_CACHE_REDIS"] = "false"
+    worker = SentimentWorker()
+
+    # Warm-up so the first run doesn't pay for lazy allocations
+    run(worker, max(args.batch_sizes), min(args.posts, 32))
+
+    stages = ['read', 'inference', 'db', 'publish', 'ack']
+    print(f"{'batch_size':>10} | {'posts/sec':>10} | " + " | ".join(f"{s + ' ms/post':>17}" for s in stages))
+    for batch_size in args.batch_sizes:
+        rate, stage_totals = run(worker, batch_size, args.posts)
+        per_post = " | ".join(f"{stage_totals.get(s, 0.0) / args.posts:>17.3f}" for s in stages)
+        print(f"{batch_size:>10} | {rate:>10.1f} | {per_post}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,117 @@
 # ingester/ingester.py
 import os
+import math
 import time
 import random
 import uuid
 import json
 import redis
+import argparse
 from datetime import datetime
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+
+PROFILES = ("constant", "ramp", "spike", "diurnal")
+
+# Served on INGEST_METRICS_PORT (see __main__)
+POSTS = Counter("ingester_posts_total", "Generated posts by outcome", ["outcome"]) # published, shed, failed
+TARGET_RATE = Gauge("ingester_target_rate", "Current target posts/sec (after backpressure)")
+PUBLISH_SECONDS = Histogram("ingester_publish_seconds", "Time per pipelined XADD batch",
+                            buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1))
+
+def make_profile(name, rate, peak_rate=None, period=60.0):
+    """
+    Target posts/sec as a function of seconds since start:
+      - constant: rate
+      - ramp:     rate -> peak_rate linearly over period, then stays at peak_rate
+      - spike:    peak_rate for the first 10% of every period, rate otherwise
+      - diurnal:  smooth wave between rate and peak_rate, one cycle per period
+    """
+    if name not in PROFILES:
+        raise ValueError(f"profile must be one of {PROFILES}")
+    peak_rate = rate if peak_rate is None else peak_rate
+    if name == "ramp":
+        return lambda t: rate + (peak_rate - rate) * min(1.0, t / period)
+    if name == "spike":
+        return lambda t: peak_rate if (t % period) < period * 0.1 else rate
+    if name == "diurnal":
+        return lambda t: rate + (peak_rate - rate) * (1 - math.cos(2 * math.pi * t / period)) / 2
+    return lambda t: rate
+
+class TokenBucket:
+    """
+    Rate limiter that refills by the time that actually passed, so sleep overshoot and
+    slow sends are made up on the next call instead of dragging the real rate below
+    the target. burst caps how much can be made up at once; with burst_seconds it grows
+    to that many seconds' worth of the current rate, so a stall at high rates (GC pause,
+    slow round trip) is made up too instead of thrown away.
+    """
+    def __init__(self, rate_fn, burst, burst_seconds=0.0):
+        self.rate_fn = rate_fn
+        self.burst = burst
+        self.burst_seconds = burst_seconds
+        self.tokens = 0.0
+        self.start = self.last = time.monotonic()
+
+    def rate(self):
+        return self.rate_fn(time.monotonic() - self.start)
+
+    def take(self, wanted, minimum=1):
+        """Grant up to `wanted` tokens without waiting, or none if fewer than `minimum` are due"""
+        now = time.monotonic()
+        rate = self.rate_fn(now - self.start) # Re-evaluated every call, so ramps resize the burst
+        self.tokens = min(max(self.burst, rate * self.burst_seconds), self.tokens + rate * (now - self.last))
+        self.last = now
+        if self.tokens < minimum:
+            return 0
+        granted = min(wanted, int(self.tokens))
+        self.tokens -= granted
+        return granted
+
+    def wait_time(self, minimum=1):
+        """Seconds until `minimum` tokens are due"""
+        rate = self.rate()
+        return max(0.0, (minimum - self.tokens) / rate) if rate > 0 else 0.1
+
+class Backpressure:
+    """
+    Follows the lag monitor's verdict for the stream (the backend publishes it under
+    backpressure:<stream>): 'throttle' scales the rate by throttle_factor, 'shed' drops
+    the posts that would have been sent. No verdict (monitor down) means 'ok'.
+    """
+    def __init__(self, redis_client, stream_name, throttle_factor=0.25, check_every=1.0):
+        self.redis_client = redis_client
+        self.key = f"backpressure:{stream_name}"
+        self.throttle_factor = throttle_factor
+        self.check_every = check_every
+        self.level = "ok"
+        self.checked = None
+
+    def current(self):
+        now = time.monotonic()
+        if self.checked is None or now - self.checked >= self.check_every:
+            self.checked = now
+            try:
+                raw = self.redis_client.get(self.key)
+                level = json.loads(raw).get("backpressure", "ok") if raw else "ok"
+            except (redis.RedisError, ValueError):
+                level = "ok"
+            if level != self.level:
+                print(f"Backpressure: {level}")
+            self.level = level
+        return self.level
+
+    def scale(self):
+        return self.throttle_factor if self.current() == "throttle" else 1.0
 
 class DataIngester:
-    def __init__(self, redis_host, redis_port, stream_name, posts_per_minute=60):
-        self.redis_client = redis.Redis(host=redis_host, port=redis_port, decode_responses=True)
+    def __init__(self, redis_host, redis_port, stream_name, posts_per_minute=60, max_len=None, backpressure=False,
+                 redis_client=None):
+        self.redis_client = redis_client or redis.Redis(host=redis_host, port=redis_port, decode_responses=True)
         self.stream_name = stream_name
         self.posts_per_minute = posts_per_minute
+        self.max_len = max_len or None # Trim the stream to ~max_len entries (None = never)
+        # Slow down / shed load when the workers fall behind (needs the backend's lag monitor)
+        self.backpressure = Backpressure(self.redis_client, stream_name) if backpressure else None
         print(f"Ingester initialized. Target: {posts_per_minute} posts/min")
 
     def generate_post(self):
@@ -45,33 +145,105 @@ class DataIngester:
     def publish_post(self, post_data):
         try:
             # XADD adds to the stream
-            self.redis_client.xadd(self.stream_name, post_data)
+            self.redis_client.xadd(self.stream_name, post_data, maxlen=self.max_len, approximate=True)
             return True
         except redis.RedisError as e:
             print(f"Error publishing to Redis: {e}")
             return False
 
-    def start(self):
+    def publish_batch(self, posts):
+        """XADD many posts in one round trip; returns how many were published"""
+        try:
+            with PUBLISH_SECONDS.time():
+                pipe = self.redis_client.pipeline(transaction=False)
+                for post in posts:
+                    pipe.xadd(self.stream_name, post, maxlen=self.max_len, approximate=True)
+                pipe.execute()
+            POSTS.labels("published").inc(len(posts))
+            return len(posts)
+        except redis.RedisError as e:
+            print(f"Error publishing to Redis: {e}")
+            POSTS.labels("failed").inc(len(posts))
+            return 0
+
+    def run_load(self, rate_fn, batch_size=100, duration=None, report_every=10.0):
+        """
+        Publish generated posts at rate_fn(t) posts/sec, batch_size per pipeline at most,
+        for `duration` seconds (None = forever). Prints a summary every report_every seconds.
+        Returns the number of posts published.
+        """
+        backpressure = self.backpressure
+        if backpressure:
+            target_fn = rate_fn
+            rate_fn = lambda t: target_fn(t) * backpressure.scale()
+        # Room for several batches (or 100ms at the current rate) so stalls are made up
+        bucket = TokenBucket(rate_fn, burst=max(batch_size * 4, 1), burst_seconds=0.1)
+        started = last_report = time.monotonic()
+        published = reported = shed = 0
+        while duration is None or time.monotonic() - started < duration:
+            # Send ~10ms worth of posts per round trip rather than one post per token
+            minimum = max(1, min(batch_size, int(bucket.rate() * 0.01)))
+            count = bucket.take(batch_size, minimum)
+            if not count:
+                time.sleep(min(bucket.wait_time(minimum), 0.1))
+                continue
+            if backpressure and backpressure.current() == "shed":
+                shed += count
+                POSTS.labels("shed").inc(count)
+            else:
+                published += self.publish_batch([self.generate_post() for _ in range(count)])
+
+            now = time.monotonic()
+            TARGET_RATE.set(bucket.rate())
+            if now - last_report >= report_every:
+                shed_info = f", {shed} shed" if shed else ""
+                print(f"Published {published} posts: {(published - reported) / (now - last_report):.0f}/s "
+                      f"(target {bucket.rate():.0f}/s{shed_info})")
+                last_report, reported = now, published
+        return published
+
+    def start(self, profile="constant", rate=None, peak_rate=None, period=60.0, batch_size=100, duration=None):
         print(f"Starting ingestion to stream: {self.stream_name}")
-        while True:
-            post = self.generate_post()
-            success = self.publish_post(post)
-            
-            if success:
-                print(f"Published: {post['content'][:30]}...")
-            
-            # Rate limiting logic
-            sleep_time = 60.0 / self.posts_per_minute
-            time.sleep(sleep_time)
+        rate = self.posts_per_minute / 60.0 if rate is None else rate
+        return self.run_load(make_profile(profile, rate, peak_rate, period), batch_size, duration)
 
 if __name__ == "__main__":
-    # Load config from env
+    # Load config from env; command-line flags override it (e.g. for soak tests)
+    parser = argparse.ArgumentParser(description="Publish generated posts to the Redis stream")
+    parser.add_argument("--profile", choices=PROFILES, default=os.getenv("INGEST_PROFILE", "constant"))
+    parser.add_argument("--rate", type=float, default=float(os.getenv("INGEST_RATE", 1)), help="Posts/sec")
+    parser.add_argument("--peak-rate", type=float, default=float(os.getenv("INGEST_PEAK_RATE", 0)) or None,
+                        help="Posts/sec at the top of a ramp/spike/diurnal profile")
+    parser.add_argument("--period", type=float, default=float(os.getenv("INGEST_PERIOD_SECONDS", 60)),
+                        help="Ramp length or spike/diurnal cycle in seconds")
+    parser.add_argument("--batch-size", type=int, default=int(os.getenv("INGEST_BATCH_SIZE", 100)))
+    parser.add_argument("--max-len", type=int, default=int(os.getenv("STREAM_MAXLEN", 0)),
+                        help="Trim the stream to about this many entries (0 = no trim)")
+    parser.add_argument("--duration", type=float, default=None, help="Stop after this many seconds")
+    parser.add_argument("--backpressure", action="store_true",
+                        default=os.getenv("INGEST_BACKPRESSURE", "false").lower() == "true",
+                        help="Throttle/shed when the workers fall behind")
+    args = parser.parse_args()
+
     REDIS_HOST = os.getenv("REDIS_HOST", "redis")
     REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
     STREAM_NAME = os.getenv("REDIS_STREAM_NAME", "social_posts_stream")
     
-    ingester = DataIngester(REDIS_HOST, REDIS_PORT, STREAM_NAME)
+    ingester = DataIngester(REDIS_HOST, REDIS_PORT, STREAM_NAME, posts_per_minute=args.rate * 60, max_len=args.max_len,
+                            backpressure=args.backpressure)
     
-    # Wait for Redis to be ready
-    time.sleep(5) 
-    ingester.start()
\ No newline at end of file
+    metrics_port = int(os.getenv("INGEST_METRICS_PORT", 9101))
+    if metrics_port:
+        start_http_server(metrics_port)
+
+    # Wait for Redis to be ready, backing off up to 5s between attempts
+    delay = 0.1
+    while True:
+        try:
+            ingester.redis_client.ping()
+            break
+        except redis.RedisError as e:
+            print(f"Redis not ready ({e}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+            delay = min(delay * 2, 5.0)
+    ingester.start(args.profile, args.rate, args.peak_rate, args.period, args.batch_size, args.duration)
\ No newline at end of file
@@ -0,0 +1,218 @@
+# ingester/replay.py
+"""
+Replay historical posts from a JSONL or CSV file into the Redis stream.
+
+Records need a `content` field; `post_id`, `source`, `author` and `created_at` are
+used when present. created_at may be ISO-8601 or epoch seconds and is converted to
+naive UTC; records without a usable one are stamped with the replay time, and those
+whose created_at could not be parsed are counted (`retimed`) and shown in the report.
+Missing post_ids are derived from the file name and byte offset, so replaying the
+same file twice doesn't create duplicates. The file is read line by line, so memory
+stays constant whatever its size. CSV rows may not span several lines.
+
+    python replay.py posts.jsonl --speed 0            # as fast as possible
+    python replay.py posts.csv --speed 60 --resume    # 60x real time, continue from the checkpoint
+"""
+import os
+import csv
+import json
+import time
+import uuid
+import redis
+import argparse
+from datetime import datetime, timezone
+
+FORMATS = ("jsonl", "csv")
+
+def parse_timestamp(value):
+    """ISO-8601 string or epoch seconds -> naive UTC datetime (None if unparsable)"""
+    if value in (None, ""):
+        return None
+    try:
+        return datetime.utcfromtimestamp(float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if parsed.tzinfo:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+class FileReplayer:
+    """
+    Publishes the records of one file to the stream, in pipelined batches.
+
+    speed is a multiple of real time based on the records' created_at gaps (0 = as
+    fast as possible). The byte offset after the last published batch is written to
+    checkpoint_path about once a second, so an interrupted replay can resume.
+    """
+    def __init__(self, redis_client, stream_name, path, file_format=None, speed=0.0, batch_size=500,
+                 checkpoint_path=None, max_len=None, report_every=5.0):
+        self.redis_client = redis_client
+        self.stream_name = stream_name
+        self.path = path
+        self.file_format = file_format or ("csv" if path.lower().endswith(".csv") else "jsonl")
+        if self.file_format not in FORMATS:
+            raise ValueError(f"format must be one of {FORMATS}")
+        self.speed = speed
+        self.batch_size = batch_size
+        self.checkpoint_path = checkpoint_path or f"{path}.checkpoint"
+        self.max_len = max_len or None
+        self.report_every = report_every
+        self.size = os.path.getsize(path)
+
+        self.offset = 0 # Byte offset just past the last record read
+        self.published = 0
+        self.skipped = 0
+        self.retimed = 0 # Unparsable created_at replaced by the replay time
+
+    def read_checkpoint(self):
+        try:
+            with open(self.checkpoint_path) as f:
+                return int(f.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def write_checkpoint(self, offset):
+        tmp = f"{self.checkpoint_path}.tmp"
+        with open(tmp, "w") as f:
+            f.write(str(offset))
+        os.replace(tmp, self.checkpoint_path) # Atomic: never leaves a half-written checkpoint
+
+    def _lines(self, f):
+        """Decoded lines, advancing self.offset by each line's byte length"""
+        for raw in f:
+            self.offset += len(raw)
+            yield raw.decode("utf-8")
+
+    def records(self, start_offset=0):
+        """Yield (record, offset after it) from start_offset on"""
+        with open(self.path, "rb") as f:
+            if self.file_format == "csv":
+                header = next(csv.reader([f.readline().decode("utf-8")]), None)
+                if not header:
+                    return # Empty file
+                start_offset = max(start_offset, f.tell())
+            f.seek(start_offset)
+            self.offset = start_offset
+
+            if self.file_format == "csv":
+                for row in csv.reader(self._lines(f)):
+                    if row:
+                        yield dict(zip(header, row)), self.offset
+                return
+
+            for line in self._lines(f):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    self.skipped += 1
+                    continue
+                if not isinstance(record, dict):
+                    print(f"Warning: skipping non-object JSON record ending at byte {self.offset}")
+                    self.skipped += 1
+                    continue
+                yield record, self.offset
+
+    def to_post(self, record, offset):
+        """Stream entry for one record (None if it has no content)"""
+        if not record.get("content"):
+            return None
+        created_at = parse_timestamp(record.get("created_at"))
+        if created_at is None and record.get("created_at") not in (None, ""):
+            self.retimed += 1
+        post_id = record.get("post_id") or record.get("id") or \
+            str(uuid.uuid5(uuid.NAMESPACE_URL, f"{os.path.abspath(self.path)}:{offset}"))
+        return {
+            'post_id': str(post_id),
+            'source': record.get("source") or "replay",
+            'content': record["content"],
+            'author': record.get("author") or "unknown",
+            'created_at': (created_at or datetime.utcnow()).isoformat(),
+        }, created_at
+
+    def publish(self, posts):
+        pipe = self.redis_client.pipeline(transaction=False)
+        for post in posts:
+            pipe.xadd(self.stream_name, post, maxlen=self.max_len, approximate=True)
+        pipe.execute()
+
+    def run(self, resume=False):
+        """Replay the file (from the checkpoint if resume); returns the number of posts published"""
+        start_offset = self.read_checkpoint() if resume else 0
+        started = last_report = last_checkpoint = time.monotonic()
+        first_event = None
+        batch, batch_offset = [], start_offset
+
+        def flush():
+            nonlocal batch, last_checkpoint
+            if batch:
+                self.publish(batch)
+                self.published += len(batch)
+                batch = []
+            if time.monotonic() - last_checkpoint >= 1.0:
+                self.write_checkpoint(batch_offset)
+                last_checkpoint = time.monotonic()
+
+        for record, offset in self.records(start_offset):
+            converted = self.to_post(record, offset)
+            if converted is None:
+                self.skipped += 1
+                continue
+            post, created_at = converted
+
+            if self.speed > 0 and created_at:
+                # Hold the post until its place on the replay clock
+                if first_event is None:
+                    first_event = created_at
+                due = started + (created_at - first_event).total_seconds() / self.speed
+                delay = due - time.monotonic()
+                if delay > 0:
+                    flush()
+                    time.sleep(delay)
+
+            batch.append(post)
+            batch_offset = offset
+            if len(batch) >= self.batch_size:
+                flush()
+
+            now = time.monotonic()
+            if now - last_report >= self.report_every:
+                self.report(now - started, start_offset)
+                last_report = now
+
+        flush()
+        self.write_checkpoint(self.offset) # Everything read was published or skipped
+        self.report(time.monotonic() - started, start_offset)
+        return self.published
+
+    def report(self, elapsed, start_offset):
+        done = self.offset - start_offset
+        remaining = self.size - self.offset
+        rate = self.published / elapsed if elapsed else 0
+        mb_rate = done / elapsed / 1e6 if elapsed else 0
+        eta = f", ETA {remaining / (done / elapsed):.0f}s" if done and remaining else ""
+        retimed = f", {self.retimed} with unparsable created_at" if self.retimed else ""
+        print(f"Replayed {self.published} posts ({self.offset / max(self.size, 1):.1%} of file, "
+              f"{self.skipped} skipped{retimed}): {rate:.0f} posts/s, {mb_rate:.1f} MB/s{eta}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=FORMATS, help="Defaults to the file extension")
+    parser.add_argument("--speed", type=float, default=0, help="Multiple of real time (0 = as fast as possible)")
+    parser.add_argument("--batch-size", type=int, default=int(os.getenv("INGEST_BATCH_SIZE", 500)))
+    parser.add_argument("--max-len", type=int, default=int(os.getenv("STREAM_MAXLEN", 0)))
+    parser.add_argument("--checkpoint", help="Checkpoint file (default: <path>.checkpoint)")
+    parser.add_argument("--resume", action="store_true", help="Continue from the checkpoint")
+    args = parser.parse_args()
+
+    client = redis.Redis(host=os.getenv("REDIS_HOST", "redis"), port=int(os.getenv("REDIS_PORT", 6379)),
+                         decode_responses=True)
+    replayer = FileReplayer(client, os.getenv("REDIS_STREAM_NAME", "social_posts_stream"), args.path,
+                            args.format, args.speed, args.batch_size, args.checkpoint, args.max_len)
+    replayer.run(resume=args.resume)
@@ -0,0 +1,108 @@
+# worker/inference_pool.py
+import os
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+logger = logging.getLogger(__name__)
+
+# One analyzer per inference process (set by _init_process)
+_analyzer = None
+
+
+def _init_process(torch_threads):
+    """Runs once in every inference process: pin torch threads, then load the models."""
+    global _analyzer
+    # Pin intra-op threads so N processes don't oversubscribe the cores
+    os.environ["OMP_NUM_THREADS"] = str(torch_threads)
+    os.environ["MKL_NUM_THREADS"] = str(torch_threads)
+    import torch
+    torch.set_num_threads(torch_threads)
+
+    from app.services.sentiment_analyzer import SentimentAnalyzer
+    _analyzer = SentimentAnalyzer(model_type=os.getenv("MODEL_BACKEND", "local"))
+    _analyzer.warm_up()
+    logger.info(f"Inference process {os.getpid()} ready ({torch_threads} torch threads)")
+
+
+def _classify(texts):
+    return _analyzer.classify_batch(texts)
+
+
+def _ping():
+    return os.getpid()
+
+
+class InferencePool:
+    """
+    Runs SentimentAnalyzer.classify_batch in several processes, each with its own
+    pinned torch thread pool. With shared weights (the default for 'local') they all
+    map the same weight files instead of holding a model copy each. The worker's main
+    process keeps reading the stream and writing to the DB while batches are analyzed.
+    """
+
+    def __init__(self, processes: int, torch_threads: int = None):
+        self.processes = processes
+        self.torch_threads = torch_threads or max(1, (os.cpu_count() or 1) // processes)
+
+        # Export the shared model weights once here instead of racing in every process
+        from app.services.sentiment_analyzer import SentimentAnalyzer
+        SentimentAnalyzer(model_type=os.getenv("MODEL_BACKEND", "local")).export_shared_weights()
+
+        self._restart_lock = threading.Lock()
+        self.restarts = 0
+        self._executor = self._start()
+        logger.info(f"Started {processes} inference processes x {self.torch_threads} torch threads")
+
+    def _start(self):
+        # 'spawn' gives every process a clean torch runtime (fork + torch threads can deadlock)
+        return ProcessPoolExecutor(
+            max_workers=self.processes,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_process,
+            initargs=(self.torch_threads,)
+        )
+
+    def _restart(self, broken):
+        """
+        Replace a pool whose process died (OOM kill, segfault): every later call on it would
+        fail. The new processes run the initializer (load + warm up) again.
+        """
+        with self._restart_lock:
+            if self._executor is not broken:
+                return # Another caller already restarted it
+            logger.error("An inference process died; restarting the inference pool")
+            broken.shutdown(wait=False, cancel_futures=True)
+            self._executor = self._start()
+            self.restarts += 1
+
+    def submit(self, texts: list):
+        """Queue a batch for analysis. Returns a Future with the classify_batch results."""
+        executor = self._executor
+        try:
+            return executor.submit(_classify, texts)
+        except BrokenProcessPool:
+            self._restart(executor)
+            return self._executor.submit(_classify, texts)
+
+    def warm_up(self):
+        """Start the processes and wait until they have loaded and warmed up their models."""
+        for future in [self._executor.submit(_ping) for _ in range(self.processes)]:
+            future.result()
+
+    def classify_batch(self, texts: list) -> list:
+        """
+        Blocking call with the same contract as SentimentAnalyzer.classify_batch. If a
+        process dies during the batch the pool is restarted and the batch retried once.
+        """
+        executor = self._executor
+        try:
+            return self.submit(texts).result()
+        except BrokenProcessPool:
+            self._restart(executor)
+            return self._executor.submit(_classify, texts).result()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
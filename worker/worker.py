@@ -3,41 +3,88 @@ import time
 import json
 import redis
 import logging
+import tempfile
+from collections import deque
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
 
+# Inference processes record the inference and cache metrics, so with several of them
+# every process writes to one multiprocess directory (read before prometheus_client loads)
+if int(os.getenv("WORKER_INFERENCE_PROCESSES", 1)) > 1 and not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="worker_metrics_")
+
 # Import modules from the backend (mounted via Docker volume)
 # This allows us to reuse the AI logic and DB models without copying code!
 from app.services.sentiment_analyzer import SentimentAnalyzer
-from app.models.database import SessionLocal, SocialMediaPost, SentimentAnalysis, init_db
+from app.models.database import SessionLocal, engine, init_db, bulk_save_analyses, retry_with_backoff
+from app.metrics import WORKER_STAGE_SECONDS, WORKER_BATCH_SIZE, WORKER_MESSAGES, db_pools, start_metrics_server
+from worker.inference_pool import InferencePool
 
 # Configure Logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 class SentimentWorker:
-    def __init__(self):
+    def __init__(self, redis_client=None, analyzer=None):
+        """redis_client/analyzer replace the ones built from env (benchmarks use stand-ins)"""
         # 1. Setup Redis
         self.redis_host = os.getenv("REDIS_HOST", "redis")
         self.redis_port = int(os.getenv("REDIS_PORT", 6379))
         self.stream_name = os.getenv("REDIS_STREAM_NAME", "social_posts_stream")
         self.group_name = os.getenv("REDIS_CONSUMER_GROUP", "sentiment_workers")
-        self.consumer_name = f"worker_{os.uname().nodename}" # Unique ID for this container
+        # Unique per process, so several workers can share a container or host
+        self.consumer_name = os.getenv("WORKER_CONSUMER_NAME") or f"worker_{os.uname().nodename}_{os.getpid()}"
+
+        # Micro-batching: read up to WORKER_BATCH_SIZE entries, or whatever arrived
+        # within WORKER_BATCH_LINGER_MS of the first one, and process them together
+        self.batch_size = max(1, int(os.getenv("WORKER_BATCH_SIZE", 32)))
+        self.batch_linger_ms = int(os.getenv("WORKER_BATCH_LINGER_MS", 50))
+        # Per-stage latency of the most recent batch, in milliseconds
+        self.stage_timings = {}
+
+        # Multi-process inference: WORKER_INFERENCE_PROCESSES > 1 runs the models in that
+        # many child processes (WORKER_INFERENCE_THREADS torch threads each, default
+        # cores / processes) while this process reads the stream and writes to the DB
+        self.inference_processes = int(os.getenv("WORKER_INFERENCE_PROCESSES", 1))
+        self.inference_threads = int(os.getenv("WORKER_INFERENCE_THREADS", 0)) or None
+        self.pool = None
+        self.in_flight = deque()
 
-        self.redis = redis.Redis(host=self.redis_host, port=self.redis_port, decode_responses=True)
+        # Crash recovery: entries left pending for WORKER_CLAIM_IDLE_MS (a worker died, or
+        # processing failed) are claimed and retried every WORKER_RECLAIM_INTERVAL_MS.
+        # After WORKER_MAX_DELIVERIES attempts they move to the dead-letter stream.
+        self.claim_idle_ms = int(os.getenv("WORKER_CLAIM_IDLE_MS", 60000))
+        self.reclaim_interval = int(os.getenv("WORKER_RECLAIM_INTERVAL_MS", 15000)) / 1000.0
+        self.max_deliveries = int(os.getenv("WORKER_MAX_DELIVERIES", 5))
+        self.dead_letter_stream = os.getenv("WORKER_DEAD_LETTER_STREAM", f"{self.stream_name}:dead")
+        # Consumers of dead processes are removed once they have nothing pending for this long
+        self.consumer_expire_ms = int(os.getenv("WORKER_CONSUMER_EXPIRE_MS", 3600000))
+        self.last_reclaim = 0.0
+        self.metrics_port = int(os.getenv("WORKER_METRICS_PORT", 9100))
+        # Readiness under worker_status:<consumer> (read by the API's /api/health), refreshed
+        # every status_interval seconds and expiring if the worker stops refreshing it
+        self.status_interval = 15.0
+        self.state = "starting"
+        self.warm_up_seconds = None
+        self.last_status = 0.0
 
-        # 2. Setup Database
-        # Wait for DB to be ready (init_db creates tables if they don't exist)
-        # In a real app, we might use a retry loop here
-        time.sleep(5) 
-        init_db()
+        self.redis = redis_client or redis.Redis(host=self.redis_host, port=self.redis_port, decode_responses=True)
 
-        # 3. Setup AI Analyzer
-        logger.info("Loading Sentiment Analyzer model... (this may take time on first run)")
-        self.analyzer = SentimentAnalyzer(model_type='local')
-        logger.info("Sentiment Analyzer loaded.")
+        # 2. Setup Database (init_db creates tables if they don't exist), as soon as it answers
+        retry_with_backoff(init_db, "Database")
+
+        # 3. Setup AI Analyzer (models are loaded by warm_up() in start())
+        if analyzer is not None:
+            self.analyzer = analyzer
+        elif self.inference_processes > 1:
+            # The pool has the same classify_batch contract as the analyzer
+            self.pool = InferencePool(self.inference_processes, self.inference_threads)
+            self.analyzer = self.pool
+        else:
+            self.analyzer = SentimentAnalyzer(model_type=os.getenv("MODEL_BACKEND", "local"))
 
         # 4. Create Consumer Group
-        self._create_consumer_group()
+        retry_with_backoff(self._create_consumer_group, "Redis")
 
     def _create_consumer_group(self):
         """Creates the Redis Consumer Group if it doesn't exist."""
@@ -54,100 +101,338 @@ class SentimentWorker:
 
     def process_message(self, message_id, message_data):
         """Process a single message: Analyze -> Save to DB -> Publish Update."""
+        return self.process_batch([(message_id, message_data)])
+
+    def _parse_message(self, message_data):
+        """Pull the post fields out of a raw stream entry."""
+        created_at_str = message_data.get('created_at')
+        return {
+            'post_id': message_data.get('post_id'),
+            'content': message_data.get('content'),
+            'source': message_data.get('source'),
+            'author': message_data.get('author'),
+            'created_at': datetime.fromisoformat(created_at_str.replace('Z', '+00:00'))
+        }
+
+    def _parse_batch(self, messages):
+        """Parse a batch of stream entries. Returns (posts, malformed entries with their error)."""
+        posts, malformed = [], []
+        for message_id, message_data in messages:
+            try:
+                posts.append(self._parse_message(message_data))
+            except Exception as e:
+                malformed.append((message_id, message_data, e))
+        return posts, malformed
+
+    def _dead_letter(self, message_id, message_data, reason, deliveries=1):
+        """Move an entry we can't process to the dead-letter stream (the caller acks it)."""
+        logger.error(f"Dead-lettering message {message_id} after {deliveries} deliveries: {reason}")
+        entry = {key: value for key, value in (message_data or {}).items() if value is not None}
+        entry.update({'original_id': message_id, 'deliveries': deliveries, 'error': str(reason)[:500]})
+        self.redis.xadd(self.dead_letter_stream, entry, maxlen=100000, approximate=True)
+        WORKER_MESSAGES.labels("dead_lettered").inc()
+
+    def process_batch(self, messages, results=None):
+        """
+        Process a batch of (message_id, message_data) entries:
+        Analyze all texts together -> Save everything in one transaction -> Publish Updates.
+        `results` can carry analyses already computed by the inference pool.
+        Returns the entries that failed and must stay pending (not acknowledged) for a retry;
+        malformed entries are dead-lettered straight away.
+        """
+        posts, malformed = self._parse_batch(messages)
+        for message_id, message_data, error in malformed:
+            self._dead_letter(message_id, message_data, f"malformed: {error}")
+        if not posts:
+            return []
+
         db = SessionLocal()
         try:
-            # 1. Parse Data (Existing code)
-            post_id = message_data.get('post_id')
-            content = message_data.get('content')
-            source = message_data.get('source')
-            author = message_data.get('author')
-            created_at_str = message_data.get('created_at')
-            created_at = datetime.fromisoformat(created_at_str.replace('Z', '+00:00'))
-
-            logger.info(f"Processing post {post_id}: {content[:30]}...")
-
-            # 2. Save Raw Post (Existing code)
-            existing_post = db.query(SocialMediaPost).filter(SocialMediaPost.post_id == post_id).first()
-            if not existing_post:
-                new_post = SocialMediaPost(
-                    post_id=post_id,
-                    source=source,
-                    content=content,
-                    author=author,
-                    created_at=created_at
-                )
-                db.add(new_post)
-                db.commit()
-
-            # 3. Run Analysis (Existing code)
-            import asyncio
-            sentiment_result = asyncio.run(self.analyzer.analyze_sentiment(content))
-            emotion_result = asyncio.run(self.analyzer.analyze_emotion(content))
-
-            # 4. Save Analysis Result (Existing code)
-            analysis_record = SentimentAnalysis(
-                post_id=post_id,
-                model_name=sentiment_result.get('model_name'),
-                sentiment_label=sentiment_result.get('sentiment_label'),
-                confidence_score=sentiment_result.get('confidence_score'),
-                emotion=emotion_result.get('emotion')
-            )
-            db.add(analysis_record)
-            db.commit()
-
-            # --- NEW STEP 5: Publish Update to Redis Channel ---
-            update_message = {
-                "type": "new_post",
-                "data": {
-                    "post_id": post_id,
-                    "content": content[:100], # Truncate for performance
-                    "source": source,
-                    "sentiment_label": sentiment_result.get('sentiment_label'),
-                    "confidence_score": sentiment_result.get('confidence_score'),
-                    "emotion": emotion_result.get('emotion'),
-                    "timestamp": datetime.utcnow().isoformat()
+            logger.info(f"Processing batch of {len(posts)} posts")
+            WORKER_BATCH_SIZE.observe(len(posts))
+
+            # 1. Run Analysis over the whole batch (sentiment and emotion run concurrently)
+            if results is None:
+                stage_start = time.perf_counter()
+                results = self.analyzer.classify_batch([post['content'] for post in posts])
+                self._record_stage('inference', stage_start)
+
+            # 2. Save Raw Posts and Analysis Results: one executemany each, one commit.
+            # Conflicting rows are skipped, so a redelivered batch doesn't duplicate anything.
+            stage_start = time.perf_counter()
+            analyzed_at = datetime.utcnow() # One timestamp per batch keeps its rollup buckets together
+            inserted = bulk_save_analyses(db, posts, [
+                {
+                    'post_id': post['post_id'],
+                    'analyzed_at': analyzed_at,
+                    'model_name': result.get('model_name'),
+                    'sentiment_label': result.get('sentiment_label'),
+                    'confidence_score': result.get('confidence_score'),
+                    'emotion': result.get('emotion')
+                }
+                for post, result in zip(posts, results)
+            ])
+            self._record_stage('db', stage_start)
+            WORKER_MESSAGES.labels("saved").inc(len(inserted))
+            WORKER_MESSAGES.labels("duplicate").inc(len(posts) - len(inserted))
+
+            # 4. Publish Updates to Redis Channel (pipelined, one round trip)
+            stage_start = time.perf_counter()
+            # Only posts analyzed for the first time; replays were already published
+            pipe = self.redis.pipeline(transaction=False)
+            for post, result in zip(posts, results):
+                if post['post_id'] not in inserted:
+                    continue
+                inserted.discard(post['post_id'])
+                update_message = {
+                    "type": "new_post",
+                    "data": {
+                        "post_id": post['post_id'],
+                        "content": post['content'][:100], # Truncate for performance
+                        "source": post['source'],
+                        "sentiment_label": result.get('sentiment_label'),
+                        "confidence_score": result.get('confidence_score'),
+                        "emotion": result.get('emotion'),
+                        "timestamp": datetime.utcnow().isoformat()
+                    }
                 }
-            }
-            # Publish to 'sentiment_updates' channel
-            self.redis.publish('sentiment_updates', json.dumps(update_message))
-            
-            logger.info(f"Saved analysis: {sentiment_result['sentiment_label']}")
+                pipe.publish('sentiment_updates', json.dumps(update_message))
+            pipe.execute()
+            self._record_stage('publish', stage_start)
+
+            timings = ", ".join(f"{stage} {ms:.1f}ms" for stage, ms in self.stage_timings.items())
+            cache = getattr(self.analyzer, 'cache', None)
+            cache_info = f", cache hit rate {cache.stats()['hit_rate']:.0%}" if cache else ""
+            if getattr(self.analyzer, 'pre_classifier', None):
+                cache_info += f", escalation rate {self.analyzer.escalation_rate():.0%}"
+            logger.info(f"Saved {len(posts)} analyses ({timings}{cache_info})")
 
         except Exception as e:
-            logger.error(f"Error processing message {message_id}: {e}")
             db.rollback()
+            if len(messages) > 1:
+                # Don't let one bad post sink the whole batch: retry them one by one
+                logger.error(f"Batch failed ({e}), retrying {len(messages)} messages individually")
+                failed = []
+                malformed_ids = {message_id for message_id, _, _ in malformed} # Already dead-lettered
+                for message in messages:
+                    if message[0] not in malformed_ids:
+                        failed.extend(self.process_batch([message]))
+                return failed
+            logger.error(f"Error processing message {messages[0][0]}, leaving it pending: {e}")
+            WORKER_MESSAGES.labels("failed").inc()
+            return list(messages)
         finally:
             db.close()
+        return []
 
-    def start(self):
-        """Main Loop"""
-        logger.info(f"Worker {self.consumer_name} started listening on {self.stream_name}...")
-        
+    def read_batch(self, block_ms=2000):
+        """
+        Read up to batch_size new entries. Blocks (up to block_ms, or not at all when
+        None) until the first entry arrives, then waits at most batch_linger_ms for the
+        rest of the batch to fill up.
+        """
+        messages = []
+        deadline = None
+        first_block_ms = block_ms
+        while len(messages) < self.batch_size:
+            if deadline is None:
+                block_ms = first_block_ms
+            else:
+                block_ms = int((deadline - time.monotonic()) * 1000)
+                if block_ms <= 0:
+                    break
+
+            # XREADGROUP reads new messages for this group
+            # '>' means "give me messages that have never been delivered to other workers"
+            entries = self.redis.xreadgroup(
+                groupname=self.group_name,
+                consumername=self.consumer_name,
+                streams={self.stream_name: '>'},
+                count=self.batch_size - len(messages),
+                block=block_ms
+            )
+            if not entries:
+                break
+
+            for stream, stream_messages in entries:
+                messages.extend(stream_messages)
+
+            if deadline is None:
+                deadline = time.monotonic() + self.batch_linger_ms / 1000.0
+        return messages
+
+    def _record_stage(self, stage, stage_start):
+        """Store how long a stage of the current batch took, in milliseconds."""
+        elapsed = time.perf_counter() - stage_start
+        self.stage_timings[stage] = elapsed * 1000
+        WORKER_STAGE_SECONDS.labels(stage).observe(elapsed)
+
+    def _ack(self, messages, failed=()):
+        """Acknowledge a whole batch in one call (remove from pending list), except failed entries."""
+        stage_start = time.perf_counter()
+        failed_ids = {message_id for message_id, _ in failed}
+        ids = [message_id for message_id, _ in messages if message_id not in failed_ids]
+        if ids:
+            self.redis.xack(self.stream_name, self.group_name, *ids)
+        self._record_stage('ack', stage_start)
+
+    def reclaim_pending(self):
+        """
+        Claim entries that have been pending longer than claim_idle_ms on any consumer and
+        retry them; entries delivered more than max_deliveries times are dead-lettered.
+        Returns the number of entries claimed.
+        """
+        self.last_reclaim = time.monotonic()
+        claimed_total = 0
+        start_id = '0-0'
         while True:
+            response = self.redis.xautoclaim(self.stream_name, self.group_name, self.consumer_name,
+                                             self.claim_idle_ms, start_id=start_id, count=self.batch_size)
+            start_id, claimed = response[0], response[1]
+
+            # Entries trimmed from the stream come back without data: nothing left to do
+            gone = [message_id for message_id, data in claimed if not data]
+            claimed = [(message_id, data) for message_id, data in claimed if data]
+            if gone:
+                self.redis.xack(self.stream_name, self.group_name, *gone)
+
+            if claimed:
+                claimed_total += len(claimed)
+                WORKER_MESSAGES.labels("reclaimed").inc(len(claimed))
+                pending = self.redis.xpending_range(self.stream_name, self.group_name, min=claimed[0][0],
+                                                    max=claimed[-1][0], count=len(claimed),
+                                                    consumername=self.consumer_name)
+                deliveries = {entry['message_id']: entry['times_delivered'] for entry in pending}
+                retry = []
+                for message_id, data in claimed:
+                    if deliveries.get(message_id, 1) > self.max_deliveries:
+                        self._dead_letter(message_id, data, "too many failed deliveries", deliveries[message_id])
+                    else:
+                        retry.append((message_id, data))
+                if retry:
+                    logger.info(f"Retrying {len(retry)} reclaimed messages")
+                failed = self.process_batch(retry) if retry else []
+                self._ack(claimed, failed)
+
+            if start_id in ('0-0', b'0-0'):
+                break
+
+        self._prune_consumers()
+        return claimed_total
+
+    def _prune_consumers(self):
+        """Delete consumers (of processes that are gone) with nothing pending."""
+        for consumer in self.redis.xinfo_consumers(self.stream_name, self.group_name):
+            if (consumer['name'] != self.consumer_name and consumer['pending'] == 0
+                    and consumer['idle'] > self.consumer_expire_ms):
+                self.redis.xgroup_delconsumer(self.stream_name, self.group_name, consumer['name'])
+                logger.info(f"Removed idle consumer {consumer['name']}")
+
+    def consume_once(self):
+        """Read one batch, process it and acknowledge it. Returns the number of entries handled."""
+        if time.monotonic() - self.last_reclaim >= self.reclaim_interval:
+            self.reclaim_pending()
+        if self.pool is not None:
+            return self._consume_pipelined()
+
+        self.stage_timings = {}
+        stage_start = time.perf_counter()
+        messages = self.read_batch()
+        if not messages:
+            return 0
+        self._record_stage('read', stage_start)
+
+        failed = self.process_batch(messages)
+        self._ack(messages, failed)
+        return len(messages)
+
+    def _consume_pipelined(self):
+        """
+        Pool mode: keep up to two batches per inference process in flight, then save
+        and acknowledge the oldest one. Returns the number of entries handled.
+        """
+        self.stage_timings = {}
+        stage_start = time.perf_counter()
+        while len(self.in_flight) < self.pool.processes * 2:
+            # Only block for new data when there is nothing else to wait for
+            messages = self.read_batch(block_ms=None if self.in_flight else 2000)
+            if not messages:
+                break
+            posts, _ = self._parse_batch(messages)
+            future = self.pool.submit([post['content'] for post in posts]) if posts else None
+            self.in_flight.append((messages, future))
+        self._record_stage('read', stage_start)
+
+        if not self.in_flight:
+            return 0
+
+        messages, future = self.in_flight.popleft()
+        if future is not None:
+            stage_start = time.perf_counter()
             try:
-                # XREADGROUP reads new messages for this group
-                # '>' means "give me messages that have never been delivered to other workers"
-                entries = self.redis.xreadgroup(
-                    groupname=self.group_name,
-                    consumername=self.consumer_name,
-                    streams={self.stream_name: '>'},
-                    count=1,
-                    block=2000 # Block for 2 seconds if no data
-                )
-
-                if not entries:
-                    continue
+                try:
+                    results = future.result()
+                except BrokenProcessPool:
+                    # Submitted before an inference process died: run it again on the restarted pool
+                    posts, _ = self._parse_batch(messages)
+                    results = self.pool.classify_batch([post['content'] for post in posts])
+            except Exception as e:
+                # process_batch retries the batch message by message
+                logger.error(f"Inference pool error: {e}")
+                results = None
+            self._record_stage('inference', stage_start)
+            failed = self.process_batch(messages, results)
+        else:
+            failed = self.process_batch(messages) # Nothing parsed: dead-letters the batch
+        self._ack(messages, failed)
+        return len(messages)
+
+    def publish_status(self, state=None):
+        """Store this worker's state ('loading' or 'ready') for the API's readiness check."""
+        self.state = state or self.state
+        self.last_status = time.monotonic()
+        status = {"state": self.state, "stream": self.stream_name, "warm_up_seconds": self.warm_up_seconds,
+                  "updated_at": datetime.utcnow().isoformat()}
+        try:
+            self.redis.set(f"worker_status:{self.consumer_name}", json.dumps(status),
+                           ex=int(self.status_interval * 3))
+        except redis.RedisError as e:
+            logger.warning(f"Could not publish worker status: {e}")
+
+    def warm_up(self):
+        """Load the models and run a dummy batch before taking real traffic."""
+        self.publish_status("loading")
+        start = time.perf_counter()
+        warm_up = getattr(self.analyzer, 'warm_up', None)
+        if warm_up:
+            logger.info("Loading Sentiment Analyzer models... (this may take time on first run)")
+            warm_up()
+        self.warm_up_seconds = round(time.perf_counter() - start, 2)
+        logger.info(f"Sentiment Analyzer ready in {self.warm_up_seconds}s")
+        self.publish_status("ready")
 
-                for stream, messages in entries:
-                    for message_id, message_data in messages:
-                        self.process_message(message_id, message_data)
-                        
-                        # Acknowledge processing (remove from pending list)
-                        self.redis.xack(self.stream_name, self.group_name, message_id)
+    def start(self):
+        """Main Loop"""
+        db_pools.add("worker", engine)
+        start_metrics_server(self.metrics_port)
+        self.warm_up()
+        logger.info(
+            f"Worker {self.consumer_name} started listening on {self.stream_name} "
+            f"(batch_size={self.batch_size}, linger={self.batch_linger_ms}ms)..."
+        )
 
+        # Back off exponentially while Redis/DB are failing; go back to full speed after a success
+        error_delay = 0.1
+        while True:
+            try:
+                if time.monotonic() - self.last_status >= self.status_interval:
+                    self.publish_status()
+                self.consume_once()
+                error_delay = 0.1
             except Exception as e:
-                logger.error(f"Worker loop error: {e}")
-                time.sleep(5)
+                logger.error(f"Worker loop error: {e}, retrying in {error_delay:.1f}s")
+                time.sleep(error_delay)
+                error_delay = min(error_delay * 2, 5.0)
 
 if __name__ == "__main__":
     worker = SentimentWorker()